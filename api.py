@@ -0,0 +1,456 @@
+"""
+api.py
+
+API HTTP asynchrone (aiohttp) de l'assistant, à côté de l'interface
+Streamlit : même index, même recherche hybride (cf. retrieval.py), même
+prompt (cf. prompt.py).
+
+Endpoints :
+- POST /search {"query": ..., "k": 4} : événements retrouvés (JSON)
+- POST /recommend {"query": ..., "k": 4} : recommandation en flux NDJSON,
+  une ligne par message : {"events": [...]}, puis {"delta": "..."} au fil
+  des tokens, puis {"done": true, ...} (ou {"error": ...})
+- GET /health : files d'attente, regroupements, caches et latences par étape
+
+Un seul index en mémoire pour toutes les requêtes (projeté en mmap, cf.
+vector_storage.py) et un seul client Mistral asynchrone : connexions HTTP
+keep-alive réutilisées, nombre de connexions simultanées borné. La recherche
+(FAISS, BM25) est synchrone : elle tourne dans un pool de threads, la boucle
+asyncio reste libre pour les flux en cours.
+
+Regroupement : une requête identique (même texte normalisé, cf.
+query_cache.normalize_query, même k) à une requête en cours ne relance rien,
+elle partage son résultat ; pour /recommend, la génération est diffusée à
+tous les clients en attente (un seul appel Mistral pour N clients).
+
+Contre-pression : au plus `max_concurrent` requêtes en traitement et
+`max_queue` en attente ; au-delà, réponse 503 immédiate avec `Retry-After`
+plutôt qu'une file qui s'allonge et des délais qui explosent.
+
+Usage :
+    python api.py --index faiss_langchain_index --port 8080
+    curl -N localhost:8080/recommend -d '{"query": "un concert ce week-end"}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
+from functools import partial
+
+from aiohttp import web
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from mistralai.async_client import MistralAsyncClient
+from mistralai.models.chat_completion import ChatMessage
+
+from embedding_engine import estimate_tokens
+from prompt import build_prompt, enrich_with_metadata
+from query_cache import CachingQueryEmbeddings, normalize_query
+from shards import open_index
+from streaming import AsyncStreamingReply
+from tracing import TRACE_LOG, Tracer
+
+INDEX_DIR = "faiss_langchain_index"
+CHAT_MODEL = "mistral-medium"
+EMBED_MODEL = "mistral-embed"
+MAX_K = 20
+MAX_QUERY_CHARS = 1000
+RETRY_AFTER_S = 1
+EVENT_FIELDS = ("id", "title", "location_name", "location_address", "firstdate_begin", "lastdate_end")
+
+
+class Overloaded(Exception):
+    """Plus de place en traitement ni en file d'attente."""
+
+
+class AdmissionControl:
+    """
+    Limite de requêtes en traitement, avec une file d'attente bornée.
+
+    Attributs :
+        max_concurrent (int) : requêtes traitées en même temps
+        max_queue (int) : requêtes en attente au-delà ; les suivantes sont refusées
+        active, waiting, rejected (int) : compteurs courants / cumulés
+    """
+
+    def __init__(self, max_concurrent=32, max_queue=64):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.active + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {"active": self.active, "waiting": self.waiting, "rejected": self.rejected,
+                "max_concurrent": self.max_concurrent, "max_queue": self.max_queue}
+
+
+class Broadcast:
+    """
+    Messages d'une génération en cours, partagés par les requêtes identiques.
+
+    Les messages sont conservés : un client arrivé en cours de route reçoit
+    d'abord ce qui a déjà été produit, puis la suite.
+
+    Attributs :
+        task (asyncio.Task) : tâche productrice
+        subscribers (int) : clients encore à l'écoute
+    """
+
+    def __init__(self):
+        self.task = None
+        self.subscribers = 0
+        self.messages = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, message):
+        async with self._changed:
+            self.messages.append(message)
+            self._changed.notify_all()
+
+    async def close(self, error=None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def follow(self):
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.messages) > position)
+                messages = self.messages[position:]
+                done, error = self.done, self.error
+            position += len(messages)
+            for message in messages:
+                yield message
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class AsyncClientEmbeddings(Embeddings):
+    """
+    Embeddings `mistral-embed` via le client asynchrone partagé, appelables
+    depuis les threads de recherche : l'appel HTTP s'exécute sur la boucle
+    asyncio, le thread attend le résultat.
+    """
+
+    def __init__(self, client, loop):
+        self.client = client
+        self.loop = loop
+
+    def embed_documents(self, texts):
+        future = asyncio.run_coroutine_threadsafe(self.client.embeddings(model=EMBED_MODEL, input=texts),
+                                                  self.loop)
+        return [item.embedding for item in future.result().data]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def event_json(doc, score):
+    """Événement retrouvé, sérialisable en JSON."""
+    event = {field: doc.metadata.get(field) for field in EVENT_FIELDS}
+    event["score"] = round(float(score), 6)
+    event["context"] = enrich_with_metadata(doc)
+    return event
+
+
+class RecommendationService:
+    """
+    Index partagé, client Mistral, regroupement des requêtes et contre-pression.
+
+    Args:
+        index_dir (str): dossier de l'index (cf. embedding.py)
+        client (MistralAsyncClient): client partagé
+        tracer (Tracer): traces des requêtes
+        max_concurrent, max_queue (int): cf. AdmissionControl
+        search_threads (int): threads de recherche (FAISS, BM25)
+    """
+
+    def __init__(self, index_dir, client, tracer, max_concurrent=32, max_queue=64, search_threads=4):
+        self.client = client
+        self.tracer = tracer
+        self.admission = AdmissionControl(max_concurrent, max_queue)
+        self.executor = ThreadPoolExecutor(search_threads, thread_name_prefix="search")
+        self.coalesced = 0
+        self._searches = {}
+        self._generations = {}
+        # Mêmes fichiers que app.py : index FAISS (mmap), BM25, dates, vecteurs exacts
+        embeddings = CachingQueryEmbeddings(AsyncClientEmbeddings(client, asyncio.get_running_loop()))
+        self.index = open_index(index_dir, embeddings)
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        await self.client.close()
+
+    def _search(self, query, k, trace):
+        """Recherche synchrone (thread du pool), comme app.py."""
+        results, _, mode = self.index.search(query, k=k, fetch_k=max(20, k), trace=trace)
+        trace.set(retrieval=mode, events=len(results))
+        return results, mode
+
+    async def _retrieve(self, query, k, trace):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(self._search, query, k, trace))
+
+    async def _run_search(self, query, k):
+        async with self.admission.slot():
+            with self.tracer.trace("search", query_chars=len(query)) as trace:
+                results, mode = await self._retrieve(query, k, trace)
+                return {"query": query, "retrieval": mode, "trace_id": trace.trace_id,
+                        "events": [event_json(doc, score) for doc, score in results]}
+
+    async def search(self, query, k=4):
+        """
+        Événements pour une question ; une question identique déjà en cours est partagée.
+
+        Raises:
+            Overloaded: file d'attente pleine
+        """
+        key = (normalize_query(query), k)
+        task = self._searches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_search(query, k))
+            self._searches[key] = task
+            task.add_done_callback(lambda _: self._searches.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield : un client qui se déconnecte n'annule pas la recherche des autres
+        return await asyncio.shield(task)
+
+    async def _generate(self, broadcast, query, k):
+        """Recherche, puis génération en flux publiée dans `broadcast`."""
+        try:
+            async with self.admission.slot():
+                with self.tracer.trace("recommend", query_chars=len(query)) as trace:
+                    results, mode = await self._retrieve(query, k, trace)
+                    await broadcast.publish({"retrieval": mode, "trace_id": trace.trace_id,
+                                             "events": [event_json(doc, score) for doc, score in results]})
+                    with trace.span("prompt") as span:
+                        final_prompt, _ = build_prompt(query, results)
+                        span.set(prompt_bytes=len(final_prompt.encode("utf-8")),
+                                 prompt_tokens_est=estimate_tokens(final_prompt))
+                    with trace.span("chat_completion", model=CHAT_MODEL) as span:
+                        stream = self.client.chat_stream(
+                            model=CHAT_MODEL,
+                            messages=[ChatMessage(role="user", content=final_prompt)],
+                            temperature=0.2,
+                            top_p=0.9,
+                        )
+                        sent = 0
+                        async with AsyncStreamingReply(stream) as reply:
+                            async for text in reply:
+                                await broadcast.publish({"delta": text[sent:]})
+                                sent = len(text)
+                        metrics = reply.metrics
+                        span.set(ttft_ms=None if metrics.ttft is None else round(metrics.ttft * 1000, 1),
+                                 chunks=metrics.chunks, subscribers=broadcast.subscribers,
+                                 completion_tokens=(metrics.usage or {}).get("completion_tokens")
+                                 or estimate_tokens(reply.text))
+                    await broadcast.publish({"done": True, "text": reply.text,
+                                             "generation": metrics.as_dict()})
+        except asyncio.CancelledError:
+            await broadcast.close(ConnectionAbortedError("génération annulée"))
+            raise
+        except Exception as exc:
+            await broadcast.close(exc)
+        else:
+            await broadcast.close()
+
+    async def recommend(self, query, k=4):
+        """
+        Messages de la recommandation (événements, fragments de texte, fin).
+
+        Une question identique déjà en cours est rejointe : ses messages
+        passés sont rejoués, les suivants diffusés. La génération est annulée
+        quand plus aucun client n'écoute.
+
+        Raises:
+            Overloaded: file d'attente pleine
+        """
+        key = (normalize_query(query), k)
+        broadcast = self._generations.get(key)
+        if broadcast is None:
+            broadcast = Broadcast()
+            broadcast.task = asyncio.ensure_future(self._generate(broadcast, query, k))
+            self._generations[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._generations.pop(key, None))
+        else:
+            self.coalesced += 1
+        broadcast.subscribers += 1
+        try:
+            async for message in broadcast.follow():
+                yield message
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+
+    def stats(self):
+        return {
+            "admission": self.admission.stats(),
+            "in_flight": {"search": len(self._searches), "recommend": len(self._generations)},
+            "coalesced": self.coalesced,
+            "vectors": self.index.ntotal,
+            "cache": {"query_embeddings": self.index.embedding_function.stats()},
+            "latency": self.tracer.stats(),
+        }
+
+
+SERVICE = web.AppKey("service", RecommendationService)
+
+
+def overloaded():
+    return web.json_response({"error": "service saturé, réessayer plus tard"}, status=503,
+                             headers={"Retry-After": str(RETRY_AFTER_S)})
+
+
+async def read_query(request):
+    """Question et k du corps JSON ; 400 si invalides."""
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "corps JSON invalide"}),
+                                 content_type="application/json")
+    query = payload.get("query") if isinstance(payload, dict) else None
+    k = payload.get("k", 4) if isinstance(payload, dict) else None
+    if not isinstance(query, str) or not query.strip() or len(query) > MAX_QUERY_CHARS:
+        error = f"'query' : texte non vide de {MAX_QUERY_CHARS} caractères au plus"
+    elif not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        error = f"'k' : entier entre 1 et {MAX_K}"
+    else:
+        return query.strip(), k
+    raise web.HTTPBadRequest(text=json.dumps({"error": error}, ensure_ascii=False),
+                             content_type="application/json")
+
+
+async def handle_search(request):
+    service = request.app[SERVICE]
+    query, k = await read_query(request)
+    try:
+        return web.json_response(await service.search(query, k))
+    except Overloaded:
+        return overloaded()
+    except Exception as exc:
+        return web.json_response({"error": f"{type(exc).__name__}: {exc}"}, status=502)
+
+
+async def handle_recommend(request):
+    service = request.app[SERVICE]
+    query, k = await read_query(request)
+    response = None
+    try:
+        async with aclosing(service.recommend(query, k)) as messages:
+            async for message in messages:
+                if response is None:
+                    # Réponse ouverte au premier message : une saturation donne encore un 503
+                    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+                    await response.prepare(request)
+                await response.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    except Overloaded:
+        return overloaded()
+    except ConnectionResetError:
+        # Client parti : plus rien à écrire
+        return response
+    except Exception as exc:
+        error = {"error": f"{type(exc).__name__}: {exc}"}
+        if response is None:
+            return web.json_response(error, status=502)
+        await response.write(json.dumps(error, ensure_ascii=False).encode("utf-8") + b"\n")
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok", **request.app[SERVICE].stats()})
+
+
+def create_app(index_dir=INDEX_DIR, api_key=None, endpoint=None, max_concurrent=32, max_queue=64,
+               search_threads=4, max_connections=64, max_retries=5, tracer=None):
+    """
+    Application aiohttp ; l'index et le client sont créés au démarrage.
+
+    Args:
+        index_dir (str): dossier de l'index
+        api_key (str): clé API Mistral
+        endpoint (str): URL de l'API (None = API Mistral ; cf. fake_mistral.py)
+        max_concurrent, max_queue (int): contre-pression (cf. AdmissionControl)
+        search_threads (int): threads de recherche
+        max_connections (int): connexions HTTP simultanées vers Mistral
+        max_retries (int): nouvelles tentatives du client sur 429 / 5xx
+        tracer (Tracer): traces (par défaut, journal TRACE_LOG)
+
+    Returns:
+        web.Application
+    """
+    app = web.Application()
+
+    async def start(app):
+        options = {"endpoint": endpoint} if endpoint else {}
+        client = MistralAsyncClient(api_key=api_key, max_retries=max_retries,
+                                    max_concurrent_requests=max_connections, **options)
+        app[SERVICE] = RecommendationService(index_dir, client, tracer or Tracer(TRACE_LOG),
+                                             max_concurrent, max_queue, search_threads)
+
+    async def stop(app):
+        await app[SERVICE].close()
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    app.router.add_post("/search", handle_search)
+    app.router.add_post("/recommend", handle_recommend)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP de recommandation d'événements")
+    parser.add_argument("--index", default=INDEX_DIR, help="dossier de l'index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrent", type=int, default=32, help="requêtes traitées en même temps")
+    parser.add_argument("--max-queue", type=int, default=64, help="requêtes en attente avant 503")
+    parser.add_argument("--search-threads", type=int, default=4, help="threads de recherche FAISS / BM25")
+    parser.add_argument("--max-connections", type=int, default=64, help="connexions vers l'API Mistral")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise SystemExit("❌ Clé API Mistral non trouvée.")
+    # MISTRAL_ENDPOINT permet de viser un serveur local (cf. fake_mistral.py)
+    app = create_app(args.index, api_key, os.getenv("MISTRAL_ENDPOINT"), args.max_concurrent,
+                     args.max_queue, args.search_threads, args.max_connections,
+                     tracer=Tracer(os.getenv("TRACE_LOG", TRACE_LOG)))
+    print(f"🚀 API sur http://{args.host}:{args.port} (index : {args.index})")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,115 @@
 import os
-import json
+import hmac
+import threading
 import streamlit as st
-from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_core.embeddings import Embeddings
+
+from embedding_engine import estimate_tokens
+from mistral_embeddings import CustomMistralEmbeddings, mistral_client
+from prompt import CONTEXT_SEPARATOR, NO_CONTEXT, SYSTEM_PROMPT, format_doc
+from query_cache import CachingQueryEmbeddings, SemanticAnswerCache
+from shards import open_index
+from streaming import StreamingReply
+from tracing import TRACE_LOG, Tracer
+
+INDEX_DIR = "faiss_langchain_index"
+# Réutilisation d'une réponse pour une question quasi identique (ANSWER_CACHE=0 pour désactiver)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_THRESHOLD = 0.95
 
 # --- Mistral API key ---
 load_dotenv()
 api_key = os.getenv("MISTRAL_API_KEY")
 model = "mistral-medium"
+# Page d'administration (traces, piles d'exceptions) : désactivée sans ADMIN_TOKEN
+admin_token = os.getenv("ADMIN_TOKEN")
 
 if not api_key:
     st.error("❌ Clé API Mistral non trouvée.")
     st.stop()
 
-client = MistralClient(api_key=api_key)
-
-# --- Embeddings wrapper ---
-class CustomMistralEmbeddings(Embeddings):
-    def __init__(self, client):
-        self.client = client
-    def embed_documents(self, texts):
-        response = self.client.embeddings(model="mistral-embed", input=texts)
-        return [res.embedding for res in response.data]
-    def embed_query(self, text):
-        return self.embed_documents([text])[0]
-
-embedding_function = CustomMistralEmbeddings(client)
+# --- Ressources partagées (chargées une fois par processus, pour toutes les sessions) ---
+@st.cache_resource
+def get_client(api_key):
+    return mistral_client(api_key)
+
+@st.cache_resource
+def get_embedding_function(api_key):
+    # Les questions passent directement (embed_query), hors du limiteur de débit de l'indexation
+    return CustomMistralEmbeddings(get_client(api_key))
+
+def index_signature(path):
+    """
+    Signature (chemin, taille, date de modification) de tous les fichiers de
+    l'index, sous-dossiers compris (metadata/, lexical/, shards mensuels).
+    """
+    signature = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            signature.append((os.path.relpath(os.path.join(root, name), path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+# Une seule entrée : quand l'index change sur disque, la nouvelle signature
+# déclenche un rechargement et l'ancienne version est libérée.
+@st.cache_resource(max_entries=1, show_spinner="Chargement de l'index…")
+def load_search_index(path, signature, api_key):
+    # Le cache des embeddings de requêtes repart de zéro avec chaque version de l'index.
+    # Index projeté en mémoire (mmap) : pages partagées entre les workers ;
+    # FAISS, BM25, dates et vecteurs exacts, par shard mensuel (cf. shards.py) ou unique
+    return open_index(path, CachingQueryEmbeddings(get_embedding_function(api_key)))
+
+@st.cache_resource(max_entries=1)
+def get_answer_cache(signature):
+    return SemanticAnswerCache(threshold=ANSWER_CACHE_THRESHOLD)
+
+client = get_client(api_key)
 
 # --- Chargement index FAISS ---
 try:
-    vectorstore = FAISS.load_local(
-        "faiss_langchain_index",
-        embeddings=embedding_function,
-        allow_dangerous_deserialization=True
-    )
+    signature = index_signature(INDEX_DIR)
+    search_index = load_search_index(INDEX_DIR, signature, api_key)
+    answer_cache = get_answer_cache(signature)
 except Exception as e:
     st.error(f"❌ Erreur chargement index FAISS : {e}")
     st.stop()
 
-# --- Prompt système ---
-SYSTEM_PROMPT = """Tu es un assistant culturel pour Paris.
-
-Ta mission est de recommander des événements aux utilisateurs en te basant uniquement sur le CONTEXTE fourni ci-dessous.
-
-Quand tu cites un événement, respecte **strictement** le format suivant (avec des sauts de ligne et le bon usage du Markdown) :
-
-📌 **{{title}}**  
-📍 _Lieu : {{lieu}}_  
-🏠 _Adresse : {{adresse}}_  
-🗓️ _{{date formatée}}_  
-📝 {{courte description}}
-
-**Règles à suivre :**
-- Un retour à la ligne après chaque ligne, puis une ligne vide entre chaque événement.
-- Le title est en gras `**`, les lieux et adresses en italique `_`.
-- Formate les dates comme ceci :  
-  • Pour une seule date : “le 4 mai 2025”  
-  • Pour une plage dans le même mois : “du 4 au 12 mai 2025”  
-  • Pour deux mois différents : “du 28 avril au 2 mai 2025”
-- N’ajoute aucun lien externe.
-- Ne mentionne que les événements présents dans le CONTEXTE.
-- Si possible répond avec au moins 2 événements pertinents.
-- Si la question est floue, demande des précisions à l'utilisateur.
-- Si la question est hors sujet, indique que tu ne réponds que sur les événements à Paris.
-- Termine chaque réponse par **“As-tu d’autres questions ?”**
-
----
-
-CONTEXTE :  
-{context_str}
-
----
-
-QUESTION :  
-{question}
-
----
-
-RÉPONSE DE L’ASSISTANT :
-"""
+# --- Traces des requêtes ---
+@st.cache_resource
+def get_tracer():
+    # Un traceur par processus : histogrammes communs à toutes les sessions
+    return Tracer(os.getenv("TRACE_LOG", TRACE_LOG))
+
+tracer = get_tracer()
+
+def generation_attrs(reply):
+    """Attributs du span de génération : TTFT, tokens (API, sinon estimés), taille."""
+    metrics = reply.metrics
+    usage = metrics.usage or {}
+    return {
+        "ttft_ms": None if metrics.ttft is None else round(metrics.ttft * 1000, 1),
+        "chunks": metrics.chunks,
+        "cancelled": metrics.cancelled,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens") or estimate_tokens(reply.text),
+        "response_bytes": len(reply.text.encode("utf-8")),
+    }
+
+# --- Page d'administration (?admin=<ADMIN_TOKEN>) : latences par étape de ce processus ---
+if admin_token and hmac.compare_digest(st.query_params.get("admin", ""), admin_token):
+    st.title("🛠️ Latences par étape")
+    st.caption(f"Processus {os.getpid()} — fenêtre des {tracer.window} dernières mesures par étape")
+    st.dataframe([{"étape": name, **values} for name, values in sorted(tracer.stats().items())])
+    st.subheader("Dernières requêtes")
+    for record in tracer.recent():
+        label = f"{record['trace_id']} — {record['duration_ms']} ms"
+        if record.get("error"):
+            label += f" — ❌ {record['error']}"
+        with st.expander(label):
+            st.json(record)
+    st.stop()
 
 # --- Historique conversationnel ---
 if "messages" not in st.session_state:
@@ -96,33 +124,6 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
 
-# --- Formatage dynamique des documents (pour affichage assistant) ---
-def format_doc(doc, score):
-    title = doc.metadata.get("title", "Titre inconnu")
-    lieu = doc.metadata.get("location_name", "Lieu inconnu")
-    adresse = doc.metadata.get("location_address", "Adresse inconnue")
-    debut = doc.metadata.get("firstdate_begin", "?")
-    fin = doc.metadata.get("lastdate_end", "?")
-    description = doc.page_content.strip()
-
-    return (
-        f"📌 **{title}**  \n"
-        f"📍 _Lieu : {lieu}_  \n"
-        f"🏠 _Adresse : {adresse}_  \n"
-        f"🗓️ _du {debut} au {fin}_  \n"
-        f"📝 {description}"
-    )
-
-# --- Enrichissement des contextes pour RAGAS ---
-def enrich_with_metadata(doc):
-    title = doc.metadata.get("title", "")
-    lieu = doc.metadata.get("location_name", "")
-    adresse = doc.metadata.get("location_address", "")
-    debut = doc.metadata.get("firstdate_begin", "")
-    fin = doc.metadata.get("lastdate_end", "")
-    description = doc.page_content.strip()
-    return f"{title} - {lieu} - {adresse} - du {debut} au {fin} - {description}"
-
 # --- Entrée utilisateur ---
 if user_input := st.chat_input("Quel type d'événement t'intéresse ?"):
 
@@ -130,43 +131,92 @@ if user_input := st.chat_input("Quel type d'événement t'intéresse ?"):
     with st.chat_message("user"):
         st.write(user_input)
 
-    try:
-        results = vectorstore.similarity_search_with_score(user_input, k=4)
-
-        # Texte enrichi pour affichage assistant
-        context_str = "\n\n---\n\n".join([format_doc(doc, score) for doc, score in results])
-
-        # Contextes enrichis pour logs et évaluation RAGAS
-        raw_contexts = [enrich_with_metadata(doc) for doc, score in results]
-
-        print("✅ placeholder_contexts pour RAGAS :")
-        print(json.dumps(raw_contexts, indent=2, ensure_ascii=False))
-
-    except Exception:
-        st.error("❌ Erreur pendant la recherche vectorielle.")
-        results = []
-        context_str = "Aucune information pertinente trouvée."
-        raw_contexts = []
-
-    # Prompt final
-    final_prompt = SYSTEM_PROMPT.format(context_str=context_str, question=user_input)
-
-    # Appel à l’API Mistral
-    with st.chat_message("assistant"):
-        placeholder = st.empty()
-        placeholder.markdown("⌛")
-
+    # Une trace par question : durée de chaque étape (cf. tracing.py, page d'administration)
+    with tracer.trace("chat", query_chars=len(user_input)) as trace:
+        query_vector = None
+        cached_reply = None
         try:
-            response = client.chat(
-                model=model,
-                messages=[ChatMessage(role="user", content=final_prompt)],
-                temperature=0.2,
-                top_p=0.9
-            )
-            assistant_reply = response.choices[0].message.content
-        except Exception:
-            assistant_reply = "Désolé, je n’ai pas pu traiter ta demande. Réessaie plus tard."
-
-        placeholder.markdown(assistant_reply, unsafe_allow_html=False)
-
-    st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
+            # Recherche limitée aux événements (et aux shards) de la période demandée, à venir par défaut :
+            # 4 événements distincts, BM25 + vecteurs ; requête de mots-clés : BM25 seul (query_vector = None)
+            results, query_vector, mode = search_index.search(user_input, k=4, fetch_k=20, trace=trace)
+            trace.set(retrieval=mode, events=len(results))
+            event_ids = [doc.metadata.get("id", "") for doc, score in results]
+            # Le cache de réponses compare les embeddings : pas de recherche sans embedding
+            if ANSWER_CACHE_ENABLED and results and query_vector is not None:
+                with trace.span("answer_cache"):
+                    cached_reply = answer_cache.lookup(query_vector, event_ids)
+
+            with trace.span("format_context") as span:
+                # Texte enrichi pour affichage assistant
+                contexts = [format_doc(doc, score) for doc, score in results]
+                context_str = CONTEXT_SEPARATOR.join(contexts) or NO_CONTEXT
+                # Taille de chaque contexte et événements retenus, dans la trace (pas les textes)
+                span.set(context_bytes=len(context_str.encode("utf-8")), event_ids=event_ids,
+                         context_chars=[len(context) for context in contexts])
+
+        except Exception as exc:
+            trace.fail(exc)
+            st.error("❌ Erreur pendant la recherche vectorielle.")
+            results = []
+            event_ids = []
+            context_str = NO_CONTEXT
+
+        trace.set(cache={
+            "query_embeddings": search_index.embedding_function.stats(),
+            "answers": answer_cache.stats(),
+        })
+
+        # Prompt final
+        with trace.span("prompt") as span:
+            final_prompt = SYSTEM_PROMPT.format(context_str=context_str, question=user_input)
+            span.set(prompt_bytes=len(final_prompt.encode("utf-8")),
+                     prompt_tokens_est=estimate_tokens(final_prompt))
+
+        # Appel à l’API Mistral (réponse affichée au fil de l'eau)
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("⌛")
+
+            if cached_reply is not None:
+                trace.set(answer_cache_hit=True)
+                assistant_reply = cached_reply
+            else:
+                # Une génération encore en cours dans cette session est annulée
+                previous_cancel = st.session_state.get("generation_cancel")
+                if previous_cancel is not None:
+                    previous_cancel.set()
+                cancel_event = threading.Event()
+                st.session_state.generation_cancel = cancel_event
+
+                reply = None
+                assistant_reply = None
+                with trace.span("chat_completion", model=model) as span:
+                    try:
+                        stream = client.chat_stream(
+                            model=model,
+                            messages=[ChatMessage(role="user", content=final_prompt)],
+                            temperature=0.2,
+                            top_p=0.9
+                        )
+                        with StreamingReply(stream, cancel_event) as reply:
+                            for partial_reply in reply:
+                                placeholder.markdown(partial_reply + "▌", unsafe_allow_html=False)
+                        assistant_reply = reply.text
+                    except Exception as exc:
+                        trace.fail(exc)
+                        span.error = f"{type(exc).__name__}: {exc}"
+                        assistant_reply = "Désolé, je n’ai pas pu traiter ta demande. Réessaie plus tard."
+                    finally:
+                        if reply is not None:
+                            span.set(**generation_attrs(reply))
+                            if assistant_reply is None:
+                                # Script interrompu par un nouveau message : on garde le début de réponse
+                                st.session_state.messages.append({"role": "assistant", "content": reply.text + " …"})
+
+                if (ANSWER_CACHE_ENABLED and reply is not None and assistant_reply == reply.text
+                        and not reply.metrics.cancelled and query_vector is not None):
+                    answer_cache.store(user_input, query_vector, event_ids, assistant_reply)
+
+            placeholder.markdown(assistant_reply, unsafe_allow_html=False)
+
+        st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
@@ -0,0 +1,379 @@
+"""
+bench.py
+
+Benchmark de bout en bout du pipeline, hors ligne : les appels Mistral
+(embeddings, chat) sont servis par le faux serveur local de fake_mistral.py
+(vecteurs déterministes, latences réglables), aucun quota n'est consommé.
+
+Pour chaque taille de corpus synthétique (`--sizes`, 1k / 10k / 100k
+événements par défaut), dans un processus séparé (le pic de mémoire
+résidente est propre à la taille) :
+- ingestion : normalisation de l'export brut (lignes/s, cf. liste_event.py),
+  découpage en chunks (chunks/s), dédoublonnage et embedding via le faux
+  serveur avec cache et journal (embeddings/s, cf. embedding.py)
+- index : temps de construction et taille sur disque (FAISS, métadonnées,
+  BM25, index des dates)
+- requêtes : index rechargé comme dans app.py (mmap), puis questions
+  envoyées par `--concurrency` threads : recherche hybride et génération en
+  flux ; latences p50 / p95 / p99 par étape (cf. tracing.py), temps jusqu'au
+  premier token et débit (requêtes/s)
+- pic de mémoire résidente du processus
+
+Le rapport JSON (`--json`) porte le commit courant et la configuration,
+pour comparer deux commits.
+
+Usage :
+    python bench.py --json bench_report.json
+    python bench.py --sizes 1000 10000 --concurrency 1 8 32 --latency 0.05 --token-latency 0.005
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from mistralai.client import MistralClient
+from mistralai.models.chat_completion import ChatMessage
+
+from bench_normalisation import synthetic_export
+from chunking import load_sentence_nlp
+from dataset import to_typed
+from date_filter import DATE_INDEX_FILE, DateIndex, parse_date_window
+from dedup import DEFAULT_THRESHOLD, dedup_documents
+from embedding import build_vectorstore, full_vectors, prepare_documents
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from fake_mistral import serve_in_thread
+from index_journal import IndexJournal, embed_with_journal
+from index_types import COMPRESSED_TYPES, INDEX_TYPES, index_kind
+from lexical import LEXICAL_DIR, LexicalIndex
+from liste_event import clean_dataframe
+from mistral_embeddings import CustomMistralEmbeddings
+from retrieval import search_events_hybrid
+from streaming import StreamingReply
+from tracing import Tracer
+from vector_storage import load_full_vectors, load_vectorstore, save_full_vectors, save_vectorstore
+
+SIZES = (1000, 10000, 100000)
+CHAT_MODEL = "mistral-medium"
+
+THEMES = ["concert", "exposition", "atelier", "visite guidée", "conférence", "spectacle de danse",
+          "projection", "lecture", "balade urbaine", "marché de créateurs"]
+PUBLICS = ["pour les enfants", "en famille", "pour les étudiants", "tout public", "pour les seniors"]
+DETAILS = [
+    "Réservation conseillée, places limitées.",
+    "Accès aux personnes à mobilité réduite.",
+    "Le programme détaillé est disponible à l'accueil.",
+    "Un goûter est offert à l'issue de la séance.",
+    "Les animateurs présenteront l'histoire du quartier.",
+    "Prévoir des chaussures confortables.",
+    "Les œuvres sont prêtées par des collections privées.",
+    "La séance est suivie d'un échange avec le public.",
+]
+
+# Questions mêlant mots-clés (chemin rapide BM25), questions ouvertes et périodes
+QUESTIONS = [
+    "Musée Zadkine",
+    "rue de Rivoli",
+    "un concert gratuit en plein air ce week-end ?",
+    "que faire avec des enfants demain ?",
+    "une exposition de photos ce mois-ci",
+    "des ateliers pour les étudiants la semaine prochaine",
+    "Bibliothèque André Malraux",
+    "Événement N°1234",
+    "une balade urbaine pour découvrir l'histoire du quartier",
+    "spectacle de danse",
+    "intervenant 4321",
+    "quelles conférences sont accessibles aux personnes à mobilité réduite ?",
+]
+
+
+def synthetic_events(n, seed=0, now=None):
+    """
+    Export brut synthétique avec dates et descriptions variées.
+
+    Part de `bench_normalisation.synthetic_export` (HTML, lieux répétés) ;
+    une partie des événements sont des séries récurrentes au texte presque
+    identique, comme dans l'export réel (cf. dedup.py).
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    df = synthetic_export(n, seed)
+    begins, ends, descriptions, longues = [], [], [], []
+    for i in range(n):
+        begin = now + timedelta(days=rng.randint(-300, 60), hours=rng.randint(8, 22))
+        begins.append(begin.isoformat())
+        ends.append((begin + timedelta(days=rng.choice([0, 0, 1, 7, 30, 90]), hours=2)).isoformat())
+        # Une série sur quatre : même texte à un numéro près
+        serie = i % 4 == 0
+        if serie:
+            theme, public = THEMES[(i // 40) % len(THEMES)], PUBLICS[(i // 40) % len(PUBLICS)]
+            sentences = DETAILS[:3 + (i // 40) % 5]
+        else:
+            theme, public = rng.choice(THEMES), rng.choice(PUBLICS)
+            sentences = rng.sample(DETAILS, rng.randint(2, len(DETAILS))) + [
+                f"{rng.choice(THEMES).capitalize()} animé par l'intervenant {rng.randint(1, 5000)}."
+                for _ in range(rng.randint(0, 12))
+            ]
+        descriptions.append(f"<p>{theme.capitalize()} {public} n°{i}.</p>")
+        longues.append("<p>" + " ".join(sentences) + "</p>")
+    df["Description"] = descriptions
+    df["Description longue"] = longues
+    df["Première date - Début"] = begins
+    df["Dernière date - Fin"] = ends
+    return df.astype(str)
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus (ru_maxrss est en Ko sous Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def directory_size(path):
+    """Taille (octets) des fichiers d'un dossier, récursivement."""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def git_commit():
+    """Commit courant (abrégé), ou None hors d'un dépôt git."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def make_client(base_url):
+    """Client Mistral visant le faux serveur (les tentatives sont gérées par EmbeddingEngine)."""
+    return MistralClient(api_key="bench", endpoint=base_url, max_retries=0)
+
+
+def ingest(raw, work_dir, embeddings, nlp, dedup_threshold=DEFAULT_THRESHOLD, index_type="flat"):
+    """
+    Normalisation, découpage, embedding et construction de l'index, chronométrés.
+
+    Args:
+        raw (pd.DataFrame): export brut (modifié en place)
+        work_dir (str): dossier de travail (index, journal)
+        embeddings (Embeddings): fonction d'embedding (faux serveur + cache)
+        nlp (spacy.Language): pipeline de segmentation (cf. chunking.py)
+        dedup_threshold (float): seuil de dédoublonnage (None = pas de dédoublonnage)
+        index_type (str): type d'index FAISS
+
+    Returns:
+        Tuple[str, dict]: dossier de l'index et mesures
+    """
+    report = {"events": len(raw)}
+
+    start = time.perf_counter()
+    df = to_typed(clean_dataframe(raw))
+    elapsed = time.perf_counter() - start
+    report["normalise_s"] = round(elapsed, 3)
+    report["rows_per_sec"] = rate(len(raw), elapsed)
+
+    start = time.perf_counter()
+    documents, ids = prepare_documents(df, nlp=nlp)
+    elapsed = time.perf_counter() - start
+    report.update(chunks=len(documents), chunk_s=round(elapsed, 3), chunks_per_sec=rate(len(documents), elapsed))
+
+    start = time.perf_counter()
+    if dedup_threshold is not None:
+        documents, ids, _ = dedup_documents(documents, ids, dedup_threshold)
+    report["dedup_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    texts = [doc.page_content for doc in documents]
+    journal = IndexJournal(os.path.join(work_dir, "index_journal"))
+    vectors = embed_with_journal(journal, ids, texts, embeddings)
+    elapsed = time.perf_counter() - start
+    report.update(vectors=len(texts), embed_s=round(elapsed, 3), embeddings_per_sec=rate(len(texts), elapsed))
+
+    index_dir = os.path.join(work_dir, "index")
+    start = time.perf_counter()
+    vectorstore = build_vectorstore(texts, vectors, [doc.metadata for doc in documents], ids, embeddings,
+                                    index_type=index_type)
+    report["build_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    save_vectorstore(index_dir, vectorstore)
+    if index_kind(vectorstore.index) in COMPRESSED_TYPES:
+        save_full_vectors(index_dir, full_vectors(vectorstore, embeddings))
+    DateIndex.from_vectorstore(vectorstore).save(os.path.join(index_dir, DATE_INDEX_FILE))
+    report["save_s"] = round(time.perf_counter() - start, 3)
+    report["index_bytes"] = directory_size(index_dir)
+    journal.clear()
+    return index_dir, report
+
+
+def run_queries(index_dir, embeddings, client, concurrency, n_queries, questions=QUESTIONS):
+    """
+    Envoie `n_queries` questions par `concurrency` threads : recherche hybride
+    puis génération en flux, comme app.py.
+
+    Returns:
+        dict: débit, latences par étape (p50 / p95 / p99) et erreurs
+    """
+    vectorstore = load_vectorstore(index_dir, embeddings, mmap=True)
+    vectors = load_full_vectors(index_dir)
+    date_index = DateIndex.load(os.path.join(index_dir, DATE_INDEX_FILE))
+    lexical = LexicalIndex(os.path.join(index_dir, LEXICAL_DIR))
+    tracer = Tracer(path=None, window=n_queries)
+    modes = {"lexical": 0, "hybrid": 0}
+    lock = threading.Lock()
+
+    def ask(i):
+        question = questions[i % len(questions)]
+        with tracer.trace("query") as trace:
+            try:
+                window = parse_date_window(question)
+                results, query_vector = search_events_hybrid(
+                    vectorstore, question, embeddings.embed_query, lexical, k=4, fetch_k=20,
+                    date_index=date_index, window=window, full_vectors=vectors, trace=trace,
+                )
+                with lock:
+                    modes["lexical" if query_vector is None else "hybrid"] += 1
+                context = "\n\n---\n\n".join(doc.page_content for doc, _ in results)
+                prompt = f"{context}\n\nQuestion : {question}"
+                with trace.span("chat_completion") as span:
+                    stream = client.chat_stream(model=CHAT_MODEL, messages=[ChatMessage(role="user", content=prompt)])
+                    with StreamingReply(stream) as reply:
+                        for _ in reply:
+                            pass
+                    span.set(ttft_ms=None if reply.metrics.ttft is None else round(reply.metrics.ttft * 1000, 3))
+            except Exception as exc:
+                trace.fail(exc)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(ask, range(n_queries)))
+    elapsed = time.perf_counter() - start
+
+    ttft = [span["attrs"]["ttft_ms"] for record in tracer.recent() for span in record["spans"]
+            if span["name"] == "chat_completion" and span.get("attrs", {}).get("ttft_ms") is not None]
+    stats = tracer.stats()
+    return {
+        "concurrency": concurrency,
+        "queries": n_queries,
+        "seconds": round(elapsed, 3),
+        "queries_per_sec": rate(n_queries, elapsed),
+        "errors": stats.get("query", {}).get("errors", 0),
+        "modes": modes,
+        "latency": stats,
+        "ttft_p50_ms": round(float(pd.Series(ttft).median()), 3) if ttft else None,
+    }
+
+
+def run_corpus(size, base_url, options):
+    """
+    Mesures complètes pour un corpus de `size` événements (exécuté dans un processus dédié).
+
+    Args:
+        size (int): nombre d'événements synthétiques
+        base_url (str): URL du faux serveur Mistral
+        options (dict): sentence_mode, dedup_threshold, index_type, requests_per_second,
+            concurrency, queries
+
+    Returns:
+        dict: mesures d'ingestion, d'index, de requêtes et pic de mémoire
+    """
+    client = make_client(base_url)
+    api_embeddings = CustomMistralEmbeddings(client, requests_per_second=options["requests_per_second"])
+    nlp = load_sentence_nlp(options["sentence_mode"])
+    raw = synthetic_events(size)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache = EmbeddingCache(os.path.join(work_dir, "embedding_cache.sqlite"))
+        embeddings = CachedEmbeddings(api_embeddings, cache)
+        index_dir, report = ingest(raw, work_dir, embeddings, nlp, options["dedup_threshold"],
+                                   options["index_type"])
+        del raw
+        cache.close()
+        # Requêtes : embedding non mis en cache, chaque question interroge le serveur
+        report["queries"] = [
+            run_queries(index_dir, api_embeddings, client, concurrency, options["queries"])
+            for concurrency in options["concurrency"]
+        ]
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    return report
+
+
+def print_report(report):
+    print(f"📥 {report['events']} événements : normalisation {report['rows_per_sec']} lignes/s | "
+          f"{report['chunks']} chunks ({report['chunks_per_sec']}/s) | "
+          f"{report['vectors']} vecteurs encodés ({report['embeddings_per_sec']}/s)")
+    print(f"🧱 Index construit en {report['build_s']} s, sauvegardé en {report['save_s']} s, "
+          f"{report['index_bytes'] / 1e6:.1f} Mo | pic RSS {report['peak_rss_bytes'] / 1e6:.0f} Mo")
+    for run in report["queries"]:
+        latency = run["latency"].get("query", {})
+        print(f"🔎 concurrence {run['concurrency']:>3} : {run['queries_per_sec']} req/s | "
+              f"p50={latency.get('p50_ms')}ms p95={latency.get('p95_ms')}ms p99={latency.get('p99_ms')}ms | "
+              f"TTFT p50={run['ttft_p50_ms']}ms | erreurs : {run['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout, hors ligne (faux serveur Mistral)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES), help="tailles de corpus (événements)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16],
+                        help="nombre de requêtes simultanées")
+    parser.add_argument("--queries", type=int, default=200, help="questions par niveau de concurrence")
+    parser.add_argument("--dim", type=int, default=1024, help="dimension des faux embeddings")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence du faux serveur par requête (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="latence par token du chat (s)")
+    parser.add_argument("--requests-per-second", type=float, default=100.0,
+                        help="débit maximal des lots d'embeddings (cf. embedding_engine.py)")
+    parser.add_argument("--sentence-mode", default="senter", choices=["senter", "sentencizer", "parser"])
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES)
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--json", default=None, help="fichier de sortie JSON")
+    args = parser.parse_args(argv)
+
+    options = {
+        "sentence_mode": args.sentence_mode,
+        "dedup_threshold": None if args.no_dedup else args.dedup_threshold,
+        "index_type": args.index_type,
+        "requests_per_second": args.requests_per_second,
+        "concurrency": args.concurrency,
+        "queries": args.queries,
+    }
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {**options, "dim": args.dim, "latency": args.latency, "token_latency": args.token_latency},
+        "corpora": [],
+    }
+
+    # Un processus par corpus (pic RSS propre) ; le faux serveur tourne dans ce processus-ci
+    context = multiprocessing.get_context("spawn")
+    with serve_in_thread(dim=args.dim, latency=args.latency, token_latency=args.token_latency) as (url, state):
+        for size in args.sizes:
+            print(f"\n⏱️ Corpus de {size} événements")
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_corpus, size, url, options).result()
+            print_report(result)
+            report["corpora"].append(result)
+        report["server"] = {"requests": state.requests, "max_in_flight": state.max_in_flight}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Rapport écrit dans '{args.json}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+bench_api.py
+
+Test de charge de l'API HTTP (api.py), hors ligne : les appels Mistral sont
+servis par le faux serveur de fake_mistral.py (latences réglables).
+
+Un index synthétique est construit comme dans bench.py, l'API est démarrée
+dans un thread (sa propre boucle asyncio), puis `--clients` clients
+simultanés envoient `--requests` requêtes /recommend en flux. Les questions
+sont tirées d'une liste courte : des questions identiques arrivent en même
+temps et sont regroupées (cf. api.py).
+
+Mesures par niveau de concurrence :
+- débit (requêtes/s), latence totale et temps jusqu'au premier fragment de
+  texte (p50 / p95 / p99)
+- réponses 503 (contre-pression) et erreurs
+- requêtes regroupées, requêtes et connexions TCP reçues par le faux serveur
+  (moins de connexions que de requêtes : keep-alive du client partagé)
+
+Usage :
+    python bench_api.py --events 2000 --clients 1 16 64 --requests 200 --token-latency 0.005
+    python bench_api.py --max-concurrent 8 --max-queue 8 --json bench_api.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from api import SERVICE, create_app
+from bench import QUESTIONS, ingest, make_client, synthetic_events
+from chunking import load_sentence_nlp
+from mistral_embeddings import CustomMistralEmbeddings
+from fake_mistral import serve_in_thread
+from tracing import Tracer
+
+
+def percentiles(values):
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+class ApiServer:
+    """L'API sur un port libre, dans un thread dédié (boucle asyncio séparée des clients)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(app)
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    async def _start(self):
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    def stats(self):
+        return asyncio.run_coroutine_threadsafe(self._stats(), self._loop).result()
+
+    async def _stats(self):
+        return self.app[SERVICE].stats()
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+async def recommend(session, url, question):
+    """Une requête /recommend lue jusqu'au bout ; (statut, latence, TTFT) en ms."""
+    start = time.perf_counter()
+    ttft = None
+    async with session.post(f"{url}/recommend", json={"query": question}) as response:
+        if response.status != 200:
+            await response.read()
+            return response.status, (time.perf_counter() - start) * 1000, None
+        async for line in response.content:
+            message = json.loads(line)
+            if "error" in message:
+                return "error", (time.perf_counter() - start) * 1000, ttft
+            if ttft is None and message.get("delta"):
+                ttft = (time.perf_counter() - start) * 1000
+    return response.status, (time.perf_counter() - start) * 1000, ttft
+
+
+async def load(url, clients, n_requests, questions=QUESTIONS, seed=0):
+    """`clients` clients simultanés se partagent `n_requests` requêtes."""
+    rng = random.Random(seed)
+    queue = asyncio.Queue()
+    for _ in range(n_requests):
+        queue.put_nowait(rng.choice(questions))
+    outcomes = []
+
+    async def client(session):
+        while not queue.empty():
+            question = queue.get_nowait()
+            try:
+                outcomes.append(await recommend(session, url, question))
+            except aiohttp.ClientError:
+                outcomes.append(("error", None, None))
+
+    connector = aiohttp.TCPConnector(limit=clients)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*[client(session) for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+
+    ok = [latency for status, latency, _ in outcomes if status == 200]
+    return {
+        "clients": clients,
+        "requests": n_requests,
+        "requests_per_sec": round(len(ok) / elapsed, 1) if elapsed > 0 else None,
+        "ok": len(ok),
+        "rejected": sum(status == 503 for status, _, _ in outcomes),
+        "errors": sum(status not in (200, 503) for status, _, _ in outcomes),
+        "latency": percentiles(ok),
+        "ttft": percentiles([ttft for status, _, ttft in outcomes if status == 200 and ttft is not None]),
+    }
+
+
+def run(options):
+    """
+    Index synthétique, faux serveur, API, puis une série de charge par niveau de concurrence.
+
+    Returns:
+        dict: configuration et mesures par niveau de concurrence
+    """
+    report = {"config": options, "runs": []}
+    with serve_in_thread(dim=options["dim"], latency=options["latency"],
+                         token_latency=options["token_latency"]) as (base_url, state), \
+            tempfile.TemporaryDirectory() as work_dir:
+        embeddings = CustomMistralEmbeddings(make_client(base_url), requests_per_second=1000)
+        index_dir, _ = ingest(synthetic_events(options["events"]), work_dir, embeddings,
+                              load_sentence_nlp("sentencizer"))
+        app = create_app(index_dir, "bench", base_url, max_concurrent=options["max_concurrent"],
+                         max_queue=options["max_queue"], max_connections=options["max_connections"],
+                         max_retries=0, tracer=Tracer(path=None))
+        with ApiServer(app) as server:
+            for clients in options["clients"]:
+                before = (state.requests, state.connections, server.stats())
+                run_report = asyncio.run(load(server.url, clients, options["requests"]))
+                stats = server.stats()
+                run_report.update(
+                    coalesced=stats["coalesced"] - before[2]["coalesced"],
+                    mistral_requests=state.requests - before[0],
+                    mistral_connections=state.connections - before[1],
+                    mistral_max_in_flight=state.max_in_flight,
+                    stages=stats["latency"],
+                )
+                report["runs"].append(run_report)
+    return report
+
+
+def print_report(report):
+    for run_report in report["runs"]:
+        latency, ttft = run_report["latency"], run_report["ttft"]
+        print(f"🔎 {run_report['clients']:>3} clients : {run_report['requests_per_sec']} req/s | "
+              f"p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms | "
+              f"TTFT p50={ttft['p50_ms']}ms | 503 : {run_report['rejected']} | erreurs : {run_report['errors']}")
+        print(f"   ↳ {run_report['coalesced']} requêtes regroupées | Mistral : "
+              f"{run_report['mistral_requests']} requêtes sur {run_report['mistral_connections']} connexions")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge de l'API (faux serveur Mistral)")
+    parser.add_argument("--events", type=int, default=2000, help="taille du corpus synthétique")
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 16, 64], help="clients simultanés")
+    parser.add_argument("--requests", type=int, default=200, help="requêtes par niveau de concurrence")
+    parser.add_argument("--max-concurrent", type=int, default=32, help="cf. api.py")
+    parser.add_argument("--max-queue", type=int, default=64, help="cf. api.py")
+    parser.add_argument("--max-connections", type=int, default=64, help="connexions vers Mistral")
+    parser.add_argument("--dim", type=int, default=1024, help="dimension des embeddings")
+    parser.add_argument("--latency", type=float, default=0.02, help="latence par requête Mistral (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="délai entre deux tokens (s)")
+    parser.add_argument("--json", help="fichier du rapport JSON")
+    args = parser.parse_args(argv)
+
+    options = {"events": args.events, "clients": args.clients, "requests": args.requests,
+               "max_concurrent": args.max_concurrent, "max_queue": args.max_queue,
+               "max_connections": args.max_connections, "dim": args.dim, "latency": args.latency,
+               "token_latency": args.token_latency}
+    report = run(options)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport écrit dans {os.path.abspath(args.json)}")
+
+
+if __name__ == "__main__":
+    main()
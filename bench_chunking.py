@@ -0,0 +1,115 @@
+"""
+bench_chunking.py
+
+Benchmark du découpage en chunks : ancien `chunk_text_nlp` (pipeline spaCy
+complet, texte par texte) contre `chunk_texts` (`nlp.pipe` par lots, pipeline
+réduit, multiprocessing).
+
+Pour chaque configuration : débit (textes/s, chunks/s) et concordance des
+frontières de chunks avec la référence (part des textes découpés à
+l'identique, part des textes aux mêmes frontières, nombre total de chunks).
+Le multiprocessing n'est rentable que sur de gros volumes (coût de démarrage
+des processus et de transfert des `Doc`).
+
+Usage :
+    python bench_chunking.py --dataset evenements_paris.parquet --limit 2000 --processes 1 4
+"""
+
+import argparse
+import json
+import time
+
+from chunking import chunk_text_nlp, chunk_texts, load_sentence_nlp
+from dataset import DATASET_PATH, read_events
+from embedding import prepare_events
+
+
+def run_reference(texts, max_chars):
+    nlp = load_sentence_nlp("parser")
+    start = time.perf_counter()
+    chunks = [chunk_text_nlp(text, max_chars=max_chars, nlp=nlp) for text in texts]
+    return chunks, time.perf_counter() - start
+
+
+def run_pipeline(texts, mode, n_process, batch_size, max_chars):
+    nlp = load_sentence_nlp(mode)
+    start = time.perf_counter()
+    chunks = list(chunk_texts(texts, nlp=nlp, max_chars=max_chars,
+                              batch_size=batch_size, n_process=n_process))
+    return chunks, time.perf_counter() - start
+
+
+def _without_spaces(chunks):
+    return ["".join(chunk.split()) for chunk in chunks]
+
+
+def compare(reference, candidate):
+    """
+    Concordance des découpages avec la référence.
+
+    `same_boundaries_pct` ignore les espaces : les segmenteurs ne placent pas
+    toujours la frontière au même endroit dans une ponctuation double (« .. »),
+    ce qui change l'espacement sans changer le contenu des chunks.
+    """
+    same = sum(1 for ref, cand in zip(reference, candidate) if ref == cand)
+    same_boundaries = sum(
+        1 for ref, cand in zip(reference, candidate)
+        if _without_spaces(ref) == _without_spaces(cand)
+    )
+    return {
+        "identical_texts_pct": round(100 * same / max(1, len(reference)), 2),
+        "same_boundaries_pct": round(100 * same_boundaries / max(1, len(reference)), 2),
+        "chunks": sum(len(c) for c in candidate),
+        "reference_chunks": sum(len(c) for c in reference),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du découpage en chunks")
+    parser.add_argument("--dataset", "--csv", dest="dataset", default=DATASET_PATH)
+    parser.add_argument("--limit", type=int, default=None, help="nombre max d'événements")
+    parser.add_argument("--modes", nargs="+", default=["senter", "sentencizer"])
+    parser.add_argument("--processes", nargs="+", type=int, default=[1])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-chars", type=int, default=500)
+    parser.add_argument("--json", default=None, help="fichier de sortie JSON")
+    args = parser.parse_args(argv)
+
+    df = read_events(args.dataset)
+    if args.limit:
+        df = df.head(args.limit)
+    texts = [full_text for _, full_text, _ in prepare_events(df)]
+    print(f"📥 {len(texts)} textes à découper")
+
+    reference, elapsed = run_reference(texts, args.max_chars)
+    results = [{
+        "config": "chunk_text_nlp (parser, texte par texte)",
+        "seconds": round(elapsed, 3),
+        "texts_per_sec": round(len(texts) / elapsed, 1),
+        "chunks_per_sec": round(sum(len(c) for c in reference) / elapsed, 1),
+        **compare(reference, reference),
+    }]
+
+    for mode in args.modes:
+        for n_process in args.processes:
+            chunks, elapsed = run_pipeline(texts, mode, n_process, args.batch_size, args.max_chars)
+            results.append({
+                "config": f"chunk_texts ({mode}, n_process={n_process})",
+                "seconds": round(elapsed, 3),
+                "texts_per_sec": round(len(texts) / elapsed, 1),
+                "chunks_per_sec": round(sum(len(c) for c in chunks) / elapsed, 1),
+                **compare(reference, chunks),
+            })
+
+    for r in results:
+        print(f"⏱️ {r['config']:<45} {r['texts_per_sec']:>9} textes/s {r['chunks_per_sec']:>9} chunks/s"
+              f" | identiques : {r['identical_texts_pct']}% | mêmes frontières : {r['same_boundaries_pct']}%"
+              f" ({r['chunks']}/{r['reference_chunks']} chunks)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+bench_index.py
+
+Rapport de compromis entre types d'index FAISS (cf. index_types.py).
+
+Pour chaque type et chaque réglage de recherche (`nprobe`, `efSearch`) :
+- recall@k par rapport à l'index exact (flat)
+- latence par requête unitaire, p50 / p99 (ms)
+- temps de construction (entraînement compris)
+- taille de l'index (sérialisé) et mémoire résidente ajoutée par la construction
+- temps de chargement et mémoire ajoutée : lecture complète vs mmap
+- pour les types compressés (fp16, sq8, ivfpq) : recall après re-classement
+  exact de `k × facteur` candidats (cf. vector_storage.py)
+
+Les vecteurs proviennent d'un index existant (`--index-dir`) ou d'un corpus
+synthétique (`--synthetic N`) pour simuler plusieurs années ou plusieurs villes.
+
+Usage :
+    python bench_index.py --index-dir faiss_langchain_index --json index_report.json
+    python bench_index.py --synthetic 200000 --types flat ivf hnsw ivfpq --nprobe 4 16 64
+    python bench_index.py --synthetic 100000 --types flat fp16 sq8 --rescore-factor 2 4 8
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from index_types import COMPRESSED_TYPES, INDEX_TYPES, build_faiss_index, set_search_params
+from vector_storage import rescore
+
+
+def rss_bytes():
+    """Mémoire résidente du processus (Linux), ou None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def load_vectors(index_dir):
+    """Relit les vecteurs d'un index sauvegardé par embedding.py."""
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ):
+            print("⚠️ Index IVF-PQ : vecteurs reconstruits avec perte")
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(n, dim, clusters=200, seed=0):
+    """Vecteurs unitaires groupés en thèmes, proches d'un corpus d'embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    queries = picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32)
+    return np.ascontiguousarray(queries / np.linalg.norm(queries, axis=1, keepdims=True))
+
+
+def load_costs(index):
+    """Temps (ms) et mémoire ajoutée pour relire l'index : lecture complète, puis mmap."""
+    costs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.faiss")
+        faiss.write_index(index, path)
+        for name, flags in (("load", 0), ("load_mmap", faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)):
+            rss_before = rss_bytes()
+            start = time.perf_counter()
+            loaded = faiss.read_index(path, flags)
+            costs[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            rss_after = rss_bytes()
+            costs[f"{name}_rss_delta_bytes"] = None if rss_before is None else rss_after - rss_before
+            del loaded
+    return costs
+
+
+def measure(index, queries, ground_truth, k, full_vectors=None, rescore_factor=None):
+    """Recall@k et latences (ms) en requêtes unitaires, avec re-classement exact si demandé."""
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        if full_vectors is None:
+            _, positions = index.search(query[None, :], k)
+            positions = positions[0]
+        else:
+            _, candidates = index.search(query[None, :], k * rescore_factor)
+            _, positions = rescore(full_vectors, query, candidates[0], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(positions)
+    recall = np.mean([
+        len(set(f.tolist()) & set(gt.tolist())) / k for f, gt in zip(found, ground_truth)
+    ])
+    return {
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparaison des types d'index FAISS")
+    parser.add_argument("--index-dir", default="faiss_langchain_index")
+    parser.add_argument("--synthetic", type=int, default=None, help="taille d'un corpus synthétique")
+    parser.add_argument("--dim", type=int, default=1024, help="dimension (corpus synthétique)")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[16, 64, 256])
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--rescore-factor", nargs="+", type=int, default=[4],
+                        help="surnombre de candidats re-classés (types compressés)")
+    parser.add_argument("--json", default=None, help="fichier de sortie JSON")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        vectors = load_vectors(args.index_dir)
+    queries = make_queries(vectors, args.queries)
+    print(f"📥 {len(vectors)} vecteurs de dimension {vectors.shape[1]}, {len(queries)} requêtes")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, args.k)
+    del exact
+
+    # Vecteurs exacts sur disque, projetés en mémoire comme dans app.py
+    tmp_dir = tempfile.TemporaryDirectory()
+    full_path = os.path.join(tmp_dir.name, "vectors.npy")
+    np.save(full_path, vectors)
+    full_vectors = np.load(full_path, mmap_mode="r")
+
+    report = []
+    for kind in args.types:
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, kind=kind, nlist=args.nlist, pq_m=args.pq_m,
+                                  hnsw_m=args.hnsw_m)
+        build_s = time.perf_counter() - start
+        rss_after = rss_bytes()
+        base = {
+            "type": kind,
+            "build_s": round(build_s, 3),
+            "index_bytes": int(faiss.serialize_index(index).nbytes),
+            "rss_delta_bytes": None if rss_before is None else rss_after - rss_before,
+            **load_costs(index),
+        }
+        if kind in ("ivf", "ivfpq"):
+            settings = [("nprobe", value) for value in args.nprobe]
+        elif kind == "hnsw":
+            settings = [("efSearch", value) for value in args.ef_search]
+        else:
+            settings = [(None, None)]
+
+        for name, value in settings:
+            if name == "nprobe":
+                set_search_params(index, nprobe=value)
+            elif name == "efSearch":
+                set_search_params(index, ef_search=value)
+            row = {**base, "param": name, "value": value, **measure(index, queries, ground_truth, args.k)}
+            report.append(row)
+            setting = f"{name}={value}" if name else ""
+            print(f"🔎 {kind:<6} {setting:<13} recall@{args.k}={row['recall_at_k']:.3f} "
+                  f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms "
+                  f"taille={row['index_bytes'] / 1e6:.1f} Mo construction={row['build_s']:.1f}s "
+                  f"chargement={row['load_ms']:.0f}ms (mmap {row['load_mmap_ms']:.0f}ms)")
+            if kind not in COMPRESSED_TYPES:
+                continue
+            for factor in args.rescore_factor:
+                rescored = {**row, "rescore_factor": factor,
+                            **measure(index, queries, ground_truth, args.k, full_vectors, factor)}
+                report.append(rescored)
+                print(f"   ↳ re-classement ×{factor:<3} recall@{args.k}={rescored['recall_at_k']:.3f} "
+                      f"p50={rescored['p50_ms']:.3f}ms p99={rescored['p99_ms']:.3f}ms")
+        del index
+
+    del full_vectors
+    tmp_dir.cleanup()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
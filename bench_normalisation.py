@@ -0,0 +1,121 @@
+"""
+bench_normalisation.py
+
+Benchmark de la normalisation des textes : ancienne méthode (BeautifulSoup
+pour chaque cellule, `df[col].map`) contre `normalize_dataframe`
+(normalisation.py), avec ou sans pool de processus.
+
+Pour chaque configuration : débit (lignes/s) et identité de la sortie avec
+la référence (CSV comparés octet par octet).
+
+Les données viennent d'un export brut OpenAgenda (`--csv`, avant nettoyage)
+ou d'un export synthétique (`--synthetic N`) : descriptions HTML, lieux,
+adresses et mots-clés très répétés, liens.
+
+Usage :
+    python bench_normalisation.py --synthetic 50000 --processes 1 4
+    python bench_normalisation.py --csv export_brut.csv --json normalisation_report.json
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from normalisation import normalize_dataframe, normalize_text_reference
+
+VENUES = ["<b>Musée Zadkine</b>", "Jardins du Palais-Royal", "Bibliothèque André Malraux",
+          "Mairie du 9e", "Cité de Refuge", "Théâtre de la Ville &amp; Châtelet"]
+KEYWORDS = ["Concert;Gratuit", "Exposition", "Atelier;Enfants", "Danse", "Conférence;Histoire"]
+
+
+def synthetic_export(n, seed=0):
+    """Export brut synthétique, proche d'un export OpenAgenda."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        venue = rng.choice(VENUES)
+        rows.append({
+            "Identifiant": 1000 + i,
+            "Titre": f"Événement N°{i % 5000}",
+            "Description": f"<p>Concert <strong>gratuit</strong> en plein air n°{i}.</p>",
+            "Description longue": (f"<p>Rendez-vous au {venue}&nbsp;: entrée libre.</p>"
+                                   f"<ul><li>Durée : {rng.randint(1, 3)} h</li><li>Tout public</li></ul>"),
+            "Mots clés": rng.choice(KEYWORDS),
+            "Nom du lieu": venue,
+            "Adresse": f"{rng.randint(1, 40)} rue de Rivoli",
+            "Ville": "Paris",
+            "Lien": f"https://openagenda.com/Events/{i}",
+        })
+    return pd.DataFrame(rows)
+
+
+def run_reference(df):
+    df = df.copy()
+    start = time.perf_counter()
+    for col in df.select_dtypes(include=["object", "string"]):
+        df[col] = df[col].map(normalize_text_reference)
+    return df, time.perf_counter() - start
+
+
+def run_fast(df, processes):
+    df = df.copy()
+    executor = ProcessPoolExecutor(processes) if processes > 1 else None
+    start = time.perf_counter()
+    try:
+        normalize_dataframe(df, executor=executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return df, time.perf_counter() - start
+
+
+def to_csv_bytes(df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, sep=";", index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la normalisation des textes")
+    parser.add_argument("--csv", default=None, help="export brut (non normalisé)")
+    parser.add_argument("--synthetic", type=int, default=20000, help="taille de l'export synthétique")
+    parser.add_argument("--processes", nargs="+", type=int, default=[1])
+    parser.add_argument("--json", default=None, help="fichier de sortie JSON")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv, sep=";") if args.csv else synthetic_export(args.synthetic)
+    print(f"📥 {len(df)} lignes, {len(df.columns)} colonnes")
+
+    reference, elapsed = run_reference(df)
+    expected = to_csv_bytes(reference)
+    results = [{
+        "config": "BeautifulSoup par cellule",
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(len(df) / elapsed, 1),
+        "identical": True,
+    }]
+    for processes in args.processes:
+        normalized, elapsed = run_fast(df, processes)
+        results.append({
+            "config": f"normalize_dataframe (processes={processes})",
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(len(df) / elapsed, 1),
+            "identical": to_csv_bytes(normalized) == expected,
+        })
+
+    for r in results:
+        print(f"⏱️ {r['config']:<40} {r['rows_per_sec']:>10} lignes/s ({r['seconds']} s)"
+              f" | identique : {'✅' if r['identical'] else '❌'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+chunking.py
+
+Segmentation des descriptions d'événements en chunks, sans couper les phrases.
+
+Le découpage n'a besoin que des frontières de phrases : au lieu d'appeler le
+pipeline spaCy complet (tagger, parser, NER, lemmatiseur) texte par texte,
+`chunk_texts` fait passer les textes par lots dans `nlp.pipe` avec un
+pipeline réduit à la segmentation, éventuellement réparti sur plusieurs
+processus.
+
+Modes de segmentation (`load_sentence_nlp`) :
+- "senter" : composant statistique `senter` de fr_core_news_sm, seul (défaut)
+- "sentencizer" : règles de ponctuation sur un pipeline vide (le plus rapide)
+- "parser" : pipeline complet, comme l'ancien `chunk_text_nlp` (référence)
+
+spaCy n'est importé qu'au chargement d'un pipeline : importer ce module (par
+exemple pour `embedding.py --help`) reste rapide.
+"""
+
+MODEL = "fr_core_news_sm"
+
+# Composants inutiles pour la segmentation en phrases
+SENTER_EXCLUDE = ["tok2vec", "morphologizer", "parser", "attribute_ruler", "lemmatizer", "ner"]
+
+_full_nlp = None
+
+
+def load_sentence_nlp(mode="senter", model=MODEL):
+    """
+    Charge un pipeline spaCy limité à la segmentation en phrases.
+
+    Args:
+        mode (str): "senter", "sentencizer" ou "parser"
+        model (str): modèle spaCy à charger
+
+    Returns:
+        spacy.Language: pipeline prêt pour `nlp.pipe`
+    """
+    import spacy
+
+    if mode == "senter":
+        nlp = spacy.load(model, exclude=SENTER_EXCLUDE)
+        nlp.enable_pipe("senter")
+        return nlp
+    if mode == "sentencizer":
+        nlp = spacy.blank("fr")
+        nlp.add_pipe("sentencizer")
+        return nlp
+    if mode == "parser":
+        return spacy.load(model)
+    raise ValueError(f"Mode de segmentation inconnu : {mode}")
+
+
+def pack_sentences(sentences, max_chars=500):
+    """
+    Regroupe des phrases successives en chunks d'au plus `max_chars` caractères.
+
+    Une phrase plus longue que `max_chars` forme un chunk à elle seule.
+
+    Args:
+        sentences (Iterable[str]): phrases dans l'ordre du texte
+        max_chars (int): taille max par chunk
+
+    Returns:
+        List[str]: liste de segments textuels
+    """
+    chunks = []
+    buffer = ""
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(buffer) + len(sentence) + 1 <= max_chars:
+            buffer += " " + sentence if buffer else sentence
+        else:
+            if buffer:
+                chunks.append(buffer.strip())
+            buffer = sentence
+    if buffer:
+        chunks.append(buffer.strip())
+    return chunks
+
+
+def chunk_text_nlp(text, max_chars=500, nlp=None):
+    """
+    Segmente un texte en plusieurs chunks sans couper les phrases.
+
+    Version historique, texte par texte ; par défaut avec le pipeline spaCy
+    complet. Conservée comme référence (cf. bench_chunking.py).
+
+    Args:
+        text (str): le texte à segmenter
+        max_chars (int): taille max par chunk
+        nlp (spacy.Language): pipeline à utiliser (complet par défaut)
+
+    Returns:
+        List[str]: liste de segments textuels
+    """
+    global _full_nlp
+    if nlp is None:
+        if _full_nlp is None:
+            import spacy
+
+            _full_nlp = spacy.load(MODEL)
+        nlp = _full_nlp
+    return pack_sentences((sent.text for sent in nlp(text).sents), max_chars)
+
+
+def chunk_texts(texts, nlp=None, max_chars=500, batch_size=256, n_process=1):
+    """
+    Segmente un flux de textes par lots via `nlp.pipe`.
+
+    Args:
+        texts (Iterable[str]): textes à segmenter
+        nlp (spacy.Language): pipeline de segmentation (mode "senter" par défaut)
+        max_chars (int): taille max par chunk
+        batch_size (int): nombre de textes par lot spaCy
+        n_process (int): nombre de processus (1 = pas de multiprocessing)
+
+    Yields:
+        List[str]: chunks de chaque texte, dans l'ordre d'entrée
+    """
+    if nlp is None:
+        nlp = load_sentence_nlp()
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+        yield pack_sentences((sent.text for sent in doc.sents), max_chars)
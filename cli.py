@@ -0,0 +1,135 @@
+"""
+cli.py
+
+Point d'entrée unique de l'assistant : une sous-commande par étape du
+pipeline, chacune déléguée au `main` du module concerné.
+
+Sous-commandes :
+- fetch : récupération et nettoyage des événements (liste_event.py)
+- index : construction ou mise à jour de l'index (embedding.py)
+- serve : API HTTP (api.py) ; `serve --ui` lance l'interface Streamlit (app.py)
+- bench : benchmark de bout en bout (bench.py)
+- shards : shards mensuels de l'index, expiration des mois écoulés (shards.py)
+- validate : validation du fichier des événements, rapport par règle (validation.py)
+- startup : mesure le temps d'import de chaque sous-commande et du chemin
+  des requêtes, dans des processus neufs
+
+Les modules ne sont importés qu'une fois la sous-commande choisie : `--help`
+ou `serve` ne chargent ni pandas, ni spaCy, ni BeautifulSoup, qui ne servent
+qu'à la récupération et à l'indexation.
+
+Usage :
+    python cli.py fetch --stream
+    python cli.py index --index-type sq8
+    python cli.py serve --port 8080
+    python cli.py serve --ui
+    python cli.py shards --expire
+    python cli.py validate --json validation_report.json
+    python cli.py startup --runs 5
+"""
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    "fetch": ("liste_event", "récupère et nettoie les événements"),
+    "index": ("embedding", "construit ou met à jour l'index"),
+    "serve": ("api", "API HTTP de recommandation (--ui : interface Streamlit)"),
+    "bench": ("bench", "benchmark de bout en bout"),
+    "shards": ("shards", "liste et expire les shards mensuels de l'index"),
+    "validate": ("validation", "valide le fichier des événements (rapport par règle)"),
+}
+
+# Modules importés pour répondre à une question (app.py, api.py)
+QUERY_PATH = ("mistral_embeddings", "query_cache", "retrieval", "shards", "prompt", "streaming", "tracing")
+
+# Dépendances lourdes, réservées à la récupération et à l'indexation
+HEAVY_MODULES = ("spacy", "pandas", "bs4", "langchain_community.vectorstores")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(modules, runs=3):
+    """
+    Temps d'import de `modules` dans des processus Python neufs (meilleur de `runs`).
+
+    Args:
+        modules (Iterable[str]): modules importés dans l'ordre
+        runs (int): nombre de processus lancés
+
+    Returns:
+        dict: import_ms et process_ms (démarrage de l'interpréteur compris),
+        dépendances lourdes chargées au passage
+    """
+    code = PROBE.format(modules=tuple(modules), heavy=HEAVY_MODULES)
+    best = None
+    for _ in range(max(runs, 1)):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True,
+                                capture_output=True, text=True).stdout
+        process = time.perf_counter() - start
+        probe = json.loads(output.splitlines()[-1])
+        if best is None or probe["seconds"] < best["import_ms"] / 1000:
+            best = {"import_ms": round(probe["seconds"] * 1000, 1), "loaded": probe["loaded"]}
+        best["process_ms"] = round(min(process * 1000, best.get("process_ms", float("inf"))), 1)
+    return best
+
+
+def startup(argv):
+    parser = argparse.ArgumentParser(prog="cli.py startup", description="Temps de démarrage par sous-commande")
+    parser.add_argument("--runs", type=int, default=3, help="processus par mesure (on garde le meilleur)")
+    parser.add_argument("--json", help="fichier du rapport JSON")
+    args = parser.parse_args(argv)
+
+    targets = {"cli": ("cli",), "requêtes": QUERY_PATH}
+    targets.update((name, (module,)) for name, (module, _) in COMMANDS.items())
+    report = {}
+    for name, modules in targets.items():
+        report[name] = measure_import(modules, args.runs)
+        loaded = ", ".join(report[name]["loaded"]) or "aucune"
+        print(f"⏱️ {name:<9} import {report[name]['import_ms']:>7.1f} ms | processus "
+              f"{report[name]['process_ms']:>7.1f} ms | dépendances lourdes : {loaded}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport écrit dans {os.path.abspath(args.json)}")
+    return report
+
+
+def main(argv=None):
+    commands = "\n".join(f"  {name:<8} {description}" for name, (_, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Assistant de recommandation d'événements",
+        epilog=f"sous-commandes :\n{commands}\n  startup  temps d'import de chaque sous-commande\n\n"
+               "`python cli.py <sous-commande> --help` pour les options de chacune.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=[*COMMANDS, "startup"], metavar="sous-commande")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        return startup(args.args)
+    if args.command == "serve" and "--ui" in args.args:
+        rest = [arg for arg in args.args if arg != "--ui"]
+        return subprocess.call([sys.executable, "-m", "streamlit", "run", os.path.join(HERE, "app.py"), *rest])
+    module, _ = COMMANDS[args.command]
+    return importlib.import_module(module).main(args.args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+dataset.py
+
+Format intermédiaire des événements entre l'ingestion (liste_event.py), la
+validation (test_donnee.py) et l'indexation (embedding.py) : un fichier
+Parquet typé, `evenements_paris.parquet`.
+
+- identifiants et textes : chaînes
+- dates (première/dernière date, début/fin) : timestamps UTC
+
+Le CSV reste disponible comme export optionnel : `write_events` choisit le
+format d'après l'extension, et `read_events` accepte aussi un CSV (typé à
+la lecture), pour les fichiers produits par une version précédente.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DATASET_PATH = "evenements_paris.parquet"
+ID_COLUMN = "Identifiant"
+DATE_COLUMNS = (
+    "Première date - Début",
+    "Première date - Fin",
+    "Dernière date - Début",
+    "Dernière date - Fin",
+)
+
+
+def is_parquet(path):
+    return str(path).endswith(".parquet")
+
+
+def to_typed(df):
+    """
+    Type un DataFrame lu en texte : dates en timestamps UTC, le reste en chaînes.
+
+    Les textes étant passés en minuscules à l'ingestion, le séparateur « t »
+    des dates ISO est remis en majuscule avant le parsing ; une date
+    invalide devient NaT.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            if not isinstance(df[col].dtype, pd.DatetimeTZDtype):
+                values = df[col].astype("string").str.upper()
+                df[col] = pd.to_datetime(values, utc=True, errors="coerce", format="ISO8601")
+        else:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def schema_for(columns):
+    """Schéma Arrow du fichier typé pour ces colonnes."""
+    return pa.schema([
+        (col, pa.timestamp("ns", tz="UTC") if col in DATE_COLUMNS else pa.string())
+        for col in columns
+    ])
+
+
+def write_events(df, path):
+    """
+    Écrit les événements : Parquet typé, ou CSV (`;`) si `path` finit par .csv.
+
+    L'écriture passe par un fichier temporaire : un lecteur ne voit jamais
+    de fichier partiel.
+    """
+    tmp = f"{path}.tmp"
+    if is_parquet(path):
+        df = to_typed(df)
+        table = pa.Table.from_pandas(df, schema=schema_for(df.columns), preserve_index=False)
+        pq.write_table(table, tmp)
+    else:
+        df.to_csv(tmp, sep=';', index=False)
+    os.replace(tmp, path)
+
+
+def write_events_chunks(chunks, path):
+    """
+    Écrit une suite de DataFrames (mêmes colonnes) sans les concaténer en mémoire.
+
+    Returns:
+        int: nombre de lignes écrites
+    """
+    tmp = f"{path}.tmp"
+    rows = 0
+    writer = None
+    try:
+        for i, chunk in enumerate(chunks):
+            rows += len(chunk)
+            if is_parquet(path):
+                chunk = to_typed(chunk)
+                if writer is None:
+                    schema = schema_for(chunk.columns)
+                    writer = pq.ParquetWriter(tmp, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            else:
+                chunk.to_csv(tmp, sep=';', index=False, mode='w' if i == 0 else 'a', header=i == 0)
+    finally:
+        if writer is not None:
+            writer.close()
+    if os.path.exists(tmp):
+        os.replace(tmp, path)
+    return rows
+
+
+def read_events(path, columns=None):
+    """
+    Lit les événements typés (Parquet, ou CSV typé à la lecture).
+
+    Args:
+        path (str): fichier .parquet ou .csv
+        columns (List[str]): colonnes à lire (toutes par défaut)
+
+    Returns:
+        pd.DataFrame: événements, dates en timestamps UTC et identifiants en chaînes
+    """
+    if is_parquet(path):
+        return to_typed(pd.read_parquet(path, columns=columns))
+    return to_typed(pd.read_csv(path, sep=';', dtype=str, usecols=columns))
+
+
+def export_csv(path, csv_path, batch_size=10000):
+    """Export CSV (`;`) du fichier typé, par lots."""
+    if not is_parquet(path):
+        chunks = pd.read_csv(path, sep=';', dtype=str, chunksize=batch_size)
+    else:
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size))
+    return write_events_chunks(chunks, csv_path)
+
+
+def format_date(values):
+    """
+    Dates typées -> chaînes ISO telles qu'écrites par l'ingestion
+    (minuscules : « 2024-06-21t11:30:00+00:00 »), "" si absente.
+
+    Comme `isoformat()`, la fraction de seconde n'apparaît que si elle est
+    non nulle.
+    """
+    dates = values.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[us]")
+    seconds = np.datetime_as_string(dates, unit="s").tolist()
+    micro = (dates.astype(np.int64) % 1_000_000).tolist()
+    missing = np.isnat(dates).tolist()
+    formatted = [
+        "" if nat else f"{text.replace('T', 't')}{f'.{us:06d}' if us else ''}+00:00"
+        for text, us, nat in zip(seconds, micro, missing)
+    ]
+    return pd.Series(formatted, index=values.index, dtype=object)
@@ -0,0 +1,196 @@
+"""
+date_filter.py
+
+Index des dates d'événements, pour ne chercher que parmi les événements de la
+période demandée (à venir, ce week-end, demain...).
+
+Construit à l'indexation à partir des métadonnées `firstdate_begin` et
+`lastdate_end`, il tient dans deux tableaux numpy triés par date de fin
+(timestamps epoch en secondes) alignés sur les positions FAISS. Une fenêtre
+[début, fin] se résout par une recherche dichotomique puis un masque
+vectorisé, et donne la liste des ids FAISS à passer en pré-filtre à la
+recherche (cf. retrieval.py).
+"""
+
+import re
+import unicodedata
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+DATE_INDEX_FILE = "date_index.npz"
+PARIS = ZoneInfo("Europe/Paris")
+
+# Bornes utilisées pour les événements sans date exploitable (toujours retenus)
+MIN_TS = np.iinfo(np.int64).min
+MAX_TS = np.iinfo(np.int64).max
+
+
+def parse_timestamp(value):
+    """
+    Convertit une date ISO du CSV en timestamp epoch (secondes).
+
+    Les textes étant passés en minuscules à l'ingestion, le séparateur
+    « t » est remis en majuscule avant le parsing.
+
+    Returns:
+        int or None: timestamp, ou None si la date est absente/invalide
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().upper())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=PARIS)
+    return int(parsed.timestamp())
+
+
+class DateIndex:
+    """
+    Intervalles [début, fin] des vecteurs de l'index, triés par date de fin.
+
+    Attributs :
+        end (np.ndarray[int64]) : dates de fin, triées
+        begin (np.ndarray[int64]) : dates de début, dans le même ordre
+        ids (np.ndarray[int64]) : positions FAISS correspondantes
+    """
+
+    def __init__(self, begin, end, ids):
+        order = np.argsort(end, kind="stable")
+        self.begin = np.asarray(begin, dtype=np.int64)[order]
+        self.end = np.asarray(end, dtype=np.int64)[order]
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+
+    @classmethod
+    def from_metadatas(cls, metadatas):
+        """
+        Construit l'index à partir de (position FAISS, métadonnées).
+
+        Args:
+            metadatas (Iterable[Tuple[int, dict]]): métadonnées par position
+        """
+        begin, end, ids = [], [], []
+        for position, metadata in metadatas:
+            start = parse_timestamp(metadata.get("firstdate_begin"))
+            stop = parse_timestamp(metadata.get("lastdate_end"))
+            begin.append(MIN_TS if start is None else start)
+            end.append(MAX_TS if stop is None else stop)
+            ids.append(position)
+        return cls(begin, end, ids)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """
+        Construit l'index à partir d'un vectorstore FAISS LangChain.
+
+        Un vecteur partagé par des chunks dédoublonnés (cf. dedup.py) y figure
+        une fois par événement membre, avec les dates de chacun.
+        """
+        def metadatas():
+            for position, doc_id in vectorstore.index_to_docstore_id.items():
+                metadata = vectorstore.docstore.search(doc_id).metadata
+                yield position, metadata
+                for member in metadata.get("members", ()):
+                    yield position, member
+        return cls.from_metadatas(metadatas())
+
+    def save(self, path):
+        np.savez(path, begin=self.begin, end=self.end, ids=self.ids)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls.__new__(cls)
+        index.begin, index.end, index.ids = data["begin"], data["end"], data["ids"]
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, start=None, stop=None):
+        """
+        Positions FAISS des événements qui chevauchent [start, stop].
+
+        Args:
+            start (int): début de la fenêtre (timestamp), None = pas de borne
+            stop (int): fin de la fenêtre (timestamp), None = pas de borne
+
+        Returns:
+            np.ndarray[int64]: positions FAISS, sans doublon
+        """
+        first = 0 if start is None else np.searchsorted(self.end, start, side="left")
+        ids = self.ids[first:]
+        if stop is not None:
+            ids = ids[self.begin[first:] <= stop]
+        return np.unique(ids)
+
+
+def overlaps(metadata, start=None, stop=None):
+    """Vrai si l'événement décrit par `metadata` chevauche [start, stop] (dates absentes : vrai)."""
+    begin = parse_timestamp(metadata.get("firstdate_begin"))
+    end = parse_timestamp(metadata.get("lastdate_end"))
+    if start is not None and end is not None and end < start:
+        return False
+    if stop is not None and begin is not None and begin > stop:
+        return False
+    return True
+
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=PARIS)
+
+
+def parse_date_window(query, now=None):
+    """
+    Déduit d'une question la fenêtre de dates recherchée.
+
+    Reconnaît « aujourd'hui », « ce soir », « demain », « ce week-end »,
+    « cette semaine », « la semaine prochaine », « ce mois-ci ». À défaut,
+    la fenêtre couvre les événements à venir (fin ≥ maintenant).
+
+    Args:
+        query (str): question de l'utilisateur
+        now (datetime): instant de référence (maintenant par défaut)
+
+    Returns:
+        Tuple[int, int or None]: (début, fin) en timestamps epoch
+    """
+    now = (now or datetime.now(PARIS)).astimezone(PARIS)
+    today = now.date()
+    text = _fold(query)
+
+    def window(first_day, days):
+        start = max(now, _day_start(first_day))
+        stop = _day_start(first_day + timedelta(days=days))
+        return int(start.timestamp()), int(stop.timestamp()) - 1
+
+    if re.search(r"\b(aujourd['’]?hui|ce soir|cet apres-midi|ce matin)\b", text):
+        return window(today, 1)
+    if re.search(r"\bapres-demain\b", text):
+        return window(today + timedelta(days=2), 1)
+    if re.search(r"\bdemain\b", text):
+        return window(today + timedelta(days=1), 1)
+    if re.search(r"\bweek-?end\b", text):
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:
+            saturday = today - timedelta(days=1)
+        return window(saturday, 2)
+    if re.search(r"\bsemaine prochaine\b", text):
+        monday = today + timedelta(days=7 - today.weekday())
+        return window(monday, 7)
+    if re.search(r"\bcette semaine\b", text):
+        monday = today - timedelta(days=today.weekday())
+        return window(monday, 7)
+    if re.search(r"\bce mois(-ci)?\b", text):
+        first = today.replace(day=1)
+        next_month = (first + timedelta(days=32)).replace(day=1)
+        return window(first, (next_month - first).days)
+    return int(now.timestamp()), None
@@ -0,0 +1,200 @@
+"""
+dedup.py
+
+Déduplication des chunks avant l'embedding.
+
+Les événements récurrents (visites hebdomadaires, Journées du Patrimoine...)
+ont souvent des descriptions identiques ou presque. Plutôt que d'encoder et
+de stocker chaque copie, on regroupe les chunks :
+
+- doublons exacts : même texte aux espaces près (hash)
+- quasi-doublons : similarité de Jaccard estimée par MinHash sur les
+  3-grammes de mots, candidats trouvés par LSH (bandes de signature)
+
+Chaque groupe est représenté par un seul chunk (le premier rencontré), seul
+encodé et indexé ; les métadonnées des autres chunks du groupe (dates, lieu
+de chaque événement) sont rattachées au représentant dans `members`.
+L'affectation est centrée sur les représentants : un chunk n'est comparé
+qu'à eux, ce qui évite les chaînes de similarité (A≈B≈C avec A≉C).
+"""
+
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+DEFAULT_THRESHOLD = 0.9
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+
+# Premier de Mersenne 2^31 - 1 : (a·h + b) tient dans un uint64
+_PRIME = np.uint64((1 << 31) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def text_key(text):
+    """Empreinte d'un texte aux espaces près (doublons exacts)."""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """N-grammes de mots d'un texte (le texte entier s'il est plus court)."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    Signatures MinHash : pour chaque permutation (a·h + b) mod p, le minimum
+    sur les n-grammes du texte.
+
+    Attributs :
+        num_perm (int) : longueur des signatures
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, int(_PRIME), num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64)
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+class LSHIndex:
+    """
+    Index LSH des signatures des représentants.
+
+    Deux signatures partageant une bande entière sont candidates ; la
+    similarité est ensuite estimée sur la signature complète.
+
+    Attributs :
+        threshold (float) : similarité de Jaccard estimée minimale
+        bands (int) : nombre de bandes (num_perm / bands lignes par bande)
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError(f"bands={bands} doit diviser num_perm={num_perm}")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, signature):
+        """Représentant le plus similaire au-dessus du seuil, ou None."""
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = float(np.mean(self._signatures[candidate] == signature))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def add(self, key, signature):
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band, []).append(key)
+
+
+class Deduplicator:
+    """
+    Affecte chaque chunk à un représentant : un doublon exact, sinon un
+    quasi-doublon (LSH), sinon le chunk devient lui-même représentant.
+
+    Attributs :
+        exact (int) : chunks rattachés à un doublon exact
+        near (int) : chunks rattachés à un quasi-doublon
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        self.hasher = MinHasher(num_perm)
+        self.lsh = LSHIndex(threshold, num_perm, bands)
+        self._exact = {}
+        self.exact = 0
+        self.near = 0
+
+    def add(self, key, text):
+        """Déclare un représentant existant (ex. vecteur déjà indexé)."""
+        self._exact.setdefault(text_key(text), key)
+        self.lsh.add(key, self.hasher.signature(text))
+
+    def assign(self, key, text):
+        """
+        Returns:
+            Hashable: clé du représentant (`key` si le chunk est nouveau)
+        """
+        exact_key = text_key(text)
+        if exact_key in self._exact:
+            self.exact += 1
+            return self._exact[exact_key]
+        signature = self.hasher.signature(text)
+        representative = self.lsh.query(signature)
+        if representative is not None:
+            self.near += 1
+            return representative
+        self._exact[exact_key] = key
+        self.lsh.add(key, signature)
+        return key
+
+
+def member_metadata(doc, doc_id):
+    """Métadonnées d'un chunk rattaché à un représentant."""
+    metadata = {k: v for k, v in doc.metadata.items() if k != "members"}
+    metadata["chunk_id"] = doc_id
+    return metadata
+
+
+def dedup_documents(documents, ids, threshold=DEFAULT_THRESHOLD):
+    """
+    Regroupe les chunks identiques ou quasi identiques.
+
+    Args:
+        documents (List[Document]): chunks
+        ids (List[str]): identifiants des chunks
+        threshold (float): similarité de Jaccard minimale des quasi-doublons
+
+    Returns:
+        Tuple[List[Document], List[str], dict]: représentants (avec
+            `members` dans leurs métadonnées), leurs identifiants, et les
+            compteurs (chunks, vecteurs, doublons exacts, quasi-doublons)
+    """
+    dedup = Deduplicator(threshold)
+    representatives = {}
+    for doc, doc_id in zip(documents, ids):
+        rep_id = dedup.assign(doc_id, doc.page_content)
+        if rep_id == doc_id:
+            representatives[doc_id] = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+        else:
+            representatives[rep_id].metadata.setdefault("members", []).append(member_metadata(doc, doc_id))
+
+    stats = {"chunks": len(documents), "vectors": len(representatives),
+             "exact": dedup.exact, "near": dedup.near}
+    return list(representatives.values()), list(representatives), stats
+
+
+def expand_members(doc):
+    """
+    Un document par chunk regroupé : le représentant puis ses membres, qui
+    partagent son texte mais gardent leurs propres métadonnées.
+    """
+    members = doc.metadata.get("members")
+    if not members:
+        return [doc]
+    own = {k: v for k, v in doc.metadata.items() if k != "members"}
+    return [Document(page_content=doc.page_content, metadata=own)] + [
+        Document(page_content=doc.page_content, metadata=member) for member in members
+    ]
@@ -4,207 +4,683 @@ embedding.py
 Script de création d'index vectoriel FAISS à partir d'événements parisiens.
 
 Étapes :
-- Chargement d'un CSV nettoyé (`evenements_paris.csv`)
-- Nettoyage + segmentation des textes avec spaCy
-- Encodage des chunks en embeddings via Mistral AI
-- Sauvegarde de l'index FAISS (pour recherche vectorielle ultérieure)
+- Chargement des événements nettoyés (`evenements_paris.parquet`, cf. dataset.py)
+- Nettoyage + segmentation des textes avec spaCy (`nlp.pipe` par lots, cf. chunking.py)
+- Encodage des chunks en embeddings via Mistral AI (avec cache disque)
+- Construction de l'index FAISS, exact ou approché (`--index-type`, cf. index_types.py)
+- Sauvegarde de l'index FAISS (pour recherche vectorielle ultérieure), des
+  textes et métadonnées des chunks (cf. metadata_store.py) et de l'index
+  des dates des événements (pré-filtre par période)
+
+Les vecteurs sont journalisés sur disque lot par lot (`index_journal/`) :
+un run interrompu reprend là où il s'était arrêté.
+
+Si l'index existe déjà, il est mis à jour de façon incrémentale : seuls les
+événements nouveaux ou modifiés sont (ré)encodés, les événements disparus
+sont supprimés. `--rebuild` force une reconstruction complète.
+
+Avec `--changes changes.json` (produit par `liste_event.py --sync`), seuls
+les événements listés sont découpés et comparés à l'index : le coût d'une
+mise à jour quotidienne suit le volume de changements.
+
+L'index est partitionné par mois de fin des événements (cf. shards.py) :
+un index par mois, plus le manifeste `shards.json`. Les mois écoulés ne
+sont pas indexés et leurs shards sont supprimés (`--keep-expired` pour les
+garder) ; `--shard-by none` construit un index unique.
+
+Les chunks identiques ou quasi identiques (événements récurrents) ne sont
+encodés et indexés qu'une fois (cf. dedup.py) ; `--no-dedup` garde un
+vecteur par chunk.
+
+Avec un index compressé (`--index-type fp16`, `sq8` ou `ivfpq`), les
+vecteurs float32 sont aussi écrits dans `vectors.npy` pour re-classer
+exactement les candidats à la recherche (cf. vector_storage.py).
 """
 
+import argparse
+import hashlib
+import json
 import os
-import time
+import faiss
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from mistralai.client import MistralClient
 from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-import spacy
 
-# -------- INITIALISATION --------
+from chunking import chunk_texts, load_sentence_nlp
+from dataset import DATASET_PATH, format_date, read_events
+from date_filter import DATE_INDEX_FILE, DateIndex
+from dedup import DEFAULT_THRESHOLD, Deduplicator, dedup_documents, member_metadata
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from index_journal import IndexJournal, embed_with_journal
+from mistral_embeddings import EMBED_MODEL, CustomMistralEmbeddings, mistral_client
+from index_types import (
+    COMPRESSED_TYPES, INDEX_TYPES, build_faiss_index, index_kind, rebuild_hnsw, rebuild_ivf, set_search_params,
+    to_flat,
+)
+from shards import (
+    is_expired, read_manifest, remove_shards, remove_single_index, shard_entry, shard_key, write_manifest,
+)
+from vector_storage import load_vectorstore, remove_full_vectors, save_full_vectors, save_vectorstore
+
+INDEX_DIR = "faiss_langchain_index"
+CACHE_PATH = "embedding_cache.sqlite"
+JOURNAL_DIR = "index_journal"
+
+# Métadonnées des chunks : nom -> colonnes candidates, par priorité
+METADATA_FIELDS = (
+    ("title", ["Titre"]),
+    ("firstdate_begin", ["Première date - Début"]),
+    ("lastdate_end", ["Dernière date - Fin"]),
+    ("location_name", ["Nom du lieu"]),
+    ("location_address", ["Adresse"]),
+)
+
+def first_valid_column(df, keys):
+    """
+    Récupère, pour chaque ligne, la première valeur non vide dans une liste
+    de colonnes possibles (traitement par colonnes entières).
+
+    Les dates typées sont remises au format ISO écrit par l'ingestion.
 
-load_dotenv()
-api_key = os.getenv("MISTRAL_API_KEY")
-if not api_key:
-    raise ValueError("❌ MISTRAL_API_KEY non trouvée dans l'environnement")
+    Args:
+        df (pd.DataFrame): événements
+        keys (List[str]): noms de colonnes à tester, par priorité
+
+    Returns:
+        pd.Series: première valeur non vide de chaque ligne, ou chaîne vide
+    """
+    result = pd.Series("", index=df.index, dtype=object)
+    for key in reversed(keys):
+        if key not in df.columns:
+            continue
+        values = df[key]
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            values = format_date(values)
+        values = values.astype("string").fillna("").str.strip().astype(object)
+        result = values.where(values != "", result)
+    return result
 
-client = MistralClient(api_key=api_key)
-nlp = spacy.load("fr_core_news_sm")
 
+def event_content_hash(full_text, metadata):
+    """
+    Empreinte du contenu indexé d'un événement (texte + métadonnées).
 
-def chunk_text_nlp(text, max_chars=500):
+    Sert à détecter, lors d'une mise à jour incrémentale, les événements
+    dont les chunks doivent être ré-encodés.
     """
-    Segmente un texte en plusieurs chunks sans couper les phrases.
+    payload = json.dumps([full_text, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    Utilise spaCy pour découper proprement les phrases tout en respectant
-    une taille maximale (en caractères).
+
+def prepare_events(df):
+    """
+    Extrait de chaque ligne le texte à indexer et ses métadonnées.
+
+    Les colonnes sont traitées d'un bloc (pas de parcours ligne à ligne) ;
+    seules les métadonnées sont assemblées par événement.
 
     Args:
-        text (str): le texte à segmenter
-        max_chars (int): taille max par chunk
+        df (pd.DataFrame): événements nettoyés
 
     Returns:
-        List[str]: liste de segments textuels
+        List[Tuple[str, str, dict]]: (clé d'événement, texte complet, métadonnées)
+    """
+    description = first_valid_column(df, ["Description"])
+    longue_description = first_valid_column(df, ["Description longue", "Détail des conditions"])
+    full_text = (description + ". " + longue_description).str.strip()
+    keep = (full_text != "") & (full_text != "...")
+
+    identifiants = first_valid_column(df, ["Identifiant"])[keep]
+    fields = [name for name, _ in METADATA_FIELDS]
+    columns = [first_valid_column(df, keys)[keep] for _, keys in METADATA_FIELDS]
+
+    events = []
+    for identifiant, text, *values in zip(identifiants, full_text[keep], *columns):
+        metadata = {"id": identifiant, **dict(zip(fields, values))}
+        content_hash = event_content_hash(text, metadata)
+        metadata["content_hash"] = content_hash
+        # Sans identifiant, l'événement est repéré par son contenu
+        event_key = identifiant or content_hash[:16]
+        events.append((event_key, text, metadata))
+    return events
+
+
+def prepare_documents(df, nlp=None, batch_size=256, n_process=1):
     """
-    doc = nlp(text)
-    chunks = []
-    buffer = ""
+    Construit les chunks à indexer à partir du DataFrame des événements.
 
-    for sent in doc.sents:
-        sentence = sent.text.strip()
-        if not sentence:
-            continue
-        if len(buffer) + len(sentence) + 1 <= max_chars:
-            buffer += " " + sentence if buffer else sentence
-        else:
-            if buffer:
-                chunks.append(buffer.strip())
-            buffer = sentence
-    if buffer:
-        chunks.append(buffer.strip())
-    return chunks
-
-
-class CustomMistralEmbeddings(Embeddings):
-    """
-    Wrapper pour utiliser les embeddings Mistral avec LangChain.
-
-    Attributs :
-        client (Mistral) : instance client Mistral
-        batch_size (int) : taille des lots d'embedding
-        sleep_time (float) : délai entre les requêtes
-        max_retries (int) : nombre maximal de tentatives en cas d'erreur API
-    """
-
-    def __init__(self, client, batch_size=200, sleep_time=0.5, max_retries=5):
-        self.client = client
-        self.batch_size = batch_size
-        self.sleep_time = sleep_time
-        self.max_retries = max_retries
-
-    def embed_documents(self, texts):
-        """
-        Embedding de plusieurs documents en batchs.
-
-        Args:
-            texts (List[str]): textes à encoder
-
-        Returns:
-            List[List[float]]: vecteurs d'embedding
-        """
-        all_embeddings = []
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i:i + self.batch_size]
-            embeddings = self._embed_batch(batch)
-            if embeddings:
-                all_embeddings.extend(embeddings)
-            time.sleep(self.sleep_time)
-        return all_embeddings
-
-    def _embed_batch(self, texts):
-        """
-        Envoie un batch de textes à l'API Mistral avec gestion des erreurs.
-
-        Args:
-            texts (List[str]): batch à encoder
-
-        Returns:
-            List[List[float]]: vecteurs encodés ou [] si échec
-        """
-        for attempt in range(self.max_retries):
-            try:
-                response = self.client.embeddings(model="mistral-embed", input=texts)
-                return [res.embedding for res in response.data]
-            except Exception as e:
-                delay = 2 ** attempt
-                print(f"⚠️ Erreur API : {e} — tentative {attempt+1}/{self.max_retries} dans {delay}s")
-                time.sleep(delay)
-        print("❌ Échec après plusieurs tentatives.")
-        return []
-
-    def embed_query(self, text):
-        """Embedding d'une requête unique."""
-        return self.embed_documents([text])[0]
-
-
-def get_first_valid(row, keys):
-    """
-    Récupère la première valeur non vide dans une liste de colonnes possibles.
+    Chaque chunk reçoit un identifiant stable `<Identifiant>:<n°>` qui permet
+    de remplacer ou supprimer les vecteurs d'un événement dans l'index.
 
     Args:
-        row (pd.Series): ligne du DataFrame
-        keys (List[str]): noms de colonnes à tester
+        df (pd.DataFrame): événements nettoyés
+        nlp (spacy.Language): pipeline de segmentation (cf. chunking.py)
+        batch_size (int): nombre de textes par lot spaCy
+        n_process (int): nombre de processus de segmentation
 
     Returns:
-        str: valeur trouvée ou chaîne vide
+        Tuple[List[Document], List[str]]: chunks et identifiants associés
+    """
+    events = prepare_events(df)
+    all_chunks = chunk_texts(
+        (full_text for _, full_text, _ in events),
+        nlp=nlp, max_chars=500, batch_size=batch_size, n_process=n_process,
+    )
+
+    documents = []
+    ids = []
+    chunk_counts = {}
+    for (event_key, _, metadata), chunks in zip(events, all_chunks):
+        for chunk in chunks:
+            n = chunk_counts.get(event_key, 0)
+            chunk_counts[event_key] = n + 1
+            documents.append(Document(page_content=chunk, metadata=metadata))
+            ids.append(f"{event_key}:{n}")
+
+    return documents, ids
+
+
+def print_coverage(df, documents):
+    """Affiche le taux de couverture des événements du jeu de données par l'index."""
+    indexed_event_ids = set(doc.metadata.get("id") for doc in documents if doc.metadata.get("id"))
+    csv_event_ids = set(df["Identifiant"].dropna().astype("string").str.strip())
+
+    print(f"\n📋 Événements dans le jeu de données : {len(csv_event_ids)}")
+    print(f"📌 Événements indexés (au moins un chunk) : {len(indexed_event_ids)}")
+    print(f"✅ Taux de couverture : {len(indexed_event_ids) / len(csv_event_ids) * 100:.2f}%")
+
+
+def _group_by_event(ids, hashes):
+    """Regroupe des identifiants de chunks par événement -> (hash, [ids])."""
+    events = {}
+    for doc_id, content_hash in zip(ids, hashes):
+        event_key = doc_id.rsplit(":", 1)[0]
+        events.setdefault(event_key, (content_hash, []))[1].append(doc_id)
+    return events
+
+
+def stored_chunks(vectorstore):
     """
-    for key in keys:
-        val = row.get(key)
-        if pd.notna(val) and str(val).strip():
-            return str(val).strip()
-    return ""
+    Chunks présents dans l'index, membres dédoublonnés compris.
 
+    Yields:
+        Tuple[str, str, str]: (id du vecteur, id du chunk, hash de contenu)
+    """
+    for vector_id in vectorstore.index_to_docstore_id.values():
+        metadata = vectorstore.docstore.search(vector_id).metadata
+        yield vector_id, vector_id, metadata.get("content_hash")
+        for member in metadata.get("members", ()):
+            yield vector_id, member["chunk_id"], member.get("content_hash")
 
-# -------- CHARGEMENT DU CSV --------
 
-df = pd.read_csv('evenements_paris.csv', sep=';')
-print(f"📥 {len(df)} événements chargés depuis le CSV.")
+def affected_closure(vectorstore, event_keys):
+    """
+    Événements à re-préparer quand `event_keys` changent : eux-mêmes, plus
+    ceux qui partagent un vecteur avec eux (dédoublonnage).
+    """
+    vectors = {}
+    for vector_id, chunk_id, _ in stored_chunks(vectorstore):
+        vectors.setdefault(vector_id, set()).add(chunk_id.rsplit(":", 1)[0])
+    closure = set(event_keys)
+    for events in vectors.values():
+        if events & event_keys:
+            closure |= events
+    return closure
 
-# -------- PRÉPARATION DES DOCUMENTS --------
 
-documents = []
-for _, row in df.iterrows():
-    
-    description = get_first_valid(row, ["Description"])
-    longue_description = get_first_valid(row, ["Description longue", "Détail des conditions"])
-    identifiant = get_first_valid(row, ["Identifiant"])
+def load_changes(path):
+    """
+    Lit un fichier de changements produit par `liste_event.py --sync`.
 
-    full_text = f"{description}. {longue_description}".strip()
+    Returns:
+        Set[str] or None: identifiants des événements ajoutés, modifiés ou
+        supprimés ; None si le fichier décrit une synchronisation complète
+    """
+    with open(path, encoding="utf-8") as f:
+        changes = json.load(f)
+    if changes.get("full"):
+        return None
+    return set(changes["added"]) | set(changes["updated"]) | set(changes["removed"])
+
+
+def print_dedup_savings(stats, index):
+    """Affiche le gain du dédoublonnage : embeddings évités et taille d'index économisée."""
+    saved = stats["chunks"] - stats["vectors"]
+    bytes_per_vector = faiss.serialize_index(index).nbytes / max(1, index.ntotal)
+    print(
+        f"🧬 Dédoublonnage : {stats['chunks']} chunks -> {stats['vectors']} vecteurs "
+        f"({stats['exact']} doublons exacts, {stats['near']} quasi-doublons) | "
+        f"{saved} embedding(s) évité(s), ~{saved * bytes_per_vector / 1e6:.1f} Mo d'index en moins"
+    )
+
+
+def update_index(vectorstore, documents, ids, embeddings, journal, event_keys=None,
+                 dedup_threshold=DEFAULT_THRESHOLD):
+    """
+    Met à jour un index existant à partir de la liste complète des chunks.
+
+    - événements nouveaux : chunks ajoutés
+    - événements modifiés (hash de contenu différent) : chunks remplacés
+    - événements disparus du CSV : chunks supprimés
 
-    if full_text and full_text != "...":
-        metadata = {
-            "id": identifiant,
-            "title" : get_first_valid(row, ["Titre"]),
-            "firstdate_begin": get_first_valid(row, ["Première date - Début"]),
-            "lastdate_end": get_first_valid(row, ["Dernière date - Fin"]),
-            "location_name": get_first_valid(row, ["Nom du lieu"]),
-            "location_address": get_first_valid(row, ["Adresse"]),
+    Un vecteur partagé (dédoublonnage) est supprimé dès qu'un de ses chunks
+    change ; ses autres chunks sont replacés avec les chunks nouveaux : ils
+    rejoignent un vecteur existant identique ou proche (métadonnées ajoutées
+    à ses `members`, sans appel d'embedding) ou forment de nouveaux vecteurs.
+
+    Args:
+        vectorstore (FAISS): index chargé
+        documents (List[Document]): chunks à jour
+        ids (List[str]): identifiants des chunks
+        embeddings (Embeddings): fonction d'embedding
+        journal (IndexJournal): journal de reprise des vecteurs encodés
+        event_keys (Set[str]): si fourni, seuls ces événements sont comparés
+            (`documents` ne contient alors que leurs chunks ; cf. `affected_closure`)
+        dedup_threshold (float): seuil des quasi-doublons (None = pas de dédoublonnage)
+
+    Returns:
+        Dict[str, int]: nombre d'événements ajoutés / modifiés / supprimés,
+            de vecteurs ajoutés et de chunks rattachés à un vecteur existant
+    """
+    stored = list(stored_chunks(vectorstore))
+    if event_keys is not None:
+        stored = [chunk for chunk in stored if chunk[1].rsplit(":", 1)[0] in event_keys]
+    existing = _group_by_event([chunk_id for _, chunk_id, _ in stored], [h for _, _, h in stored])
+    current = _group_by_event(ids, [doc.metadata["content_hash"] for doc in documents])
+
+    stats = {"added": 0, "updated": 0, "deleted": 0, "vectors": 0, "joined": 0}
+    stale = set()
+    for event_key, (content_hash, _) in existing.items():
+        if event_key not in current:
+            stats["deleted"] += 1
+            stale.add(event_key)
+        elif current[event_key][0] != content_hash:
+            stats["updated"] += 1
+            stale.add(event_key)
+
+    stale_or_new = {
+        event_key for event_key, (content_hash, _) in current.items()
+        if event_key not in existing or existing[event_key][0] != content_hash
+    }
+    stats["added"] = len(stale_or_new) - stats["updated"]
+
+    # Vecteurs portant au moins un chunk périmé, et chunks encore valides à replacer
+    to_delete = {vector_id for vector_id, chunk_id, _ in stored if chunk_id.rsplit(":", 1)[0] in stale}
+    orphans = {
+        chunk_id for vector_id, chunk_id, _ in stored
+        if vector_id in to_delete and chunk_id.rsplit(":", 1)[0] not in stale
+    }
+
+    original = None
+    if to_delete:
+        kind = index_kind(vectorstore.index)
+        if kind in ("hnsw", "ivf", "ivfpq"):
+            # HNSW ne sait pas supprimer de vecteurs, IVF ne compacte pas les
+            # positions : passage par un index plat, reconstruit à la fin
+            original = vectorstore.index
+            exact = full_vectors(vectorstore, embeddings) if kind == "ivfpq" else None
+            vectorstore.index = to_flat(original, exact)
+        vectorstore.delete(list(to_delete))
+
+    to_place = [
+        (doc, doc_id) for doc, doc_id in zip(documents, ids)
+        if doc_id.rsplit(":", 1)[0] in stale_or_new or doc_id in orphans
+    ]
+    new_docs = {}
+    if to_place and dedup_threshold is not None:
+        dedup = Deduplicator(dedup_threshold)
+        for vector_id in vectorstore.index_to_docstore_id.values():
+            dedup.add(vector_id, vectorstore.docstore.search(vector_id).page_content)
+        for doc, doc_id in to_place:
+            rep_id = dedup.assign(doc_id, doc.page_content)
+            if rep_id == doc_id:
+                new_docs[doc_id] = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+            else:
+                target = new_docs.get(rep_id) or vectorstore.docstore.search(rep_id)
+                target.metadata.setdefault("members", []).append(member_metadata(doc, doc_id))
+                stats["joined"] += rep_id not in new_docs
+    else:
+        new_docs = {
+            doc_id: Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+            for doc, doc_id in to_place
         }
 
-        chunks = chunk_text_nlp(full_text, max_chars=500)
-        for chunk in chunks:
-            documents.append(Document(page_content=chunk, metadata=metadata))
+    if new_docs:
+        texts = [doc.page_content for doc in new_docs.values()]
+        new_ids = list(new_docs)
+        vectors = embed_with_journal(journal, new_ids, texts, embeddings)
+        vectorstore.add_embeddings(
+            zip(texts, vectors),
+            metadatas=[doc.metadata for doc in new_docs.values()],
+            ids=new_ids,
+        )
+    stats["vectors"] = len(new_docs)
+    if original is not None:
+        rebuild = rebuild_hnsw if index_kind(original) == "hnsw" else rebuild_ivf
+        vectorstore.index = rebuild(vectorstore.index, original)
+    return stats
+
+
+def full_vectors(vectorstore, embeddings):
+    """
+    Vecteurs float32 de l'index, dans l'ordre des positions FAISS, relus
+    depuis le cache d'embeddings (les vecteurs de l'index compressé sont approchés).
+    """
+    positions = sorted(vectorstore.index_to_docstore_id)
+    texts = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[p]).page_content
+             for p in positions]
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32).reshape(len(texts), -1)
 
-print(f"📝 {len(documents)} chunks prêts pour l'embedding.")
 
-# -------- STATISTIQUES DE COUVERTURE --------
+def build_vectorstore(texts, vectors, metadatas, ids, embeddings, index_type="flat", **index_options):
+    """
+    Construit un vectorstore FAISS LangChain autour d'un index du type demandé.
 
-indexed_event_ids = set(doc.metadata.get("id") for doc in documents if doc.metadata.get("id"))
-csv_event_ids = set(str(row["Identifiant"]).strip() for _, row in df.iterrows() if pd.notna(row["Identifiant"]))
+    Args:
+        texts (List[str]): textes des chunks
+        vectors (np.ndarray): vecteurs float32, dans le même ordre
+        metadatas (List[dict]): métadonnées des chunks
+        ids (List[str]): identifiants des chunks
+        embeddings (Embeddings): fonction d'embedding (requêtes)
+        index_type (str): type d'index (cf. index_types.INDEX_TYPES)
+        **index_options: options de `build_faiss_index` (nlist, nprobe...)
 
-print(f"\n📋 Événements dans le CSV : {len(csv_event_ids)}")
-print(f"📌 Événements indexés (au moins un chunk) : {len(indexed_event_ids)}")
-print(f"✅ Taux de couverture : {len(indexed_event_ids) / len(csv_event_ids) * 100:.2f}%")
+    Returns:
+        FAISS: vectorstore prêt à être sauvegardé
+    """
+    index = build_faiss_index(vectors, kind=index_type, **index_options)
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=metadata)
+        for doc_id, text, metadata in zip(ids, texts, metadatas)
+    })
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
 
-# -------- EMBEDDING + INDEXATION --------
 
-embedding_function = CustomMistralEmbeddings(client)
-vectorstore = FAISS.from_documents(documents, embedding_function)
+def index_documents(vectorstore, documents, ids, embeddings, journal, scope=None,
+                    dedup_threshold=DEFAULT_THRESHOLD, index_type="flat", nprobe=8, ef_search=64,
+                    **index_options):
+    """
+    Met à jour un index existant, ou en construit un s'il n'y en a pas.
 
-# -------- SAUVEGARDE --------
+    Args:
+        vectorstore (FAISS): index chargé en écriture (None = construction complète)
+        documents (List[Document]): chunks à indexer
+        ids (List[str]): identifiants des chunks
+        embeddings (Embeddings): fonction d'embedding
+        journal (IndexJournal): journal de reprise des vecteurs encodés
+        scope (Set[str]): événements à comparer (cf. update_index)
+        dedup_threshold (float): seuil des quasi-doublons (None = pas de dédoublonnage)
+        index_type (str): type d'index d'une construction complète (cf. index_types.py)
+        nprobe, ef_search: paramètres de recherche enregistrés dans l'index
+        **index_options: options de `build_faiss_index` (nlist, pq_m, hnsw_m)
 
-vectorstore.save_local("faiss_langchain_index")
-print("✅ Index FAISS LangChain sauvegardé dans 'faiss_langchain_index/'")
+    Returns:
+        Tuple[FAISS, np.ndarray or None]: index et, pour une construction
+            complète, les vecteurs float32 encodés
+    """
+    vectors = None
+    if vectorstore is not None:
+        stats = update_index(vectorstore, documents, ids, embeddings, journal,
+                             event_keys=scope, dedup_threshold=dedup_threshold)
+        print(
+            f"🔄 Mise à jour incrémentale : ➕ {stats['added']} ajouté(s) | ✏️ {stats['updated']} modifié(s) | "
+            f"🗑️ {stats['deleted']} supprimé(s) | 🧬 {stats['vectors']} vecteur(s) ajouté(s), "
+            f"{stats['joined']} chunk(s) rattaché(s) à un vecteur existant"
+        )
+    else:
+        dedup_stats = None
+        if dedup_threshold is not None:
+            documents, ids, dedup_stats = dedup_documents(documents, ids, dedup_threshold)
+        texts = [doc.page_content for doc in documents]
+        vectors = embed_with_journal(journal, ids, texts, embeddings)
+        vectorstore = build_vectorstore(texts, vectors, [doc.metadata for doc in documents], ids, embeddings,
+                                        index_type=index_type, **index_options)
+        print(f"🧱 Index '{index_kind(vectorstore.index)}' construit : {vectorstore.index.ntotal} vecteurs")
+        if dedup_stats is not None:
+            print_dedup_savings(dedup_stats, vectorstore.index)
+    set_search_params(vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+    return vectorstore, vectors
+
+
+def save_index(index_dir, vectorstore, embeddings, vectors=None):
+    """
+    Sauvegarde un index (ou un shard) : FAISS, métadonnées, BM25, vecteurs
+    exacts d'un index compressé et index des dates.
 
-# -------- TEST RECHERCHE --------
+    Args:
+        vectors (np.ndarray): vecteurs float32 déjà encodés (None = relus depuis le cache)
 
-#print("\n🔎 Lancement de la recherche de test...")
-#query = "concert en plein air à Paris"
-#results = vectorstore.similarity_search(query, k=3)
-#print(f"📊 {len(results)} résultats trouvés")
+    Returns:
+        DateIndex: index des dates écrit à côté de l'index
+    """
+    save_vectorstore(index_dir, vectorstore)
+    if index_kind(vectorstore.index) in COMPRESSED_TYPES:
+        # Vecteurs exacts pour le re-classement des candidats (cf. vector_storage.py)
+        if vectors is None:
+            vectors = full_vectors(vectorstore, embeddings)
+        save_full_vectors(index_dir, vectors)
+    else:
+        remove_full_vectors(index_dir)
+    date_index = DateIndex.from_vectorstore(vectorstore)
+    date_index.save(os.path.join(index_dir, DATE_INDEX_FILE))
+    return date_index
+
+
+def group_by_shard(documents, ids):
+    """
+    Répartit les chunks par shard mensuel (mois de fin de l'événement, cf. shards.py).
+
+    Returns:
+        Dict[str, Tuple[List[Document], List[str]]]: chunks et identifiants par shard
+    """
+    groups = {}
+    for doc, doc_id in zip(documents, ids):
+        docs, doc_ids = groups.setdefault(shard_key(doc.metadata), ([], []))
+        docs.append(doc)
+        doc_ids.append(doc_id)
+    return groups
 
-#for i, doc in enumerate(results, 1):
-#    lieu = doc.metadata.get("location_name", "Lieu inconnu")
-#    extrait = doc.page_content[:100].replace("\n", " ")
-#    print(f"{i}. 📍 {lieu} | 📝 {extrait}...")
 
-print("\n✅ Script terminé")
+def write_shards(index_dir, documents, ids, existing, embeddings, journal, scope=None,
+                 dedup_threshold=DEFAULT_THRESHOLD, keep_expired=False, now=None, **index_options):
+    """
+    Construit ou met à jour les shards mensuels (cf. shards.py), sans écrire le manifeste.
+
+    Seuls les shards concernés sont réécrits : ceux qui reçoivent des chunks,
+    et, avec `scope`, ceux qui portent un événement changé (déplacé vers un
+    autre mois ou supprimé). Un shard vidé ou d'un mois écoulé est retiré.
+
+    Args:
+        index_dir (str): dossier de l'index
+        documents (List[Document]): chunks à indexer
+        ids (List[str]): identifiants des chunks
+        existing (Dict[str, FAISS]): shards chargés en écriture (cf. load_indexes)
+        embeddings (Embeddings): fonction d'embedding
+        journal (IndexJournal): journal de reprise des vecteurs encodés
+        scope (Set[str]): événements changés (None = tous les événements)
+        dedup_threshold (float): seuil des quasi-doublons (None = pas de dédoublonnage)
+        keep_expired (bool): indexe aussi les mois écoulés
+        now (datetime): instant de référence de l'expiration (None = maintenant)
+        **index_options: cf. index_documents
+
+    Returns:
+        Dict[str, dict]: entrées du manifeste des shards gardés
+    """
+    groups = group_by_shard(documents, ids)
+    previous = read_manifest(index_dir) or {}
+    entries = {}
+    for name in sorted(set(groups) | set(existing)):
+        docs, doc_ids = groups.get(name, ([], []))
+        vectorstore = existing.get(name)
+        if not keep_expired and is_expired(name, now):
+            # Mois écoulé : événements tous terminés, le shard n'est pas (ou plus) indexé
+            continue
+        if not docs and (vectorstore is None or scope is None):
+            continue
+        if not docs and not any(chunk_id.rsplit(":", 1)[0] in scope
+                                for _, chunk_id, _ in stored_chunks(vectorstore)):
+            # Shard non concerné par les changements : gardé tel quel
+            entries[name] = previous[name]
+            continue
+        print(f"\n📅 Shard {name} : {len(docs)} chunks")
+        vectorstore, vectors = index_documents(vectorstore, docs, doc_ids, embeddings, journal,
+                                               scope, dedup_threshold, **index_options)
+        if vectorstore.index.ntotal == 0:
+            continue
+        date_index = save_index(os.path.join(index_dir, name), vectorstore, embeddings, vectors)
+        entries[name] = shard_entry(date_index, vectorstore.index.ntotal)
+    return entries
+
+
+def load_indexes(index_dir, embeddings, shard_by="month"):
+    """
+    Index existants chargés en écriture, pour une mise à jour incrémentale.
+
+    Un index au format inverse de `shard_by` (unique / partitionné) n'est pas
+    relu : il sera reconstruit au nouveau format.
+
+    Returns:
+        Dict[str, FAISS]: vectorstore par shard ("" pour un index unique)
+    """
+    shards = read_manifest(index_dir)
+    single = os.path.exists(os.path.join(index_dir, "index.faiss"))
+    if shard_by == "month":
+        if shards is None:
+            if single:
+                print("\n⚠️ Index unique existant : reconstruction en shards mensuels")
+            return {}
+        return {name: load_vectorstore(os.path.join(index_dir, name), embeddings, mmap=False, writable=True)
+                for name in shards}
+    if shards is not None:
+        print("\n⚠️ Index partitionné existant : reconstruction en index unique")
+        return {}
+    if not single:
+        return {}
+    return {"": load_vectorstore(index_dir, embeddings, mmap=False, writable=True)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexation FAISS des événements parisiens")
+    parser.add_argument("--dataset", "--csv", dest="dataset", default=DATASET_PATH,
+                        help="événements nettoyés par liste_event.py (.parquet, ou .csv)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="dossier de l'index FAISS")
+    parser.add_argument("--cache", default=CACHE_PATH, help="fichier du cache d'embeddings")
+    parser.add_argument("--journal-dir", default=JOURNAL_DIR,
+                        help="journal de reprise des lots encodés (vidé après sauvegarde)")
+    parser.add_argument("--sentence-mode", default="senter",
+                        choices=["senter", "sentencizer", "parser"],
+                        help="segmentation en phrases (cf. chunking.py)")
+    parser.add_argument("--chunk-processes", type=int, default=1,
+                        help="nombre de processus pour la segmentation spaCy")
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES,
+                        help="type d'index FAISS (cf. index_types.py)")
+    parser.add_argument("--nlist", type=int, default=None, help="nombre de listes IVF")
+    parser.add_argument("--pq-m", type=int, default=64, help="sous-quantificateurs IVF-PQ")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="voisins par nœud HNSW")
+    parser.add_argument("--nprobe", type=int, default=8, help="listes visitées par requête (IVF)")
+    parser.add_argument("--ef-search", type=int, default=64, help="largeur de recherche HNSW")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="reconstruit l'index complet au lieu de le mettre à jour")
+    parser.add_argument("--changes", default=None,
+                        help="changements de `liste_event.py --sync` : ne traite que ces événements")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="similarité (Jaccard) à partir de laquelle deux chunks partagent un vecteur")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="un vecteur par chunk, sans dédoublonnage (cf. dedup.py)")
+    parser.add_argument("--shard-by", default="month", choices=["month", "none"],
+                        help="un index par mois de fin des événements (cf. shards.py), ou un index unique")
+    parser.add_argument("--keep-expired", action="store_true",
+                        help="indexe aussi les mois écoulés (--shard-by month)")
+    args = parser.parse_args(argv)
+    dedup_threshold = None if args.no_dedup else args.dedup_threshold
+
+    # -------- INITIALISATION --------
+
+    load_dotenv()
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise ValueError("❌ MISTRAL_API_KEY non trouvée dans l'environnement")
+
+    # Les tentatives (et les 429) sont gérées par EmbeddingEngine, pas par le client.
+    client = mistral_client(api_key, max_retries=0)
+
+    # -------- CHARGEMENT DES ÉVÉNEMENTS --------
+
+    df = read_events(args.dataset)
+    print(f"📥 {len(df)} événements chargés depuis '{args.dataset}'.")
+
+    cache = EmbeddingCache(args.cache, model=EMBED_MODEL)
+    embedding_function = CachedEmbeddings(CustomMistralEmbeddings(client), cache)
+    journal = IndexJournal(args.journal_dir)
+
+    existing = {} if args.rebuild else load_indexes(args.index_dir, embedding_function, args.shard_by)
+    kinds = {index_kind(vectorstore.index) for vectorstore in existing.values()}
+    if kinds - {args.index_type}:
+        print(f"\n⚠️ Index existant de type '{', '.join(sorted(kinds))}' "
+              f"≠ --index-type '{args.index_type}' : reconstruction complète")
+        existing = {}
+
+    # Mise à jour limitée aux événements listés dans le fichier de changements
+    scope = None
+    if existing and args.changes:
+        scope = load_changes(args.changes)
+        if scope is not None:
+            # Les événements qui partagent un vecteur avec un événement changé sont replacés aussi
+            scope = set().union(*(affected_closure(vectorstore, scope) for vectorstore in existing.values()))
+            df = df[df["Identifiant"].str.strip().isin(scope)]
+            print(f"📋 {len(scope)} événement(s) changé(s) d'après '{args.changes}'")
+
+    # -------- PRÉPARATION DES DOCUMENTS --------
+
+    nlp = load_sentence_nlp(args.sentence_mode)
+    documents, ids = prepare_documents(df, nlp=nlp, n_process=args.chunk_processes)
+    print(f"📝 {len(documents)} chunks prêts pour l'embedding.")
+
+    # -------- STATISTIQUES DE COUVERTURE --------
+
+    if scope is None:
+        print_coverage(df, documents)
+
+    # -------- EMBEDDING + INDEXATION + SAUVEGARDE --------
+
+    index_options = {"index_type": args.index_type, "nlist": args.nlist, "pq_m": args.pq_m,
+                     "hnsw_m": args.hnsw_m, "nprobe": args.nprobe, "ef_search": args.ef_search}
+    if args.shard_by == "month":
+        entries = write_shards(args.index_dir, documents, ids, existing, embedding_function, journal, scope,
+                               dedup_threshold, keep_expired=args.keep_expired, **index_options)
+        remove_single_index(args.index_dir)
+        # Manifeste écrit en dernier : les shards retirés (vides, expirés) sont supprimés avec lui
+        write_manifest(args.index_dir, entries)
+        print(f"\n🗂️ {len(entries)} shard(s) mensuel(s) : {', '.join(entries) or 'aucun'}")
+    else:
+        remove_shards(args.index_dir)
+        vectorstore, vectors = index_documents(existing.get(""), documents, ids, embedding_function, journal,
+                                               scope, dedup_threshold, **index_options)
+        save_index(args.index_dir, vectorstore, embedding_function, vectors)
+
+    print(f"💾 Cache d'embeddings : {embedding_function.hits} réutilisé(s), "
+          f"{embedding_function.misses} encodé(s) via l'API")
+    cache.close()
+    journal.clear()
+    print(f"✅ Index FAISS LangChain sauvegardé dans '{args.index_dir}/'")
+
+    # -------- TEST RECHERCHE --------
+
+    #print("\n🔎 Lancement de la recherche de test...")
+    #query = "concert en plein air à Paris"
+    #results = vectorstore.similarity_search(query, k=3)
+    #print(f"📊 {len(results)} résultats trouvés")
+
+    #for i, doc in enumerate(results, 1):
+    #    lieu = doc.metadata.get("location_name", "Lieu inconnu")
+    #    extrait = doc.page_content[:100].replace("\n", " ")
+    #    print(f"{i}. 📍 {lieu} | 📝 {extrait}...")
+
+    print("\n✅ Script terminé")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+embedding_cache.py
+
+Cache disque des embeddings, adressé par le contenu.
+
+Chaque vecteur est rangé sous la clé sha256(modèle, texte du chunk) dans une
+base SQLite locale : un chunk déjà encodé lors d'un run précédent n'est plus
+jamais renvoyé à l'API Mistral, quel que soit l'événement qui le porte.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    Stockage persistant clé -> vecteur (float32) dans un fichier SQLite.
+
+    Attributs :
+        path (str) : chemin du fichier SQLite
+        model (str) : nom du modèle d'embedding (fait partie de la clé)
+    """
+
+    def __init__(self, path="embedding_cache.sqlite", model="mistral-embed"):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, text):
+        """Clé de cache d'un texte : sha256 du couple (modèle, texte)."""
+        digest = hashlib.sha256()
+        digest.update(self.model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """
+        Récupère les vecteurs connus pour une liste de clés.
+
+        Args:
+            keys (List[str]): clés de cache
+
+        Returns:
+            Dict[str, List[float]]: vecteurs trouvés, indexés par clé
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # SQLite limite le nombre de paramètres par requête
+        for i in range(0, len(unique_keys), 500):
+            batch = unique_keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        return found
+
+    def put_many(self, keys, vectors):
+        """Enregistre des vecteurs sous leurs clés (écrase l'existant)."""
+        rows = [(key, array("f", vector).tobytes()) for key, vector in zip(keys, vectors)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un objet `Embeddings` LangChain avec un `EmbeddingCache`.
+
+    Seuls les textes absents du cache (dédoublonnés) sont envoyés à
+    l'embedding sous-jacent ; les compteurs `hits` / `misses` permettent
+    de mesurer l'économie réalisée sur un run.
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        """
+        Embedding de plusieurs documents en passant par le cache.
+
+        Args:
+            texts (List[str]): textes à encoder
+
+        Returns:
+            List[List[float]]: vecteurs d'embedding, dans l'ordre des textes
+        """
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += sum(1 for key in keys if key in missing)
+
+        if missing:
+            missing_keys = list(missing)
+            new_vectors = self.embeddings.embed_documents([missing[k] for k in missing_keys])
+            if len(new_vectors) != len(missing_keys):
+                raise RuntimeError(
+                    f"{len(new_vectors)} vecteurs reçus pour {len(missing_keys)} textes"
+                )
+            self.cache.put_many(missing_keys, new_vectors)
+            vectors.update(zip(missing_keys, new_vectors))
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        """Embedding d'une requête unique."""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,230 @@
+"""
+embedding_engine.py
+
+Moteur d'embedding par lots, concurrent et respectueux des quotas API.
+
+- Lots dimensionnés par nombre de tokens (estimé) et non par nombre de textes
+- Requêtes en parallèle via un pool de threads, nombre de requêtes en vol borné
+- Limiteur « token bucket » qui ralentit sur réponse 429 et réaccélère ensuite
+- Résultats strictement ordonnés ; un lot en échec est réessayé puis signalé
+  par une exception, jamais ignoré silencieusement
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Estimation prudente pour du français (~3 caractères par token)
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    """Estimation grossière du nombre de tokens d'un texte."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def make_batches(texts, max_tokens=8000, max_items=200):
+    """
+    Découpe une liste de textes en lots contigus bornés en tokens et en taille.
+
+    Args:
+        texts (List[str]): textes à découper
+        max_tokens (int): nombre max de tokens (estimé) par lot
+        max_items (int): nombre max de textes par lot
+
+    Returns:
+        List[Tuple[int, int]]: bornes (début, fin) de chaque lot
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (tokens + cost > max_tokens or i - start >= max_items):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def is_rate_limited(exc):
+    """Indique si une exception correspond à une réponse HTTP 429."""
+    for obj in (exc, getattr(exc, "response", None)):
+        status = getattr(obj, "http_status", None) or getattr(obj, "status_code", None)
+        if status is None:
+            status = getattr(obj, "code", None)
+        if status == 429:
+            return True
+    return False
+
+
+def _retry_after(exc):
+    """Délai `Retry-After` (en secondes) annoncé par le serveur, s'il existe."""
+    for obj in (exc, getattr(exc, "response", None)):
+        headers = getattr(obj, "headers", None)
+        if headers:
+            try:
+                return float(headers.get("Retry-After") or headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+class TokenBucket:
+    """
+    Limiteur de débit à seau de jetons, adaptatif (AIMD).
+
+    Le débit est divisé par deux à chaque 429 puis remonte progressivement
+    après chaque succès, sans dépasser `max_rate`.
+
+    Attributs :
+        rate (float) : débit courant, en requêtes par seconde
+        max_rate (float) : débit maximal autorisé
+        min_rate (float) : débit plancher
+        capacity (float) : nombre de requêtes pouvant partir en rafale
+    """
+
+    def __init__(self, rate=5.0, capacity=None, min_rate=0.2, increase=0.1):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """Bloque jusqu'à ce qu'un jeton soit disponible."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self):
+        """Réaction à un 429 : débit divisé par deux, seau vidé."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0
+
+    def reward(self):
+        """Réaction à un succès : le débit remonte vers `max_rate`."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class EmbeddingBatchError(RuntimeError):
+    """Échec définitif d'un lot, après épuisement des tentatives."""
+
+    def __init__(self, start, end, cause):
+        super().__init__(f"lot [{start}:{end}] en échec : {cause}")
+        self.start = start
+        self.end = end
+        self.cause = cause
+
+
+class EmbeddingError(RuntimeError):
+    """Un ou plusieurs lots n'ont pas pu être encodés."""
+
+    def __init__(self, failures):
+        ranges = ", ".join(f"[{f.start}:{f.end}]" for f in failures)
+        super().__init__(f"{len(failures)} lot(s) en échec : {ranges}")
+        self.failures = failures
+
+
+class EmbeddingEngine:
+    """
+    Exécute une fonction d'embedding par lots, en parallèle et sous quota.
+
+    Attributs :
+        embed_fn (Callable[[List[str]], List[List[float]]]) : appel API pour un lot
+        max_in_flight (int) : nombre max de requêtes simultanées
+        max_tokens_per_batch (int) : taille max d'un lot en tokens estimés
+        max_items_per_batch (int) : taille max d'un lot en nombre de textes
+        limiter (TokenBucket) : limiteur de débit partagé par les workers
+        max_retries (int) : nombre maximal de tentatives par lot
+    """
+
+    def __init__(self, embed_fn, max_in_flight=4, max_tokens_per_batch=8000,
+                 max_items_per_batch=200, requests_per_second=5.0, max_retries=5,
+                 backoff=1.0):
+        self.embed_fn = embed_fn
+        self.max_in_flight = max_in_flight
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_items_per_batch = max_items_per_batch
+        self.limiter = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limited = 0
+
+    def _run_batch(self, texts, start, end):
+        """Encode un lot avec tentatives ; lève `EmbeddingBatchError` si échec."""
+        batch = texts[start:end]
+        for attempt in range(self.max_retries):
+            self.limiter.acquire()
+            try:
+                vectors = self.embed_fn(batch)
+                if len(vectors) != len(batch):
+                    raise ValueError(f"{len(vectors)} vecteurs reçus pour {len(batch)} textes")
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise EmbeddingBatchError(start, end, e) from e
+                if is_rate_limited(e):
+                    self.rate_limited += 1
+                    self.limiter.penalize()
+                delay = _retry_after(e) or self.backoff * 2 ** attempt
+                print(f"⚠️ Erreur API : {e} — lot [{start}:{end}] tentative "
+                      f"{attempt+1}/{self.max_retries} dans {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                self.limiter.reward()
+                return vectors
+
+    def embed(self, texts, on_batch_done=None):
+        """
+        Encode tous les textes et renvoie les vecteurs dans le même ordre.
+
+        Args:
+            texts (List[str]): textes à encoder
+            on_batch_done (Callable[[int, List[List[float]]], None]): appelé
+                (depuis le thread principal, dans l'ordre) avec l'indice de
+                début et les vecteurs de chaque lot terminé
+
+        Returns:
+            List[List[float]]: vecteurs d'embedding
+
+        Raises:
+            EmbeddingError: si au moins un lot a définitivement échoué
+        """
+        batches = make_batches(texts, self.max_tokens_per_batch, self.max_items_per_batch)
+        results = [None] * len(texts)
+        failures = []
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = [(start, end, pool.submit(self._run_batch, texts, start, end))
+                       for start, end in batches]
+            for start, end, future in futures:
+                try:
+                    vectors = future.result()
+                except EmbeddingBatchError as e:
+                    failures.append(e)
+                    continue
+                results[start:end] = vectors
+                if on_batch_done is not None:
+                    on_batch_done(start, vectors)
+
+        if failures:
+            raise EmbeddingError(failures)
+        return results
@@ -1,136 +1,352 @@
+"""
+evaluation.py
+
+Évaluation RAGAS de l'assistant, à travers le vrai pipeline de recherche.
+
+1. Jeu de test lu depuis un fichier JSON (liste) ou JSONL : `question`,
+   `ground_truth` et, si on les connaît, `relevant_ids` (identifiants des
+   événements attendus, pour le recall@k)
+2. Génération : pour chaque question, recherche hybride (cf.
+   shards.open_index) et prompt (cf. prompt.py) comme dans app.py, puis
+   réponse de Mistral ; `--concurrency` questions traitées en parallèle
+3. Jugement RAGAS (faithfulness, answer_relevancy, context_precision,
+   context_recall) : chaque score est mis en cache dans SQLite sous
+   sha256(métrique, modèle juge, question, réponse, contextes, vérité
+   terrain). Une question dont la réponse et les contextes n'ont pas changé
+   n'est pas rejugée ; seules les nouvelles lignes coûtent des appels LLM
+4. Rapport : scores moyens, latences de recherche et de génération
+   (p50 / p95 / p99, cf. tracing.py) et recall@k
+
+Les périodes des questions (« ce week-end »...) sont calculées par rapport
+à `--now` : un jeu de test écrit pour un export daté reste reproductible.
+
+Usage :
+    python evaluation.py --questions eval_questions.jsonl --now 2024-06-01 --concurrency 8
+    python evaluation.py --questions eval_questions.jsonl --json eval_report.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
 import os
-import pandas as pd
-import asyncio
-import nest_asyncio
-import traceback
-from datasets import Dataset
-from langchain_mistralai.chat_models import ChatMistralAI
-from langchain_mistralai.embeddings import MistralAIEmbeddings
-from ragas import evaluate
-from ragas.metrics import (
-    faithfulness,
-    answer_relevancy,
-    context_precision,
-    context_recall,
-)
-
-# Permet d'exécuter du code asynchrone dans un script Jupyter ou standard
-nest_asyncio.apply()
-
-# --- Jeu de test à remplir manuellement ---
-questions_test = [
-    "Quels sont les concerts gratuits en plein air?",
-    "Je cherche une expo photo",
-    "Je cherche un événement pour enfants"
-]
-
-answers = [
-'''voici deux événements gratuits en plein air à paris : fête de la musique aux jardins du palais-royal lieu : jardins du domaine national du palais-royal adresse : place colette, 75001 paris le 21 juin 2024 concerts gratuits, mise en lumière de groupes amateurs, déambulations festives dans les rues. au programme : un concert sous casque avec "la muse en circuit" et des fanfares de tous les styles musicaux. open air escape lieu : route de boulogne à passy adresse : route de boulogne à passy, 75016 paris le 21 juin 2024 garden party en open air avec dj set (house/disco/afro house/tech house/techno). entrée gratuite pour une soirée festive en plein air. as-tu d'autres questions ?
-''',
-'''📌 exposition photos 📍 Lieu : église orthodoxe saint-serge 🏠 Adresse : 93 rue de crimée 75019 paris 🗓️ du 21 au 22 septembre 2024 📝 Visite de l'exposition photos dans l'église Saint-Serge.
-
-📌 visite de la cité refuge 📍 Lieu : cité de refuge 🏠 Adresse : 12 rue cantagrel 75013 paris 🗓️ du 20 au 21 septembre 2024 📝 Exposition photos du Samu Social organisée durant cette période dans le hall.
-
-As-tu d’autres questions ?''',
-'''Voici deux événements adaptés aux enfants à Paris :
-
-📌 visite guidée « en famille avec les grandes grandes vacances » 📍 Lieu : musée de la libération de paris - musée du général leclerc - musée jean moulin 🏠 Adresse : 4 avenue du colonel henri rol-tanguy 75014 paris 🗓️ le 21 septembre 2024 📝 Pour les enfants de 8 à 12 ans et leurs parents.
-
-📌 lectures contées bilingues en famille en langue des signes française (lsf) et en français 📍 Lieu : musée zadkine 🏠 Adresse : 100 bis rue d'assas 75006 paris 🗓️ le 21 septembre 2024 📝 En famille, enfants à partir de 4 ans, activité proposée dans le cadre du week-end en famille spécial JEP 2024, accès libre et gratuit, dans la limite des places disponibles.
-
-As-tu d’autres questions ?'''
-]
-
-ground_truths = [
-'''Voici deux événements gratuits en plein air à Paris :
-
-📌 Fête de la musique aux jardins du Palais-Royal 📍 Lieu : Jardins du domaine national du Palais-Royal 🏠 Adresse : Place Colette, 75001 Paris 🗓️ le 21 juin 2024 📝Au programme : un concert sous casque avec "La Muse en Circuit" et des fanfares de tous les styles musicaux.
-
-📌 Open Air Escape 📍 Lieu : Route de Boulogne à Passy 🏠 Adresse : Route de Boulogne à Passy, 75016 Paris 🗓️ le 21 juin 2024 📝 Garden party en open air avec DJ set (House/Disco/Afro House/Tech House/Techno)
-
-As-tu d’autres questions ?''',
-    '''📌 exposition photos 📍 Lieu : église orthodoxe saint-serge 🏠 Adresse : 93 rue de crimée 75019 paris 🗓️ du 21 au 22 septembre 2024 📝 Visite de l'exposition photos dans l'église Saint-Serge.
-
-📌 visite de la cité refuge 📍 Lieu : cité de refuge 🏠 Adresse : 12 rue cantagrel 75013 paris 🗓️ du 20 au 21 septembre 2024 📝 Exposition photos du Samu Social.
-
-As-tu d’autres questions ?''',
-    '''Voici deux événements adaptés aux enfants à Paris :
-
-📌 visite guidée « en famille avec les grandes grandes vacances » 📍 Lieu : musée de la libération de paris - musée du général leclerc - musée jean moulin 🏠 Adresse : 4 avenue du colonel henri rol-tanguy 75014 paris 🗓️ le 21 septembre 2024 📝 A quoi ressemblait la vie en france durant la seconde guerre mondiale ?
-
-📌 lectures contées bilingues en famille en langue des signes française (lsf) et en français 📍 Lieu : musée zadkine 🏠 Adresse : 100 bis rue d'assas 75006 paris 🗓️ le 21 septembre 2024 📝 Les bibliothécaires de la médiathèque de la canopée proposent des lectures contées en français et en lsf (langue des signes française)
-
-As-tu d’autres questions ?'''
-]
-
-
-placeholder_contexts = [
-    [
-  "fête de la musique aux jardins du palais-royal - jardins du domaine national du palais-royal - place colette, 75001 paris - du 2024-06-21t11:30:00+00:00 au 2024-06-21t19:30:00+00:00 - concerts gratuits, mise en lumière de groupes amateurs, déambulations festives dans les rues… ce ne sont pas les animations qui manquent ! et si chaque restaurant, bar ou institution culturelle de la capitale met la main à la pâte pour faire de cet événement une grande célébration collective, cette année encore, le ministère de la culture propose une programmation inédite au cœur des jardins du palais-royal.",
-  "fête de la musique aux jardins du palais-royal - jardins du domaine national du palais-royal - place colette, 75001 paris - du 2024-06-21t11:30:00+00:00 au 2024-06-21t19:30:00+00:00 - au programme : un concert sous casque avec \"la muse en circuit\" et des fanfares de tous les styles musicaux. une journée de concerts gratuits dans les jardins du palais-royal de 13h30 jusqu’à 21h15 ce vendredi 21 juin, les jardins du palais-royal se transformeront en véritable temple de la musique ! en accès libre, cette journée de concerts sera ouverte à tous les mélomanes, petits et grands.",
-  "concert de la maîtrise notre-dame de paris - parvis de la cathédrale notre-dame de paris - parvis notre-dame de paris - du 2024-09-20t18:00:00+00:00 au 2024-09-21t18:30:00+00:00 - chants traditionnels et extraits du dernier disque de la maîtrise seront au programme : venez partager ce moment musical en plein air !",    
-  "open air escape - rte de boulogne à passy, 75016 paris, france - rte de boulogne à passy, 75016 paris, france - du 2024-06-21t16:00:00+00:00 au 2024-06-21t21:55:00+00:00 - - house/disco/afro house/tech house/techno entrée gratuite. que vous soyez là pour célébrer avec des amis, rencontrer de nouvelles personnes, ou simplement profiter d'une soirée en plein air dans une ambiance festive, notre garden party en open air avec dj set est l'événement incontournable pour cette édition 2024 de la fête de la musique . venez vivre une nuit mémorable où la nature et la musique se conjuguent pour créer des moments magiques ."
-],
-    [
-  "exposition photos - église orthodoxe saint-serge - 93 rue de crimée 75019 paris - du 2024-09-21t13:00:00+00:00 au 2024-09-22t15:00:00+00:00 - visite de l'exposition photos dans l'église saint-serge. visite de l'exposition photos dans l'église saint-serge",
-  "barto+barto. trait pour trait - école nationale supérieure d'architecture de paris-la villette - 144 rue de flandre 75019 paris - du 2024-10-18t08:00:00+00:00 au 2024-10-19t16:00:00+00:00 - exposition présentée dans la salle d'exposition du 3 au 24 octobre 2024, du lundi au vendredi de 10h à 19h, samedi de 10h à 18h. entrée libre.",
-  "visite de la cité refuge - cité de refuge - 12 rue cantagrel 75013 paris - du 2024-09-20t08:30:00+00:00 au 2024-09-21t13:30:00+00:00 - exposition photos du samu social organisée durant cette période dans hall.",
-  "visite guidée de l'exposition \"paris-cinés 1982-1992\" - bibliothèque andré malraux - 112, rue de rennes 75006 paris - du 2024-09-28t13:00:00+00:00 au 2024-09-28t14:30:00+00:00 - une sensibilisation à la conservation de ce patrimoine culturel que le monde nous envie. une visite commentée en présence du photographe aura lieu le 28 septembre à 15h. sur réservation uniquement. jean-françois chaput est un photographe indépendant né en 1955 à paris. il a été assistant-réalisateur et projectionniste. son projet sur les cinémas parisiens développé pendant dix ans, a pris une très grande place dans sa vie et dans son travail. il a été exposé à plusieurs reprises."
-],    [
-  "visite guidée « en famille avec les grandes grandes vacances » - musée de la libération de paris - musée du général leclerc - musée jean moulin - 4 avenue du colonel henri rol-tanguy 75014 paris - du 2024-09-21t13:30:00+00:00 au 2024-09-21t15:00:00+00:00 - pour les enfants de 8 à 12 ans et leurs parents.",
-  "journées du patrimoine culturel et naturel à la mairie du 9e - mairie du 9e - 6 rue drouot paris - du 2024-09-21t08:00:00+00:00 au 2024-09-22t16:00:00+00:00 - quant aux enfants, un grand nombre d'animations et ateliers leurs seront proposés.",
-  "atelier lecture pour enfants - jardin partagé des olympiades - 59 rue nationale 75013 paris - du 2024-06-30t14:30:00+00:00 au 2024-06-30t15:00:00+00:00 - lecture de récits pour enfants.",
-  "lectures contées bilingues en famille en langue des signes française (lsf) et en français - musée zadkine - 100 bis rue d'assas 75006 paris - du 2024-09-21t12:30:00+00:00 au 2024-09-21t15:00:00+00:00 - en famille, enfants à partir de 4 ans activité proposée dans le cadre du week-end en famille spécial jep 2024 accès libre et gratuit, dans la limite des places disponibles"
-]    ]
-
-# --- Création du dataset d'évaluation
-evaluation_data = {
-    "question": questions_test,
-    "answer": answers,
-    "contexts": placeholder_contexts,
-    "ground_truth": ground_truths
-}
-evaluation_dataset = Dataset.from_dict(evaluation_data)
-print("✅ Dataset d'évaluation prêt.")
-
-# --- Configuration et Exécution de l'Évaluation
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "VOTRE_CLE_API_MISTRAL_ICI")
-if MISTRAL_API_KEY == "VOTRE_CLE_API_MISTRAL_ICI" or not MISTRAL_API_KEY:
-    print("⚠️ Clé API Mistral non trouvée.")
-
-try:
-    # Initialisation du modèle et des embeddings
-    mistral_llm = ChatMistralAI(
-        mistral_api_key=MISTRAL_API_KEY,
-        model="mistral-large-latest",
-        temperature=0.1
-    )
-    mistral_embeddings = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY)
-
-    metrics_to_evaluate = [
-        faithfulness,
-        answer_relevancy,
-        context_precision,
-        context_recall
-    ]
-
-    print("📊 Lancement de l'évaluation RAGAS (cela peut prendre quelques minutes)...")
-    results = evaluate(
-        dataset=evaluation_dataset,
-        metrics=metrics_to_evaluate,
-        llm=mistral_llm,
-        embeddings=mistral_embeddings
-    )
-
-    # Résultats complets
-    results_df = results.to_pandas()
-    print("\n--- Résultats détaillés ---")
-    print(results_df)
-
-    # Moyennes globales
-    print("\n✅ Scores moyens sur le dataset :")
-    print(results_df.mean(numeric_only=True))
-
-except Exception as e:
-    print("❌ ERREUR durant l’évaluation :")
-    traceback.print_exc()
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+from mistralai.models.chat_completion import ChatMessage
+
+from date_filter import PARIS
+from mistral_embeddings import CustomMistralEmbeddings, mistral_client
+from prompt import build_prompt
+from query_cache import CachingQueryEmbeddings
+from shards import open_index
+from tracing import Tracer
+
+INDEX_DIR = "faiss_langchain_index"
+QUESTIONS_FILE = "eval_questions.jsonl"
+CHAT_MODEL = "mistral-medium"
+JUDGE_MODEL = "mistral-large-latest"
+METRICS = ("faithfulness", "answer_relevancy", "context_precision", "context_recall")
+
+
+def load_questions(path):
+    """
+    Jeu de test : liste JSON ou une question par ligne (JSONL).
+
+    Returns:
+        List[dict]: question, ground_truth et relevant_ids (None si absents)
+
+    Raises:
+        ValueError: entrée sans question ou sans ground_truth
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    questions = []
+    for number, item in enumerate(items, start=1):
+        if not item.get("question") or not item.get("ground_truth"):
+            raise ValueError(f"{path}, entrée {number} : 'question' et 'ground_truth' sont requis")
+        relevant = item.get("relevant_ids")
+        questions.append({"question": item["question"], "ground_truth": item["ground_truth"],
+                          "relevant_ids": None if relevant is None else [str(i) for i in relevant]})
+    return questions
+
+
+def recall_at_k(retrieved_ids, relevant_ids, k):
+    """Part des événements attendus présents dans les k premiers résultats."""
+    if not relevant_ids:
+        return None
+    return len(set(retrieved_ids[:k]) & set(relevant_ids)) / len(set(relevant_ids))
+
+
+def generate_answers(index, client, questions, k=4, concurrency=4, now=None, tracer=None):
+    """
+    Recherche, prompt et réponse pour chaque question, `concurrency` à la fois.
+
+    Args:
+        index (EventIndex | ShardedEventIndex): index chargé (cf. shards.open_index)
+        client (MistralClient): client de chat
+        questions (List[dict]): cf. load_questions
+        k (int): événements dans le contexte (comme app.py)
+        concurrency (int): questions traitées en parallèle
+        now (datetime): instant de référence des périodes (None = maintenant)
+        tracer (Tracer): mesures par étape (spans `retrieval` et `generation`)
+
+    Returns:
+        List[dict]: une ligne par question (réponse, contextes, identifiants
+            retrouvés, recall@k, erreur éventuelle), dans l'ordre du jeu de test
+    """
+    tracer = tracer or Tracer(path=None, window=max(len(questions), 1))
+
+    def run(item):
+        row = dict(item, answer="", contexts=[], retrieved_ids=[], retrieval=None, error=None)
+        with tracer.trace("evaluation") as trace:
+            try:
+                with trace.span("retrieval") as span:
+                    results, _, mode = index.search(item["question"], k=k, now=now, trace=trace)
+                    span.set(mode=mode, events=len(results))
+                row["retrieval"] = mode
+                row["retrieved_ids"] = [str(doc.metadata.get("id", "")) for doc, _ in results]
+                final_prompt, row["contexts"] = build_prompt(item["question"], results)
+                with trace.span("generation", model=CHAT_MODEL):
+                    response = client.chat(
+                        model=CHAT_MODEL,
+                        messages=[ChatMessage(role="user", content=final_prompt)],
+                        temperature=0.2,
+                        top_p=0.9,
+                    )
+                row["answer"] = response.choices[0].message.content
+            except Exception as exc:
+                trace.fail(exc)
+                row["error"] = f"{type(exc).__name__}: {exc}"
+        row["recall"] = recall_at_k(row["retrieved_ids"], item["relevant_ids"], k)
+        return row
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(run, questions))
+
+
+class JudgeCache:
+    """
+    Scores des métriques RAGAS déjà calculés, dans un fichier SQLite.
+
+    Attributs :
+        path (str) : chemin du fichier SQLite
+        model (str) : modèle juge (fait partie de la clé)
+        hits, misses (int) : scores relus / à calculer
+    """
+
+    def __init__(self, path="judge_cache.sqlite", model=JUDGE_MODEL):
+        self.path = path
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL)")
+        self._conn.commit()
+
+    def key(self, metric, row):
+        """sha256 de (métrique, modèle juge, question, réponse, contextes, vérité terrain)."""
+        payload = [metric, self.model, row["question"], row["answer"], row["contexts"], row["ground_truth"]]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Scores connus (NaN pour un score que RAGAS n'a pas pu calculer), indexés par clé."""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # SQLite limite le nombre de paramètres par requête
+        for i in range(0, len(unique_keys), 500):
+            batch = unique_keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, score FROM scores WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            found.update((key, math.nan if score is None else score) for key, score in rows)
+        return found
+
+    def put_many(self, keys, scores):
+        rows = [(key, None if score is None or math.isnan(score) else float(score))
+                for key, score in zip(keys, scores)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def judge_rows(rows, judge, cache, metrics=METRICS):
+    """
+    Scores RAGAS de chaque ligne ; seules les lignes absentes du cache sont jugées.
+
+    Args:
+        rows (List[dict]): lignes de generate_answers (celles en erreur sont ignorées)
+        judge (Callable[[str, List[dict]], List[float]]): score d'une métrique
+            pour une liste de lignes (cf. ragas_judge)
+        cache (JudgeCache): cache des scores
+        metrics (Iterable[str]): métriques RAGAS
+
+    Returns:
+        List[dict]: scores par métrique, une entrée par ligne ({} si en erreur)
+    """
+    scores = [{} for _ in rows]
+    judged = [i for i, row in enumerate(rows) if row["error"] is None]
+    for metric in metrics:
+        keys = {i: cache.key(metric, rows[i]) for i in judged}
+        known = cache.get_many(list(keys.values()))
+        # Une ligne par clé absente : les lignes identiques ne sont jugées qu'une fois
+        missing = {}
+        for i in judged:
+            if keys[i] not in known:
+                missing.setdefault(keys[i], i)
+        cache.hits += len(judged) - len(missing)
+        cache.misses += len(missing)
+        if missing:
+            new_scores = judge(metric, [rows[i] for i in missing.values()])
+            if len(new_scores) != len(missing):
+                raise RuntimeError(f"{metric} : {len(new_scores)} scores reçus pour {len(missing)} lignes")
+            cache.put_many(list(missing), new_scores)
+            known.update(zip(missing, new_scores))
+        for i in judged:
+            scores[i][metric] = known[keys[i]]
+    return scores
+
+
+def ragas_judge(api_key, model=JUDGE_MODEL, concurrency=4):
+    """
+    Juge RAGAS (LLM et embeddings Mistral) : une évaluation par métrique.
+
+    Les dépendances de RAGAS ne sont importées qu'ici : génération, recall@k
+    et scores déjà en cache n'en ont pas besoin.
+    """
+    import nest_asyncio
+    from datasets import Dataset
+    from langchain_mistralai.chat_models import ChatMistralAI
+    from langchain_mistralai.embeddings import MistralAIEmbeddings
+    from ragas import evaluate
+    from ragas import metrics as ragas_metrics
+    from ragas.run_config import RunConfig
+
+    # RAGAS exécute ses appels dans une boucle asyncio (script ou Jupyter)
+    nest_asyncio.apply()
+    llm = ChatMistralAI(mistral_api_key=api_key, model=model, temperature=0.1)
+    embeddings = MistralAIEmbeddings(mistral_api_key=api_key)
+
+    def judge(metric, rows):
+        dataset = Dataset.from_dict({
+            "question": [row["question"] for row in rows],
+            "answer": [row["answer"] for row in rows],
+            "contexts": [row["contexts"] for row in rows],
+            "ground_truth": [row["ground_truth"] for row in rows],
+        })
+        result = evaluate(dataset=dataset, metrics=[getattr(ragas_metrics, metric)], llm=llm,
+                          embeddings=embeddings, run_config=RunConfig(max_workers=concurrency))
+        return [float(score) for score in result.to_pandas()[metric]]
+
+    return judge
+
+
+def mean(values):
+    values = [v for v in values if v is not None and not math.isnan(v)]
+    return round(float(np.mean(values)), 4) if values else None
+
+
+def build_report(rows, scores, tracer, k, cache=None):
+    """
+    Scores moyens, recall@k et latences par étape.
+
+    Returns:
+        dict: rapport (les lignes détaillées sont sous `rows`)
+    """
+    stats = tracer.stats()
+    metrics = sorted({metric for row_scores in scores for metric in row_scores})
+    return {
+        "questions": len(rows),
+        "errors": sum(row["error"] is not None for row in rows),
+        "scores": {metric: mean([s.get(metric) for s in scores]) for metric in metrics},
+        f"recall@{k}": mean([row["recall"] for row in rows]),
+        "recall_questions": sum(row["recall"] is not None for row in rows),
+        "retrieval_latency": stats.get("evaluation.retrieval"),
+        "generation_latency": stats.get("evaluation.generation"),
+        "judge_cache": None if cache is None else {"hits": cache.hits, "misses": cache.misses},
+        "rows": [dict(row, scores=row_scores) for row, row_scores in zip(rows, scores)],
+    }
+
+
+def print_report(report, k):
+    print(f"\n✅ {report['questions']} questions ({report['errors']} en erreur)")
+    for metric, value in report["scores"].items():
+        print(f"📊 {metric} : {value}")
+    if report["recall_questions"]:
+        print(f"🎯 recall@{k} : {report[f'recall@{k}']} ({report['recall_questions']} questions annotées)")
+    for name in ("retrieval_latency", "generation_latency"):
+        latency = report[name]
+        if latency:
+            print(f"⏱️ {name} : p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms")
+    if report["judge_cache"]:
+        cache = report["judge_cache"]
+        print(f"🗄️ Cache du juge : {cache['hits']} scores relus, {cache['misses']} calculés")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Évaluation RAGAS sur le pipeline de recherche réel")
+    parser.add_argument("--questions", default=QUESTIONS_FILE, help="jeu de test (JSON ou JSONL)")
+    parser.add_argument("--index", default=INDEX_DIR, help="dossier de l'index")
+    parser.add_argument("--k", type=int, default=4, help="événements dans le contexte")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions traitées en parallèle")
+    parser.add_argument("--now", help="date de référence des périodes (ISO, ex. 2024-06-01)")
+    parser.add_argument("--metrics", nargs="+", default=list(METRICS), choices=METRICS)
+    parser.add_argument("--judge-model", default=JUDGE_MODEL)
+    parser.add_argument("--judge-cache", default="judge_cache.sqlite", help="cache SQLite des scores")
+    parser.add_argument("--no-judge", action="store_true", help="recall@k et latences seulement")
+    parser.add_argument("--json", help="fichier du rapport JSON")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise SystemExit("⚠️ Clé API Mistral non trouvée.")
+    client = mistral_client(api_key)
+    now = None
+    if args.now:
+        now = datetime.fromisoformat(args.now)
+        now = now if now.tzinfo else now.replace(tzinfo=PARIS)
+
+    questions = load_questions(args.questions)
+    index = open_index(args.index, CachingQueryEmbeddings(CustomMistralEmbeddings(client)))
+    tracer = Tracer(path=None, window=max(len(questions), 1))
+    print(f"🔎 Génération des réponses pour {len(questions)} questions ({args.concurrency} en parallèle)...")
+    rows = generate_answers(index, client, questions, args.k, args.concurrency, now, tracer)
+    for row in rows:
+        if row["error"]:
+            print(f"❌ {row['question']} : {row['error']}")
+
+    cache = None
+    scores = [{} for _ in rows]
+    if not args.no_judge:
+        cache = JudgeCache(args.judge_cache, args.judge_model)
+        print("📊 Jugement RAGAS (scores en cache réutilisés)...")
+        scores = judge_rows(rows, ragas_judge(api_key, args.judge_model, args.concurrency), cache,
+                            args.metrics)
+        cache.close()
+
+    report = build_report(rows, scores, tracer, args.k, cache)
+    print_report(report, args.k)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport écrit dans {os.path.abspath(args.json)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+fake_mistral.py
+
+Serveur HTTP local imitant l'API Mistral, pour tester et mesurer sans quota.
+
+Endpoints :
+- POST /v1/embeddings : vecteurs déterministes (dérivés d'un hash du texte)
+- POST /v1/chat/completions : réponse fixe, en bloc ou en flux SSE
+  (`"stream": true`), avec une latence réglable entre chaque token
+
+Options : latence par requête, latence par token, dimension, limite de débit
+(réponses 429 avec `Retry-After`) et injection d'erreurs (tout texte contenant
+`__FAIL__` provoque une erreur 500).
+
+Usage :
+    python fake_mistral.py --port 8765 --latency 0.05 --token-latency 0.01 --rate-limit 20
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+FAIL_MARKER = "__FAIL__"
+
+DEFAULT_REPLY = (
+    "📌 **Réponse factice**  \n📍 _Lieu : serveur local_  \n"
+    "📝 Ceci est une réponse générée par fake_mistral.py pour les tests.\n\n"
+    "As-tu d’autres questions ?"
+)
+
+
+def fake_embedding(text, dim=1024):
+    """Vecteur unitaire déterministe pour un texte donné."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    # Tirage numpy : le serveur ne doit pas être le goulot d'un benchmark (cf. bench.py)
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+class FakeMistralState:
+    """Configuration et compteurs partagés par les threads du serveur."""
+
+    def __init__(self, dim=1024, latency=0.0, rate_limit=None, token_latency=0.0,
+                 reply=DEFAULT_REPLY):
+        self.dim = dim
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.token_latency = token_latency
+        self.reply = reply
+        self.cancelled_streams = 0
+        self.connections = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    def enter(self):
+        """Enregistre une requête ; renvoie False si elle dépasse le quota."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.rate_limit:
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    self.rate_limited += 1
+                    return False
+                self._window.append(now)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def setup(self):
+        # Connexions TCP ouvertes : moins que de requêtes si le client garde ses connexions
+        super().setup()
+        with self.state._lock:
+            self.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.state.enter():
+            self._send_json(429, {"message": "Requests rate limit exceeded"}, {"Retry-After": "0.2"})
+            return
+        try:
+            if self.state.latency:
+                time.sleep(self.state.latency)
+            if self.path == "/v1/embeddings":
+                self._embeddings(payload)
+            elif self.path == "/v1/chat/completions":
+                self._chat(payload)
+            else:
+                self._send_json(404, {"message": f"unknown endpoint {self.path}"})
+        finally:
+            self.state.leave()
+
+    def _embeddings(self, payload):
+        texts = payload.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        if any(FAIL_MARKER in text for text in texts):
+            self._send_json(500, {"message": "injected failure"})
+            return
+        tokens = sum(len(text.split()) for text in texts)
+        self._send_json(200, {
+            "id": "embd-fake",
+            "object": "list",
+            "model": payload.get("model", "mistral-embed"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.state.dim)}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens, "completion_tokens": 0},
+        })
+
+    def _chat(self, payload):
+        messages = payload.get("messages") or []
+        prompt = " ".join(str(m.get("content", "")) for m in messages)
+        if FAIL_MARKER in prompt:
+            self._send_json(500, {"message": "injected failure"})
+            return
+        model = payload.get("model", "mistral-medium")
+        usage = {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(self.state.reply.split()),
+            "total_tokens": len(prompt.split()) + len(self.state.reply.split()),
+        }
+        if not payload.get("stream"):
+            if self.state.token_latency:
+                time.sleep(self.state.token_latency * len(self.state.reply.split()))
+            self._send_json(200, {
+                "id": "chat-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.state.reply}}],
+                "usage": usage,
+            })
+            return
+
+        # Flux en transfert chunked : la connexion reste ouverte pour la requête suivante
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None, **extra):
+            chunk = {
+                "id": "chat-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            data = f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            return f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n"
+
+        tokens = [word + " " for word in self.state.reply.split(" ")]
+        tokens[-1] = tokens[-1][:-1]
+        try:
+            self.wfile.write(event({"role": "assistant", "content": ""}))
+            for token in tokens:
+                if self.state.token_latency:
+                    time.sleep(self.state.token_latency)
+                self.wfile.write(event({"content": token}))
+                self.wfile.flush()
+            self.wfile.write(event({"content": ""}, "stop", usage=usage))
+            self.wfile.write(b"e\r\ndata: [DONE]\n\n\r\n0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            with self.state._lock:
+                self.state.cancelled_streams += 1
+
+
+@contextmanager
+def serve_in_thread(host="127.0.0.1", port=0, **options):
+    """
+    Démarre le faux serveur dans un thread le temps d'un bloc `with`.
+
+    Yields:
+        Tuple[str, FakeMistralState]: URL de base et état du serveur
+    """
+    server = ThreadingHTTPServer((host, port), FakeMistralHandler)
+    server.daemon_threads = True
+    server.state = FakeMistralState(**options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}", server.state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Faux serveur API Mistral local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=1024, help="dimension des embeddings")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence par requête (s)")
+    parser.add_argument("--rate-limit", type=int, default=None, help="requêtes/s avant 429")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="délai entre deux tokens de chat (s)")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeMistralHandler)
+    server.daemon_threads = True
+    server.state = FakeMistralState(dim=args.dim, latency=args.latency, rate_limit=args.rate_limit,
+                                    token_latency=args.token_latency)
+    print(f"🧪 Faux serveur Mistral sur http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+index_journal.py
+
+Journal d'indexation reprenable : les vecteurs sont écrits sur disque au fil
+de l'eau, par lots, au lieu de n'exister qu'en mémoire jusqu'à la sauvegarde
+finale de l'index FAISS.
+
+Format (dossier `index_journal/`) :
+- `shard_00000.npy`, `shard_00001.npy`... : vecteurs float32 d'un lot
+- `manifest.jsonl` : une ligne par lot terminé (fichier du shard, ids des
+  chunks, empreintes de leur texte), ajoutée seulement une fois le shard
+  écrit ; une ligne incomplète (arrêt brutal) est retirée à la relecture,
+  de même que les shards `.tmp` inachevés
+
+Un run relancé ne ré-encode que les chunks absents du journal.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+def text_key(text):
+    """Empreinte du texte d'un chunk (un id réutilisé avec un autre texte est ré-encodé)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class IndexJournal:
+    """
+    Journal en ajout seul de lots de vecteurs.
+
+    Attributs :
+        path (str) : dossier du journal
+    """
+
+    MANIFEST = "manifest.jsonl"
+
+    def __init__(self, path="index_journal"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._entries = {}  # id -> (fichier shard, ligne, empreinte)
+        self._shards = 0
+        self._load_manifest()
+
+    def _load_manifest(self):
+        # Shards en cours d'écriture lors d'un arrêt brutal
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.path, name))
+        manifest = os.path.join(self.path, self.MANIFEST)
+        if not os.path.exists(manifest):
+            return
+        with open(manifest, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # Ligne finale tronquée : retirée, sinon le prochain lot s'y collerait
+                f.truncate(data.rfind(b"\n") + 1)
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # ligne tronquée par un arrêt brutal
+                shard = record["shard"]
+                self._shards = max(self._shards, int(shard[len("shard_"):-len(".npy")]) + 1)
+                if not os.path.exists(os.path.join(self.path, shard)):
+                    continue
+                for row, (doc_id, key) in enumerate(zip(record["ids"], record["keys"])):
+                    self._entries[doc_id] = (shard, row, key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pending(self, ids, texts):
+        """Indices des chunks absents du journal (ou dont le texte a changé)."""
+        return [
+            i for i, (doc_id, text) in enumerate(zip(ids, texts))
+            if self._entries.get(doc_id, (None, None, None))[2] != text_key(text)
+        ]
+
+    def append(self, ids, texts, vectors):
+        """
+        Ajoute un lot terminé : écriture atomique du shard, puis du manifeste.
+
+        Args:
+            ids (List[str]): identifiants des chunks
+            texts (List[str]): textes des chunks
+            vectors (List[List[float]]): vecteurs correspondants
+        """
+        shard = f"shard_{self._shards:05d}.npy"
+        tmp = os.path.join(self.path, shard + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, shard))
+
+        keys = [text_key(text) for text in texts]
+        with open(os.path.join(self.path, self.MANIFEST), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"shard": shard, "ids": list(ids), "keys": keys}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        for row, (doc_id, key) in enumerate(zip(ids, keys)):
+            self._entries[doc_id] = (shard, row, key)
+        self._shards += 1
+
+    def load(self, ids):
+        """
+        Assemble les vecteurs des chunks demandés, dans l'ordre donné.
+
+        Returns:
+            np.ndarray: matrice float32 (len(ids), dim)
+        """
+        shards = {}
+        rows = []
+        for doc_id in ids:
+            shard, row, _ = self._entries[doc_id]
+            if shard not in shards:
+                shards[shard] = np.load(os.path.join(self.path, shard), mmap_mode="r")
+            rows.append(shards[shard][row])
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(rows).astype(np.float32, copy=False)
+
+    def clear(self):
+        """Supprime le journal (à appeler une fois l'index final sauvegardé)."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+        self._entries = {}
+        self._shards = 0
+
+
+def embed_with_journal(journal, ids, texts, embeddings, checkpoint_size=1000):
+    """
+    Encode les chunks manquants par lots journalisés et renvoie tous les vecteurs.
+
+    Args:
+        journal (IndexJournal): journal de reprise
+        ids (List[str]): identifiants des chunks
+        texts (List[str]): textes des chunks
+        embeddings (Embeddings): fonction d'embedding LangChain
+        checkpoint_size (int): nombre de chunks par lot journalisé
+
+    Returns:
+        np.ndarray: vecteurs float32 dans l'ordre de `ids`
+    """
+    pending = journal.pending(ids, texts)
+    if len(pending) < len(ids):
+        print(f"♻️ Reprise : {len(ids) - len(pending)} chunk(s) déjà présents dans le journal.")
+
+    for n, i in enumerate(range(0, len(pending), checkpoint_size), 1):
+        batch = pending[i:i + checkpoint_size]
+        batch_texts = [texts[j] for j in batch]
+        vectors = embeddings.embed_documents(batch_texts)
+        journal.append([ids[j] for j in batch], batch_texts, vectors)
+        print(f"💾 Lot {n} journalisé ({i + len(batch)}/{len(pending)} chunks)")
+
+    return journal.load(ids)
@@ -0,0 +1,194 @@
+"""
+index_types.py
+
+Types d'index FAISS disponibles à l'indexation, du plus exact au plus compact :
+
+- "flat"  : recherche exhaustive exacte (IndexFlatL2), le comportement historique
+- "ivf"   : partitionnement en `nlist` listes (IVF-Flat), on visite `nprobe` listes
+- "hnsw"  : graphe de voisinage (HNSW-Flat), compromis réglé par `efSearch`
+- "ivfpq" : IVF + quantification produit (`m` sous-vecteurs de 8 bits),
+            ~`m` octets par vecteur au lieu de 4 Ko
+- "fp16"  : recherche exhaustive sur des vecteurs en float16 (2 Ko par vecteur)
+- "sq8"   : recherche exhaustive sur des vecteurs quantifiés sur 8 bits par
+            dimension (min/max appris par dimension), 1 Ko par vecteur
+
+Pour les types compressés (`COMPRESSED_TYPES`), les vecteurs float32 sont
+conservés à part pour re-classer exactement les meilleurs candidats
+(cf. vector_storage.py).
+
+Les index IVF sont entraînés sur un échantillon des vecteurs. Sous
+`PQ_MIN_TRAIN` vecteurs (petit shard mensuel, cf. shards.py), les 256
+centroïdes PQ ne peuvent pas être appris : "ivfpq" se replie sur "sq8", lui
+aussi compressé, et `nlist` est ramené au nombre de vecteurs. Les paramètres de
+recherche (`nprobe`, `efSearch`) sont enregistrés dans l'index et peuvent être
+modifiés au chargement (`set_search_params`).
+"""
+
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "fp16", "sq8")
+COMPRESSED_TYPES = ("ivfpq", "fp16", "sq8")
+
+_SCALAR_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Vecteurs nécessaires à l'entraînement des codes PQ sur 8 bits
+PQ_NBITS = 8
+PQ_MIN_TRAIN = 2 ** PQ_NBITS
+
+
+def default_nlist(n):
+    """Nombre de listes IVF : ~4·√n, avec au moins 39 vecteurs d'entraînement par liste."""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def build_faiss_index(vectors, kind="flat", nlist=None, pq_m=64, hnsw_m=32,
+                      ef_construction=80, nprobe=8, ef_search=64, train_size=50000, seed=0):
+    """
+    Construit et remplit un index FAISS (distance L2) du type demandé.
+
+    Args:
+        vectors (np.ndarray): vecteurs float32 (n, d)
+        kind (str): un des `INDEX_TYPES` ("ivfpq" devient "sq8" sous `PQ_MIN_TRAIN` vecteurs)
+        nlist (int): nombre de listes IVF (défaut : `default_nlist(n)`, au plus n)
+        pq_m (int): nombre de sous-quantificateurs PQ (doit diviser d)
+        hnsw_m (int): nombre de voisins par nœud HNSW
+        ef_construction (int): largeur de recherche à la construction HNSW
+        nprobe (int): listes visitées par requête (IVF)
+        ef_search (int): largeur de recherche par requête (HNSW)
+        train_size (int): taille max de l'échantillon d'entraînement
+        seed (int): graine de l'échantillonnage
+
+    Returns:
+        faiss.Index: index rempli
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    if kind == "ivfpq" and n < PQ_MIN_TRAIN:
+        print(f"⚠️ {n} vecteur(s) : trop peu pour entraîner IVF-PQ, index 'sq8' à la place")
+        kind = "sq8"
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    elif kind in _SCALAR_TYPES:
+        index = faiss.IndexScalarQuantizer(d, _SCALAR_TYPES[kind])
+        index.train(_training_sample(vectors, train_size, seed))
+    elif kind in ("ivf", "ivfpq"):
+        # Au plus une liste par vecteur (k-means impossible sinon)
+        nlist = max(1, min(nlist or default_nlist(n), n))
+        quantizer = faiss.IndexFlatL2(d)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            if d % pq_m:
+                raise ValueError(f"pq_m={pq_m} doit diviser la dimension {d}")
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, PQ_NBITS)
+        index.train(_training_sample(vectors, train_size, seed))
+    else:
+        raise ValueError(f"Type d'index inconnu : {kind} (attendu : {', '.join(INDEX_TYPES)})")
+
+    index.add(vectors)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    return index
+
+
+def _training_sample(vectors, train_size, seed):
+    n = len(vectors)
+    if n <= train_size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(n, train_size, replace=False)]
+
+
+def index_kind(index):
+    """Type ("flat", "ivf", "hnsw", "ivfpq", "fp16", "sq8"...) d'un index FAISS chargé."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for kind, qtype in _SCALAR_TYPES.items():
+            if index.sq.qtype == qtype:
+                return kind
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # try_extract_index_ivf renvoie la classe de base : type réel via downcast
+        return "ivfpq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Règle `nprobe` (IVF) et/ou `efSearch` (HNSW) ; sans effet sur les autres types."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def search_parameters(index, selector=None):
+    """
+    Paramètres de recherche adaptés au type d'index (obligatoire pour passer
+    un `IDSelector` à un index IVF ou HNSW), avec ses réglages courants.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def to_flat(index, vectors=None):
+    """
+    Copie d'un index HNSW ou IVF en IndexFlatL2 (pour les suppressions).
+
+    Args:
+        index (faiss.Index): index à copier
+        vectors (np.ndarray): vecteurs exacts, dans l'ordre des positions ;
+            obligatoires si l'index les compresse (IVF-PQ), relus dans l'index sinon
+    """
+    flat = faiss.IndexFlatL2(index.d)
+    if vectors is None and index.ntotal:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        vectors = index.reconstruct_n(0, index.ntotal)
+    if vectors is not None and len(vectors):
+        flat.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    return flat
+
+
+def rebuild_hnsw(flat, like):
+    """Reconstruit un index HNSW à partir d'un index plat, avec les réglages de `like`."""
+    index = faiss.IndexHNSWFlat(flat.d, like.hnsw.nb_neighbors(1))
+    index.hnsw.efConstruction = like.hnsw.efConstruction
+    index.hnsw.efSearch = like.hnsw.efSearch
+    if flat.ntotal:
+        index.add(flat.reconstruct_n(0, flat.ntotal))
+    return index
+
+
+def rebuild_ivf(flat, like):
+    """
+    Re-remplit un index IVF à partir d'un index plat, avec le quantificateur
+    déjà entraîné et les réglages de `like` (positions consécutives).
+
+    `IndexIVF.remove_ids` garde les identifiants d'origine au lieu de
+    compacter les positions, ce qui désaligne le vectorstore LangChain :
+    les suppressions passent donc par un index plat, comme pour HNSW.
+    """
+    # Copie typée (IndexIVFFlat / IndexIVFPQ) : relue depuis sa sérialisation
+    index = faiss.deserialize_index(faiss.serialize_index(like))
+    index.reset()
+    if flat.ntotal:
+        index.add(flat.reconstruct_n(0, flat.ntotal))
+    return index
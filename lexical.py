@@ -0,0 +1,202 @@
+"""
+lexical.py
+
+Index lexical BM25 des chunks, construit par embedding.py à côté de l'index
+FAISS (dossier `lexical/`) et adressé par les mêmes positions.
+
+Chaque vecteur est indexé avec son texte, le titre, le lieu et l'adresse de
+ses événements (membres dédoublonnés compris, cf. dedup.py). Les termes sont
+passés en minuscules sans accents ; les mots vides et les mots de période
+(« ce », « week-end », « demain »... gérés par date_filter.py) sont ignorés.
+
+Format, en tableaux projetés en mémoire comme metadata_store.py :
+- `terms.bin` + `terms.npy` : vocabulaire trié (recherche dichotomique)
+- `postings.npy` : début des listes de chaque terme (V + 1 entrées)
+- `docs.npy` / `tf.npy` : positions et fréquences des listes concaténées
+- `lengths.npy` : longueur (en termes) de chaque document
+- `lexical.json` : nombre de documents, longueur moyenne, k1, b
+
+Une requête courte dont tous les termes sont trouvés ensemble, dont un
+terme au moins est discriminant (« musée zadkine », une adresse), peut être
+servie par BM25 seul : c'est le chemin rapide de `retrieval.search_events_hybrid`,
+sans appel à `mistral-embed`.
+"""
+
+import bisect
+import json
+import math
+import os
+import re
+import shutil
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from metadata_store import StringColumn, replace_directory, write_strings
+
+LEXICAL_DIR = "lexical"
+K1 = 1.2
+B = 0.75
+INDEXED_FIELDS = ("title", "location_name", "location_address")
+# Chemin rapide : requête de mots-clés (peu de termes), dont un terme rare
+MAX_KEYWORD_TERMS = 4
+MIN_IDF = 2.0
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du en et est il je la le les l leur
+mais me mon ne nous on ou par pas pour qu que qui sa se ses son sur ta te tu un une
+vos votre vous y quel quels quelle quelles quoi comment
+aujourd hui demain soir soiree matin week end weekend semaine mois prochain prochaine
+""".split())
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Termes d'un texte : minuscules sans accents, sans mots vides."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN.findall(text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def document_text(doc):
+    """Texte indexé d'un vecteur : chunk + titres, lieux et adresses (distincts) de ses événements."""
+    entries = [doc.metadata] + list(doc.metadata.get("members", ()))
+    values = dict.fromkeys(
+        entry.get(field, "") for field in INDEXED_FIELDS for entry in entries
+    )
+    return " ".join([doc.page_content, *filter(None, values)])
+
+
+class LexicalIndex:
+    """
+    Index inversé BM25 en lecture seule.
+
+    Attributs :
+        n_docs (int) : nombre de documents (positions FAISS)
+        avgdl (float) : longueur moyenne des documents
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "lexical.json"), encoding="utf-8") as f:
+            info = json.load(f)
+        self.n_docs = info["n_docs"]
+        self.avgdl = info["avgdl"]
+        self.k1 = info["k1"]
+        self.b = info["b"]
+        self.terms = StringColumn(os.path.join(path, "terms"))
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode="r")
+        self.tf = np.load(os.path.join(path, "tf.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode="r")
+
+    @staticmethod
+    def write(path, texts, k1=K1, b=B):
+        """
+        Construit et écrit l'index (remplace l'existant).
+
+        Args:
+            path (str): dossier de l'index lexical
+            texts (Iterable[str]): texte indexé de chaque position FAISS, dans l'ordre
+        """
+        postings = {}
+        lengths = []
+        for position, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).append((position, count))
+
+        vocabulary = sorted(postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in vocabulary], out=offsets[1:])
+        docs = np.fromiter((p for term in vocabulary for p, _ in postings[term]),
+                           dtype=np.int32, count=int(offsets[-1]))
+        tf = np.fromiter((c for term in vocabulary for _, c in postings[term]),
+                         dtype=np.float32, count=int(offsets[-1]))
+
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        write_strings(os.path.join(tmp, "terms"), vocabulary)
+        np.save(os.path.join(tmp, "postings.npy"), offsets)
+        np.save(os.path.join(tmp, "docs.npy"), docs)
+        np.save(os.path.join(tmp, "tf.npy"), tf)
+        np.save(os.path.join(tmp, "lengths.npy"), np.asarray(lengths, dtype=np.float32))
+        with open(os.path.join(tmp, "lexical.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_docs": len(lengths), "avgdl": float(np.mean(lengths)) if lengths else 0.0,
+                       "k1": k1, "b": b, "terms": len(vocabulary)}, f)
+        replace_directory(tmp, path)
+
+    @classmethod
+    def write_vectorstore(cls, path, vectorstore):
+        """Construit et écrit l'index des documents d'un vectorstore FAISS LangChain."""
+        cls.write(path, (
+            document_text(vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]))
+            for position in range(len(vectorstore.index_to_docstore_id))
+        ))
+
+    def _lookup(self, term):
+        i = bisect.bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return int(self.postings[i]), int(self.postings[i + 1])
+        return None
+
+    def idf(self, df):
+        return math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=20, ids=None):
+        """
+        Les k documents les mieux classés par BM25.
+
+        Args:
+            query (str): requête
+            k (int): nombre de résultats
+            ids (np.ndarray[int64]): positions autorisées (None = toutes)
+
+        Returns:
+            dict: `positions` et `scores` (du meilleur au moins bon), `coverage`
+                (nombre de termes de la requête présents dans chaque résultat),
+                `terms` (termes distincts de la requête), `found` (termes
+                présents dans l'index) et `max_idf`
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        coverage = np.zeros(self.n_docs, dtype=np.int32)
+        found, max_idf = 0, 0.0
+        for term in terms:
+            span = self._lookup(term)
+            if span is None:
+                continue
+            docs = np.asarray(self.docs[span[0]:span[1]])
+            tf = np.asarray(self.tf[span[0]:span[1]])
+            idf = self.idf(len(docs))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / max(self.avgdl, 1e-9))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+            coverage[docs] += 1
+            found += 1
+            max_idf = max(max_idf, idf)
+
+        if ids is not None:
+            allowed = np.zeros(self.n_docs, dtype=bool)
+            allowed[ids] = True
+            scores[~allowed] = 0
+        candidates = np.flatnonzero(scores > 0)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return {"positions": top, "scores": scores[top], "coverage": coverage[top],
+                "terms": len(terms), "found": found, "max_idf": max_idf}
+
+    def confident(self, hits, max_terms=MAX_KEYWORD_TERMS, min_idf=MIN_IDF):
+        """
+        Vrai si les résultats BM25 suffisent : requête de mots-clés (au plus
+        `max_terms` termes, tous présents dans l'index), meilleur résultat
+        contenant tous les termes, et au moins un terme discriminant.
+        """
+        return (
+            0 < hits["terms"] <= max_terms
+            and hits["found"] == hits["terms"]
+            and len(hits["positions"]) > 0
+            and hits["coverage"][0] == hits["terms"]
+            and hits["max_idf"] >= min_idf
+        )
@@ -5,71 +5,100 @@ Script de prétraitement des événements publics parisiens issus de la platefor
 
 Fonctionnalités :
 - Récupération des données en CSV via l'API publique OpenAgenda
-- Normalisation des champs texte (suppression HTML, minuscule, nettoyage)
+- Normalisation des champs texte (suppression HTML, minuscule, nettoyage,
+  cf. normalisation.py)
 - Filtrage automatique :
     * Ville = Paris
     * Date de début ≥ il y a 12 mois (filtré côté API)
 - Nettoyage :
     * Suppression des colonnes et lignes vides
     * Suppression des doublons stricts
-- Export CSV final : `evenements_paris.csv`
-"""
+- Export final : fichier Parquet typé `evenements_paris.parquet` (cf. dataset.py),
+  CSV en option (`--csv-export`)
 
-import requests
-import re
-import pandas as pd
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta, timezone
-from io import StringIO
+Mode `--stream` : l'export est lu au fil du téléchargement et traité par
+paquets de lignes (normalisation + dédoublonnage), puis ajouté au fichier de
+sortie ; la mémoire ne dépend pas de la taille de l'export, hormis 8 octets
+par ligne distincte pour le dédoublonnage entre paquets.
 
-def normalize_text(text):
-    """
-    Nettoie un champ texte brut.
+Mode `--sync` : synchronisation incrémentale. Seuls les événements modifiés
+depuis la dernière synchronisation (`updatedat`) sont téléchargés puis
+fusionnés par `Identifiant` dans le fichier existant ; les événements de plus
+d'un an sont retirés. L'état (date de dernière synchronisation, empreinte
+de chaque événement) est conservé dans `sync_state.json` et les changements
+(ajoutés / modifiés / supprimés) sont écrits dans `changes.json`, que
+`embedding.py --changes` sait consommer.
 
-    - Supprime les balises HTML
-    - Convertit le texte en minuscules
-    - Conserve les URL intactes
-    - Supprime les caractères parasites
+Validation : chaque paquet écrit passe dans un `validation.Validator`
+(schéma déclaré : types, identifiant et description renseignés, ordre des
+dates, identifiants uniques, Paris, début récent). Le rapport par règle est
+écrit dans `validation_report.json` ; `--strict` fait échouer le script si
+une règle est violée.
+"""
 
-    Args:
-        text (str or None): Texte d'entrée (souvent issu d'un champ CSV)
+import argparse
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import numpy as np
+import pandas as pd
+import requests
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import StringIO
 
-    Returns:
-        str or None: Texte nettoyé
-    """
-    if pd.isna(text):
-        return text
+from dataset import (
+    DATASET_PATH, ID_COLUMN, export_csv, is_parquet, read_events, write_events, write_events_chunks,
+)
+from normalisation import normalize_dataframe
+from validation import BEGIN_COLUMN, RETENTION, SeenHashes, Validator
 
-    if re.match(r'^https?://', str(text).strip()):
-        return text  # On ne touche pas aux liens
+URL = "https://public.opendatasoft.com/api/explore/v2.1/catalog/datasets/evenements-publics-openagenda/exports/csv"
+OUTPUT_PATH = DATASET_PATH
+SYNC_STATE_PATH = "sync_state.json"
+CHANGES_PATH = "changes.json"
+VALIDATION_REPORT_PATH = "validation_report.json"
 
-    text = BeautifulSoup(str(text), "html.parser").get_text(separator=" ", strip=True)
-    return text.lower()
 
-# -------- RÉCUPÉRATION DES DONNÉES --------
+def _api_timestamp(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-one_year_ago = (datetime.now(timezone.utc) - timedelta(days=365)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-url = "https://public.opendatasoft.com/api/explore/v2.1/catalog/datasets/evenements-publics-openagenda/exports/csv"
+def build_params(now=None, updated_since=None):
+    """
+    Paramètres de l'export : événements parisiens des 12 derniers mois.
 
-params = {
-    'where': f"location_city = 'Paris' AND firstdate_begin >= '{one_year_ago}'",
-    'lang': 'fr',
-    'use_labels': 'true',
-    'delimiter': ';'
-}
+    Args:
+        now (datetime): instant de référence (maintenant par défaut)
+        updated_since (datetime): ne garder que les événements modifiés depuis cette date
+    """
+    now = now or datetime.now(timezone.utc)
+    where = f"location_city = 'Paris' AND firstdate_begin >= '{_api_timestamp(now - RETENTION)}'"
+    if updated_since is not None:
+        where += f" AND updatedat >= '{_api_timestamp(updated_since)}'"
+    return {
+        'where': where,
+        'lang': 'fr',
+        'use_labels': 'true',
+        'delimiter': ';'
+    }
 
-response = requests.get(url, params=params)
 
-# -------- TRAITEMENT DES DONNÉES --------
+def clean_dataframe(df, executor=None):
+    """
+    Nettoyage complet d'un export chargé en mémoire.
 
-if response.status_code == 200:
-    df = pd.read_csv(StringIO(response.text), sep=';')
-    print(f"📥 {len(df)} événements chargés avant nettoyage.")
+    Args:
+        df (pd.DataFrame): export brut
+        executor (concurrent.futures.Executor): pool de processus pour la normalisation
 
-    # Normalisation des textes (HTML, capitales, espaces)
-    for col in df.select_dtypes(include=['object', 'string']):
-        df[col] = df[col].map(normalize_text)
+    Returns:
+        pd.DataFrame: événements normalisés, sans colonnes/lignes vides ni doublons
+    """
+    normalize_dataframe(df, executor=executor)
 
     # Suppression des colonnes entièrement vides
     df.dropna(axis=1, how='all', inplace=True)
@@ -82,11 +111,357 @@ if response.status_code == 200:
     df.drop_duplicates(inplace=True)
     after_dedup = len(df)
     print(f"🗑️ {before_dedup - after_dedup} doublon(s) supprimé(s).")
+    return df
+
+
+def fetch_and_clean(url, params, output, executor=None, validator=None):
+    """
+    Mode historique : export entier en mémoire, puis nettoyage, validation
+    (si `validator` est fourni) et écriture.
+    """
+    response = requests.get(url, params=params)
+
+    if response.status_code != 200:
+        print(f"❌ Erreur API : {response.status_code}")
+        print(response.text)
+        return None
+
+    df = pd.read_csv(StringIO(response.text), sep=';', dtype=str)
+    print(f"📥 {len(df)} événements chargés avant nettoyage.")
+
+    clean_dataframe(df, executor=executor)
+    if validator is not None:
+        validator.feed(df)
 
     # Sauvegarde finale
-    df.to_csv('evenements_paris.csv', sep=';', index=False)
-    print(f"✅ Fichier nettoyé enregistré : evenements_paris.csv")
+    write_events(df, output)
+    print(f"✅ Fichier nettoyé enregistré : {output}")
+    return df
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Flux binaire alimenté par un thread qui télécharge en avance.
+
+    Le téléchargement (thread) et le parsing CSV (thread principal) se
+    recouvrent ; la file bornée limite la mémoire à `max_blocks` blocs.
+    """
+
+    def __init__(self, blocks, max_blocks=16):
+        self._queue = queue.Queue(maxsize=max_blocks)
+        self._buffer = b""
+        self._done = False
+        self.error = None
+        self._thread = threading.Thread(target=self._fill, args=(blocks,), daemon=True)
+        self._thread.start()
+
+    def _fill(self, blocks):
+        try:
+            for block in blocks:
+                if block:
+                    self._queue.put(block)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer and not self._done:
+            block = self._queue.get()
+            if block is None:
+                self._done = True
+                if self.error is not None:
+                    raise self.error
+            else:
+                self._buffer = block
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def stream_and_clean(url, params, output, chunksize=10000, block_size=1 << 16, session=None,
+                     executor=None, validator=None):
+    """
+    Mode streaming : parsing par paquets de lignes au fil du téléchargement.
+
+    Chaque paquet est normalisé, débarrassé des lignes vides et des doublons
+    (y compris ceux déjà vus dans les paquets précédents, via un hash de
+    ligne sur 8 octets), puis ajouté au fichier de sortie. La mémoire des
+    paquets est constante ; seuls les hashes des lignes écrites sont gardés
+    (8 octets par ligne distincte, en tableaux triés fusionnés par taille,
+    cf. `validation.SeenHashes`). Les colonnes
+    entièrement vides sont retirées à la fin par une seconde passe, elle
+    aussi par paquets. Toutes les colonnes sont lues en texte, pour que le
+    typage ne dépende pas du paquet. Si `validator` est fourni, chaque
+    paquet nettoyé y est validé avant d'être écrit.
+
+    Args:
+        url (str): URL de l'export CSV
+        params (dict): paramètres de la requête
+        output (str): fichier de sortie (.parquet typé, ou .csv)
+        chunksize (int): nombre de lignes par paquet
+        block_size (int): taille des blocs HTTP lus
+        session (requests.Session): session HTTP à réutiliser
+        executor (concurrent.futures.Executor): pool de processus pour la normalisation
+        validator (validation.Validator): validation au fil des paquets
+
+    Returns:
+        Dict[str, int] or None: compteurs (lignes lues, écrites, doublons), None si erreur API
+    """
+    http = session or requests
+    tmp_output = output + ".part"
+    stats = {"rows_read": 0, "rows_written": 0, "duplicates": 0, "chunks": 0}
+    seen = SeenHashes()
+    nonempty = None
+
+    with http.get(url, params=params, stream=True) as response:
+        if response.status_code != 200:
+            print(f"❌ Erreur API : {response.status_code}")
+            print(response.text)
+            return None
+
+        reader = io.BufferedReader(PrefetchReader(response.iter_content(block_size)))
+        chunks = pd.read_csv(reader, sep=';', chunksize=chunksize, dtype=str, encoding='utf-8')
+        for chunk in chunks:
+            stats["chunks"] += 1
+            stats["rows_read"] += len(chunk)
+            normalize_dataframe(chunk, executor=executor)
+            chunk.dropna(axis=0, how='all', inplace=True)
+
+            before = len(chunk)
+            chunk = chunk.drop_duplicates()
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            fresh = ~seen.contains(hashes)
+            chunk = chunk[fresh]
+            seen.add(hashes[fresh])
+            stats["duplicates"] += before - len(chunk)
+            if validator is not None:
+                validator.feed(chunk)
+
+            nonempty = chunk.notna().any() if nonempty is None else nonempty | chunk.notna().any()
+            chunk.to_csv(tmp_output, sep=';', index=False, mode='w' if stats["chunks"] == 1 else 'a',
+                         header=stats["chunks"] == 1)
+            stats["rows_written"] += len(chunk)
+            print(f"📦 Paquet {stats['chunks']} : {stats['rows_read']} lignes lues")
+
+    if nonempty is None:
+        print("⚠️ Export vide.")
+        return stats
+
+    # Suppression des colonnes entièrement vides et écriture du fichier
+    # final (seconde passe, par paquets)
+    kept = [col for col, filled in nonempty.items() if filled] or list(nonempty.index)
+    if len(kept) == len(nonempty) and not is_parquet(output):
+        os.replace(tmp_output, output)
+    else:
+        chunks = pd.read_csv(tmp_output, sep=';', dtype=str, usecols=kept, chunksize=chunksize)
+        write_events_chunks((chunk[kept] for chunk in chunks), output)
+        os.remove(tmp_output)
+
+    print(f"🗑️ {stats['duplicates']} doublon(s) supprimé(s).")
+    print(f"✅ Fichier nettoyé enregistré : {output} ({stats['rows_written']} événements)")
+    return stats
+
+
+def row_hashes(df):
+    """
+    Empreinte de chaque ligne, indépendante de l'ordre et de la présence des
+    colonnes vides (seules les paires colonne/valeur renseignées comptent).
+
+    Returns:
+        List[str]: empreintes hexadécimales, dans l'ordre des lignes
+    """
+    columns = list(df.columns)
+    hashes = []
+    for values in df.itertuples(index=False, name=None):
+        filled = sorted((col, str(val)) for col, val in zip(columns, values) if pd.notna(val))
+        payload = json.dumps(filled, ensure_ascii=False)
+        hashes.append(hashlib.sha1(payload.encode("utf-8")).hexdigest())
+    return hashes
+
+
+def load_sync_state(path):
+    """État de la dernière synchronisation, ou None s'il n'y en a pas encore."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, payload):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def aged_out(df, now):
+    """Masque des événements dont la date de début a plus d'un an."""
+    if BEGIN_COLUMN not in df.columns:
+        return pd.Series(False, index=df.index)
+    return (df[BEGIN_COLUMN] < pd.Timestamp(now - RETENTION)).fillna(False).astype(bool)
+
+
+def sync_events(url, output, state_path=SYNC_STATE_PATH, changes_path=CHANGES_PATH,
+                chunksize=10000, now=None, executor=None, validator=None):
+    """
+    Synchronisation incrémentale du fichier des événements.
+
+    Sans état précédent (ou sans fichier), l'export complet est téléchargé.
+    Sinon, seuls les événements modifiés depuis la dernière synchronisation
+    sont téléchargés (en flux, cf. `stream_and_clean`) puis fusionnés par
+    `Identifiant` : un événement dont l'empreinte n'a pas changé est ignoré.
+    Les événements de plus d'un an sont retirés du fichier et de l'état.
+
+    La date enregistrée est celle du début de la requête : une modification
+    faite pendant le téléchargement sera revue à la synchronisation suivante.
+
+    Le fichier fusionné (et non le seul delta) est validé par paquets de
+    `chunksize` lignes si `validator` est fourni : un doublon d'identifiant
+    entre le delta et le fichier existant est ainsi signalé.
+
+    Args:
+        url (str): URL de l'export CSV
+        output (str): fichier des événements (.parquet ou .csv), mis à jour sur place
+        state_path (str): fichier d'état de la synchronisation
+        changes_path (str): fichier des changements produit
+        chunksize (int): lignes par paquet lors du téléchargement
+        now (datetime): instant de la synchronisation (maintenant par défaut)
+        executor (concurrent.futures.Executor): pool de processus pour la normalisation
+        validator (validation.Validator): validation du fichier fusionné
+
+    Returns:
+        dict or None: changements {"added", "updated", "removed"} (identifiants), None si erreur API
+    """
+    now = now or datetime.now(timezone.utc)
+    state = load_sync_state(state_path)
+    full = state is None or not os.path.exists(output)
+    updated_since = None if full else datetime.fromisoformat(state["last_sync"])
+    previous_ids = set() if full else set(state["hashes"])
+    hashes = {} if full else dict(state["hashes"])
+
+    delta_path = output + ".delta.csv"
+    stats = stream_and_clean(url, build_params(now, updated_since), delta_path, chunksize=chunksize,
+                             executor=executor)
+    if stats is None:
+        return None
+    delta = (read_events(delta_path)
+             if os.path.exists(delta_path) else pd.DataFrame({ID_COLUMN: pd.Series(dtype="string")}))
+    if os.path.exists(delta_path):
+        os.remove(delta_path)
+
+    missing_id = delta[ID_COLUMN].isna()
+    if missing_id.any():
+        print(f"⚠️ {int(missing_id.sum())} événement(s) sans identifiant ignoré(s).")
+    # Pour un même identifiant, la dernière version reçue l'emporte
+    delta = delta[~missing_id].drop_duplicates(subset=ID_COLUMN, keep="last")
+
+    delta_hashes = row_hashes(delta)
+    added, updated, changed = [], [], []
+    for identifiant, row_hash in zip(delta[ID_COLUMN], delta_hashes):
+        previous = hashes.get(identifiant)
+        if previous == row_hash:
+            changed.append(False)
+            continue
+        (added if previous is None else updated).append(identifiant)
+        hashes[identifiant] = row_hash
+        changed.append(True)
+    delta = delta[np.array(changed, dtype=bool)]
+
+    if full:
+        df = delta
+    else:
+        df = read_events(output)
+        df = pd.concat([df[~df[ID_COLUMN].isin(set(delta[ID_COLUMN]))], delta], ignore_index=True)
+
+    # Retrait des événements trop anciens
+    old = aged_out(df, now)
+    old_ids = set(df.loc[old, ID_COLUMN])
+    df = df[~old]
+    for identifiant in old_ids:
+        hashes.pop(identifiant, None)
+    removed = sorted(old_ids & previous_ids)
+    added = [i for i in added if i not in old_ids]
+    updated = [i for i in updated if i not in old_ids]
+
+    df = df.dropna(axis=1, how='all')
+    if validator is not None:
+        for start in range(0, len(df), chunksize):
+            validator.feed(df.iloc[start:start + chunksize])
+    write_events(df, output)
+
+    changes = {
+        "since": None if full else state["last_sync"],
+        "until": now.isoformat(),
+        "full": full,
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+    }
+    _write_json(changes_path, changes)
+    _write_json(state_path, {"last_sync": now.isoformat(), "hashes": hashes})
+
+    mode = "complète" if full else f"depuis {state['last_sync']}"
+    print(f"🔄 Synchronisation {mode} : {stats['rows_read']} ligne(s) reçue(s)")
+    print(f"➕ {len(added)} ajouté(s) | ✏️ {len(updated)} modifié(s) | 🗑️ {len(removed)} supprimé(s)")
+    print(f"✅ {len(df)} événements dans {output}, changements dans {changes_path}")
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Récupération et nettoyage des événements OpenAgenda")
+    parser.add_argument("--output", default=OUTPUT_PATH,
+                        help="fichier de sortie (.parquet typé, ou .csv)")
+    parser.add_argument("--csv-export", default=None, help="export CSV supplémentaire")
+    parser.add_argument("--url", default=URL, help="URL de l'export CSV")
+    parser.add_argument("--stream", action="store_true",
+                        help="lecture en flux, par paquets de lignes (mémoire bornée)")
+    parser.add_argument("--chunksize", type=int, default=10000,
+                        help="lignes par paquet (--stream, --sync)")
+    parser.add_argument("--sync", action="store_true",
+                        help="synchronisation incrémentale (événements modifiés depuis la dernière fois)")
+    parser.add_argument("--state", default=SYNC_STATE_PATH, help="fichier d'état (--sync)")
+    parser.add_argument("--changes", default=CHANGES_PATH, help="fichier des changements (--sync)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="processus de normalisation (colonnes volumineuses)")
+    parser.add_argument("--validation-report", default=VALIDATION_REPORT_PATH,
+                        help="rapport de validation par règle (JSON)")
+    parser.add_argument("--strict", action="store_true",
+                        help="échoue si une règle de validation est violée")
+    args = parser.parse_args(argv)
+
+    # -------- RÉCUPÉRATION + TRAITEMENT DES DONNÉES --------
+
+    params = build_params()
+    validator = Validator()
+    executor = ProcessPoolExecutor(args.processes) if args.processes > 1 else None
+    try:
+        if args.sync:
+            sync_events(args.url, args.output, state_path=args.state, changes_path=args.changes,
+                        chunksize=args.chunksize, executor=executor, validator=validator)
+        elif args.stream:
+            stream_and_clean(args.url, params, args.output, chunksize=args.chunksize,
+                             executor=executor, validator=validator)
+        else:
+            fetch_and_clean(args.url, params, args.output, executor=executor, validator=validator)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if validator.rows:
+        validator.print_report()
+        validator.write_report(args.validation_report)
+        if args.strict and not validator.valid:
+            raise SystemExit(f"❌ Validation échouée, cf. {args.validation_report}")
+
+    if args.csv_export and os.path.exists(args.output):
+        export_csv(args.output, args.csv_export)
+        print(f"📄 Export CSV : {args.csv_export}")
+
 
-else:
-    print(f"❌ Erreur API : {response.status_code}")
-    print(response.text)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+metadata_store.py
+
+Stockage des textes et métadonnées des chunks indexés, en tableaux projetés
+en mémoire (mmap) au lieu d'un `InMemoryDocstore` LangChain picklé.
+
+Format (dossier `metadata/` dans le dossier de l'index) :
+- `texts.bin` + `texts.npy` : textes des vecteurs concaténés (UTF-8) et
+  leurs positions de début (n + 1 entrées), par position FAISS
+- `entries.npy` : pour chaque position FAISS, la plage de ses entrées ;
+  une entrée par chunk porté par le vecteur (le représentant, puis ses
+  membres dédoublonnés, cf. dedup.py)
+- `<champ>.codes.npy` : code de la valeur de chaque entrée (-1 = absente),
+  `<champ>.bin` + `<champ>.npy` : dictionnaire des valeurs distinctes ;
+  lieux, adresses, dates et titres, très répétés, ne sont stockés qu'une fois
+- `store.json` : champs et tailles
+
+Rien n'est désérialisé au chargement : une recherche ne lit que les
+quelques entrées qu'elle renvoie (`search`), et les pages lues sont
+partagées entre processus.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+STORE_DIR = "metadata"
+CHUNK_ID = "chunk_id"
+
+
+def write_strings(path, values):
+    """Écrit des chaînes : blob UTF-8 `<path>.bin` et positions `<path>.npy`."""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(f"{path}.bin", "wb") as f:
+        for b in encoded:
+            f.write(b)
+    np.save(f"{path}.npy", offsets)
+
+
+def replace_directory(tmp, path):
+    """Remplace le dossier `path` par `tmp` : un lecteur voit l'ancien contenu ou le nouveau."""
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class StringColumn:
+    """Chaînes relues à la demande depuis un blob projeté en mémoire."""
+
+    def __init__(self, path):
+        self.offsets = np.load(f"{path}.npy", mmap_mode="r")
+        size = os.path.getsize(f"{path}.bin")
+        # np.memmap refuse les fichiers vides
+        self.blob = np.memmap(f"{path}.bin", dtype=np.uint8, mode="r") if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.blob[start:stop]).decode("utf-8")
+
+
+class PositionIds:
+    """
+    Table position FAISS -> identifiant du docstore, sans matérialisation :
+    l'identifiant est la position elle-même (cf. `MetadataStore.search`).
+    """
+
+    def __init__(self, n):
+        self.n = n
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.n:
+            raise KeyError(position)
+        return position
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return iter(range(self.n))
+
+    def __contains__(self, position):
+        return isinstance(position, (int, np.integer)) and 0 <= position < self.n
+
+    def keys(self):
+        return range(self.n)
+
+    def values(self):
+        return range(self.n)
+
+    def items(self):
+        return ((i, i) for i in range(self.n))
+
+
+class MetadataStore(Docstore):
+    """
+    Docstore en lecture seule adressé par position FAISS.
+
+    Attributs :
+        path (str) : dossier du store
+        fields (List[str]) : champs de métadonnées stockés
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "store.json"), encoding="utf-8") as f:
+            self.fields = json.load(f)["fields"]
+        self.texts = StringColumn(os.path.join(path, "texts"))
+        self.entries = np.load(os.path.join(path, "entries.npy"), mmap_mode="r")
+        self.codes = {
+            field: np.load(os.path.join(path, f"{field}.codes.npy"), mmap_mode="r")
+            for field in self.fields
+        }
+        self.values = {field: StringColumn(os.path.join(path, field)) for field in self.fields}
+        self.index_to_docstore_id = PositionIds(len(self.texts))
+
+    def __len__(self):
+        return len(self.texts)
+
+    @staticmethod
+    def write(path, vectorstore):
+        """
+        Écrit le store d'un vectorstore FAISS LangChain (remplace l'existant).
+
+        Args:
+            path (str): dossier du store
+            vectorstore (FAISS): vectorstore dont le docstore est en mémoire
+        """
+        texts, entries, rows = [], [0], []
+        for position in range(len(vectorstore.index_to_docstore_id)):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(doc_id)
+            texts.append(doc.page_content)
+            own = {k: v for k, v in doc.metadata.items() if k != "members"}
+            rows.append({**own, CHUNK_ID: doc_id})
+            rows.extend(doc.metadata.get("members", ()))
+            entries.append(len(rows))
+
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        write_strings(os.path.join(tmp, "texts"), texts)
+        np.save(os.path.join(tmp, "entries.npy"), np.asarray(entries, dtype=np.int64))
+        for field in fields:
+            dictionary = {}
+            codes = np.fromiter(
+                (dictionary.setdefault(str(row[field]), len(dictionary)) if field in row else -1
+                 for row in rows),
+                dtype=np.int32, count=len(rows),
+            )
+            np.save(os.path.join(tmp, f"{field}.codes.npy"), codes)
+            write_strings(os.path.join(tmp, field), list(dictionary))
+        with open(os.path.join(tmp, "store.json"), "w", encoding="utf-8") as f:
+            json.dump({"fields": fields, "vectors": len(texts), "entries": len(rows)}, f)
+        replace_directory(tmp, path)
+
+    def _entry(self, row):
+        metadata = {}
+        for field in self.fields:
+            code = int(self.codes[field][row])
+            if code >= 0:
+                metadata[field] = self.values[field][code]
+        return metadata
+
+    def search(self, position):
+        """
+        Document d'une position FAISS : texte et métadonnées du représentant,
+        membres dédoublonnés éventuels dans `members`.
+        """
+        start, stop = int(self.entries[position]), int(self.entries[position + 1])
+        metadata = self._entry(start)
+        metadata.pop(CHUNK_ID, None)
+        if stop - start > 1:
+            metadata["members"] = [self._entry(row) for row in range(start + 1, stop)]
+        return Document(page_content=self.texts[position], metadata=metadata)
+
+    def chunk_id(self, position):
+        return self.values[CHUNK_ID][int(self.codes[CHUNK_ID][int(self.entries[position])])]
+
+    def to_docstore(self):
+        """
+        Docstore LangChain modifiable (mise à jour incrémentale de l'index).
+
+        Returns:
+            Tuple[InMemoryDocstore, Dict[int, str]]: docstore et table position -> identifiant
+        """
+        index_to_docstore_id = {position: self.chunk_id(position) for position in range(len(self))}
+        docstore = InMemoryDocstore({
+            doc_id: self.search(position) for position, doc_id in index_to_docstore_id.items()
+        })
+        return docstore, index_to_docstore_id
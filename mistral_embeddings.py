@@ -0,0 +1,96 @@
+"""
+mistral_embeddings.py
+
+Embeddings Mistral (`mistral-embed`) pour LangChain, partagés par
+l'indexation (embedding.py), l'interface (app.py), l'évaluation et les
+benchmarks.
+
+Module léger : le chemin des requêtes l'importe sans charger pandas, spaCy
+ni le reste de la chaîne d'indexation.
+"""
+
+import os
+
+from langchain_core.embeddings import Embeddings
+from mistralai.client import MistralClient
+
+from embedding_engine import EmbeddingEngine
+
+EMBED_MODEL = "mistral-embed"
+
+
+def mistral_client(api_key, **options):
+    """
+    Client Mistral ; MISTRAL_ENDPOINT permet de viser un serveur local (cf. fake_mistral.py).
+
+    Args:
+        api_key (str): clé API
+        **options: options de `MistralClient` (max_retries, timeout...)
+    """
+    endpoint = os.getenv("MISTRAL_ENDPOINT")
+    if endpoint:
+        options.setdefault("endpoint", endpoint)
+    return MistralClient(api_key=api_key, **options)
+
+
+class CustomMistralEmbeddings(Embeddings):
+    """
+    Wrapper pour utiliser les embeddings Mistral avec LangChain.
+
+    Les lots sont envoyés en parallèle par un `EmbeddingEngine` (débit
+    limité, adaptatif aux 429) ; un lot en échec lève une exception au lieu
+    de désaligner silencieusement vecteurs et documents.
+
+    Attributs :
+        client (Mistral) : instance client Mistral
+        engine (EmbeddingEngine) : moteur d'envoi des lots
+    """
+
+    def __init__(self, client, batch_size=200, max_tokens_per_batch=8000, max_in_flight=4,
+                 requests_per_second=5.0, max_retries=5):
+        self.client = client
+        self.engine = EmbeddingEngine(
+            self._embed_batch,
+            max_in_flight=max_in_flight,
+            max_tokens_per_batch=max_tokens_per_batch,
+            max_items_per_batch=batch_size,
+            requests_per_second=requests_per_second,
+            max_retries=max_retries,
+        )
+
+    def embed_documents(self, texts):
+        """
+        Embedding de plusieurs documents en batchs.
+
+        Args:
+            texts (List[str]): textes à encoder
+
+        Returns:
+            List[List[float]]: vecteurs d'embedding
+
+        Raises:
+            EmbeddingError: si des lots restent en échec après les tentatives
+        """
+        if not texts:
+            return []
+        return self.engine.embed(texts)
+
+    def _embed_batch(self, texts):
+        """
+        Envoie un batch de textes à l'API Mistral (les erreurs remontent au moteur).
+
+        Args:
+            texts (List[str]): batch à encoder
+
+        Returns:
+            List[List[float]]: vecteurs encodés
+        """
+        response = self.client.embeddings(model=EMBED_MODEL, input=texts)
+        return [res.embedding for res in response.data]
+
+    def embed_query(self, text):
+        """
+        Embedding d'une requête unique : appel direct, sans passer par la file
+        du moteur (latence d'une question de l'utilisateur).
+        """
+        return self._embed_batch([text])[0]
@@ -0,0 +1,213 @@
+"""
+normalisation.py
+
+Normalisation des champs texte des événements (HTML -> texte brut en
+minuscules), à l'identique de l'ancienne fonction `normalize_text` de
+liste_event.py (`BeautifulSoup(..., "html.parser").get_text(" ", strip=True)`),
+mais sans construire un arbre BeautifulSoup par cellule :
+
+- chaîne sans `<` ni `&` : rien à analyser, simple `strip().lower()`
+- chaîne avec balises/entités courantes : parcours direct des évènements de
+  `html.parser` (même tokenisation, mêmes tables d'entités que bs4), en
+  reproduisant le découpage des chaînes de BeautifulSoup
+- cas rares (commentaires et déclarations `<!`, instructions `<?`, balises
+  dont bs4 exclut le texte : script, style, template, rt, rp...) : repli sur
+  BeautifulSoup
+
+Chaque valeur distincte d'une colonne n'est normalisée qu'une fois ; les
+colonnes volumineuses peuvent être réparties sur un pool de processus.
+"""
+
+import re
+from html.parser import HTMLParser
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser, HTMLParserTreeBuilder
+from bs4.dammit import EntitySubstitution
+
+URL_PATTERN = re.compile(r'^https?://')
+
+# Balises vides de bs4 : leur balise fermante éventuelle est ignorée
+VOID_TAGS = frozenset(HTMLParserTreeBuilder().empty_element_tags)
+
+# Constructions que le parseur rapide ne reproduit pas : repli sur bs4
+FALLBACK_PATTERN = re.compile(
+    r"<[!?]|<\s*/?\s*(script|style|template|textarea|title|rt|rp|plaintext|xmp)\b",
+    re.IGNORECASE,
+)
+
+# Taille des paquets de valeurs envoyés aux processus
+POOL_CHUNK = 2000
+
+
+def normalize_text_reference(text):
+    """
+    Normalisation de référence, via BeautifulSoup (lente).
+
+    Args:
+        text (str or None): Texte d'entrée (souvent issu d'un champ CSV)
+
+    Returns:
+        str or None: Texte nettoyé
+    """
+    if pd.isna(text):
+        return text
+
+    if URL_PATTERN.match(str(text).strip()):
+        return text  # On ne touche pas aux liens
+
+    text = BeautifulSoup(str(text), "html.parser").get_text(separator=" ", strip=True)
+    return text.lower()
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Extraction du texte d'un fragment HTML, chaîne par chaîne.
+
+    Une chaîne se termine à chaque balise ouvrante ou fermante, comme dans
+    l'arbre construit par BeautifulSoup ; les entités sont résolues avec les
+    fonctions de bs4.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings = []
+        self._current = []
+        self._closed_void = []
+
+    def _flush(self):
+        if self._current:
+            text = "".join(self._current).strip()
+            if text:
+                self.strings.append(text)
+            self._current = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in VOID_TAGS:
+            self._closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void:
+            # Balise fermante redondante d'une balise vide : sans effet dans bs4
+            self._closed_void.remove(tag)
+        else:
+            self._flush()
+
+    def handle_data(self, data):
+        self._current.append(data)
+
+    def handle_charref(self, name):
+        dereferenced, _, extra_data = BeautifulSoupHTMLParser._dereference_numeric_character_reference(name)
+        self._current.append(dereferenced)
+        self._current.append(extra_data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._current.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._flush()
+
+    handle_decl = unknown_decl = handle_pi = handle_comment
+
+
+def html_to_text(markup):
+    """
+    Texte d'un fragment HTML, identique à
+    `BeautifulSoup(markup, "html.parser").get_text(separator=" ", strip=True)`.
+    """
+    if FALLBACK_PATTERN.search(markup):
+        return BeautifulSoup(markup, "html.parser").get_text(separator=" ", strip=True)
+    parser = _TextExtractor()
+    try:
+        parser.feed(markup)
+        parser.close()
+    except AssertionError:
+        return BeautifulSoup(markup, "html.parser").get_text(separator=" ", strip=True)
+    parser._flush()
+    return " ".join(parser.strings)
+
+
+def normalize_text(text):
+    """
+    Nettoie un champ texte brut.
+
+    - Supprime les balises HTML
+    - Convertit le texte en minuscules
+    - Conserve les URL intactes
+    - Supprime les caractères parasites
+
+    Résultat identique à `normalize_text_reference`.
+
+    Args:
+        text (str or None): Texte d'entrée (souvent issu d'un champ CSV)
+
+    Returns:
+        str or None: Texte nettoyé
+    """
+    if pd.isna(text):
+        return text
+
+    text_str = str(text)
+    stripped = text_str.strip()
+    if URL_PATTERN.match(stripped):
+        return text  # On ne touche pas aux liens
+
+    if "<" not in text_str and "&" not in text_str:
+        return stripped.lower()
+    return html_to_text(text_str).lower()
+
+
+def _normalize_many(values):
+    return [normalize_text(value) for value in values]
+
+
+def normalize_series(series, executor=None, min_parallel=20000):
+    """
+    Normalise une colonne, une seule fois par valeur distincte.
+
+    Args:
+        series (pd.Series): colonne texte
+        executor (concurrent.futures.Executor): pool de processus optionnel
+        min_parallel (int): nombre de valeurs distinctes à partir duquel le pool est utilisé
+
+    Returns:
+        pd.Series: colonne normalisée (valeurs manquantes inchangées)
+    """
+    codes, uniques = pd.factorize(series)
+    uniques = list(uniques)
+    if executor is not None and len(uniques) >= min_parallel:
+        parts = [uniques[i:i + POOL_CHUNK] for i in range(0, len(uniques), POOL_CHUNK)]
+        normalized = [value for part in executor.map(_normalize_many, parts) for value in part]
+    else:
+        normalized = _normalize_many(uniques)
+
+    values = series.to_numpy(dtype=object, copy=True)
+    present = codes >= 0
+    lookup = np.empty(len(normalized), dtype=object)
+    lookup[:] = normalized
+    values[present] = lookup[codes[present]]
+    return pd.Series(values, index=series.index, name=series.name, dtype=object)
+
+
+def normalize_dataframe(df, executor=None, min_parallel=20000):
+    """
+    Normalisation des textes (HTML, capitales, espaces) de toutes les colonnes texte.
+
+    Args:
+        df (pd.DataFrame): événements, modifiés sur place
+        executor (concurrent.futures.Executor): pool de processus optionnel
+        min_parallel (int): cf. `normalize_series`
+
+    Returns:
+        pd.DataFrame: le même DataFrame
+    """
+    for col in df.select_dtypes(include=['object', 'string']):
+        df[col] = normalize_series(df[col], executor=executor, min_parallel=min_parallel)
+    return df
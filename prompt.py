@@ -0,0 +1,100 @@
+"""
+prompt.py
+
+Prompt de l'assistant et mise en forme des événements retrouvés, partagés
+par l'interface Streamlit (app.py), l'API HTTP (api.py) et l'évaluation.
+
+- `format_doc` : événement tel que présenté au modèle dans le CONTEXTE
+- `enrich_with_metadata` : contexte à plat, pour les journaux et RAGAS
+- `build_prompt` : prompt final et contextes pour une liste de résultats
+"""
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+NO_CONTEXT = "Aucune information pertinente trouvée."
+
+SYSTEM_PROMPT = """Tu es un assistant culturel pour Paris.
+
+Ta mission est de recommander des événements aux utilisateurs en te basant uniquement sur le CONTEXTE fourni ci-dessous.
+
+Quand tu cites un événement, respecte **strictement** le format suivant (avec des sauts de ligne et le bon usage du Markdown) :
+
+📌 **{{title}}**  
+📍 _Lieu : {{lieu}}_  
+🏠 _Adresse : {{adresse}}_  
+🗓️ _{{date formatée}}_  
+📝 {{courte description}}
+
+**Règles à suivre :**
+- Un retour à la ligne après chaque ligne, puis une ligne vide entre chaque événement.
+- Le title est en gras `**`, les lieux et adresses en italique `_`.
+- Formate les dates comme ceci :  
+  • Pour une seule date : “le 4 mai 2025”  
+  • Pour une plage dans le même mois : “du 4 au 12 mai 2025”  
+  • Pour deux mois différents : “du 28 avril au 2 mai 2025”
+- N’ajoute aucun lien externe.
+- Ne mentionne que les événements présents dans le CONTEXTE.
+- Si possible répond avec au moins 2 événements pertinents.
+- Si la question est floue, demande des précisions à l'utilisateur.
+- Si la question est hors sujet, indique que tu ne réponds que sur les événements à Paris.
+- Termine chaque réponse par **“As-tu d’autres questions ?”**
+
+---
+
+CONTEXTE :  
+{context_str}
+
+---
+
+QUESTION :  
+{question}
+
+---
+
+RÉPONSE DE L’ASSISTANT :
+"""
+
+
+def format_doc(doc, score):
+    """Événement au format Markdown attendu dans la réponse (titre, lieu, adresse, dates, description)."""
+    title = doc.metadata.get("title", "Titre inconnu")
+    lieu = doc.metadata.get("location_name", "Lieu inconnu")
+    adresse = doc.metadata.get("location_address", "Adresse inconnue")
+    debut = doc.metadata.get("firstdate_begin", "?")
+    fin = doc.metadata.get("lastdate_end", "?")
+    description = doc.page_content.strip()
+
+    return (
+        f"📌 **{title}**  \n"
+        f"📍 _Lieu : {lieu}_  \n"
+        f"🏠 _Adresse : {adresse}_  \n"
+        f"🗓️ _du {debut} au {fin}_  \n"
+        f"📝 {description}"
+    )
+
+
+def enrich_with_metadata(doc):
+    """Événement sur une ligne « titre - lieu - adresse - dates - description » (journaux, RAGAS)."""
+    title = doc.metadata.get("title", "")
+    lieu = doc.metadata.get("location_name", "")
+    adresse = doc.metadata.get("location_address", "")
+    debut = doc.metadata.get("firstdate_begin", "")
+    fin = doc.metadata.get("lastdate_end", "")
+    description = doc.page_content.strip()
+    return f"{title} - {lieu} - {adresse} - du {debut} au {fin} - {description}"
+
+
+def build_prompt(question, results):
+    """
+    Prompt final pour une question et les événements retrouvés.
+
+    Args:
+        question (str): question de l'utilisateur
+        results (List[Tuple[Document, float]]): événements (cf. retrieval.search_events)
+
+    Returns:
+        Tuple[str, List[str]]: prompt (`NO_CONTEXT` sans résultat) et contextes
+            enrichis (un par événement)
+    """
+    context_str = CONTEXT_SEPARATOR.join(format_doc(doc, score) for doc, score in results) or NO_CONTEXT
+    contexts = [enrich_with_metadata(doc) for doc, score in results]
+    return SYSTEM_PROMPT.format(context_str=context_str, question=question), contexts
@@ -0,0 +1,190 @@
+"""
+query_cache.py
+
+Caches côté requête pour l'assistant :
+
+- `CachingQueryEmbeddings` : cache LRU/TTL des embeddings de requêtes, indexé
+  par le texte normalisé (« Expo photo » et « expo  photo ! » partagent
+  la même entrée) ; évite un aller-retour `mistral-embed` par question répétée
+- `SemanticAnswerCache` : réutilise une réponse déjà générée si la nouvelle
+  question est assez proche (similarité cosinus) d'une question en cache ET
+  que la recherche a renvoyé exactement les mêmes événements
+
+Les deux exposent `stats()` (hits, misses, taux de succès, taille). Ils sont
+liés à une version de l'index : app.py en recrée de nouveaux à chaque
+rechargement.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text):
+    """Forme canonique d'une requête : NFKC, minuscules, ponctuation et espaces réduits."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[^\w\s'’-]", " ", text)
+    return " ".join(text.split())
+
+
+class LRUCache:
+    """
+    Cache clé -> valeur borné en taille, avec expiration optionnelle.
+
+    Attributs :
+        maxsize (int) : nombre max d'entrées
+        ttl (float) : durée de vie d'une entrée en secondes (None = illimitée)
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def values(self):
+        with self._lock:
+            now = time.monotonic()
+            return [value for created, value in self._data.values()
+                    if self.ttl is None or now - created <= self.ttl]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._data),
+        }
+
+
+class CachingQueryEmbeddings(Embeddings):
+    """
+    Enveloppe un objet `Embeddings` : `embed_query` passe par un cache LRU/TTL.
+
+    `embed_documents` (indexation) n'est pas mis en cache ici.
+    """
+
+    def __init__(self, embeddings, maxsize=2048, ttl=24 * 3600):
+        self.embeddings = embeddings
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticAnswerCache:
+    """
+    Cache de réponses générées, interrogé par similarité de la requête.
+
+    Une réponse est réutilisée si la similarité cosinus entre les embeddings
+    des deux requêtes dépasse `threshold` et si les événements retrouvés
+    (leurs identifiants, dans l'ordre) sont les mêmes.
+
+    Attributs :
+        threshold (float) : similarité cosinus minimale
+        maxsize (int) : nombre max de réponses conservées
+        ttl (float) : durée de vie d'une réponse en secondes
+    """
+
+    def __init__(self, threshold=0.95, maxsize=512, ttl=6 * 3600):
+        self.threshold = threshold
+        self._entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_vector, event_ids):
+        """
+        Cherche une réponse réutilisable.
+
+        Args:
+            query_vector (List[float]): embedding de la nouvelle requête
+            event_ids (Sequence[str]): identifiants des événements retrouvés
+
+        Returns:
+            str or None: réponse en cache, ou None
+        """
+        event_ids = tuple(event_ids)
+        best, best_score = None, self.threshold
+        for entry in self._entries.values():
+            if entry["event_ids"] != event_ids:
+                continue
+            score = cosine_similarity(query_vector, entry["vector"])
+            if score >= best_score:
+                best, best_score = entry, score
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best["reply"]
+
+    def store(self, query, query_vector, event_ids, reply):
+        """Mémorise la réponse générée pour une requête."""
+        self._entries.put(normalize_query(query), {
+            "vector": list(query_vector),
+            "event_ids": tuple(event_ids),
+            "reply": reply,
+        })
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,386 @@
+"""
+retrieval.py
+
+Recherche vectorielle dans l'index FAISS des événements, avec pré-filtrage
+optionnel par période (cf. date_filter.py).
+
+Le pré-filtre est appliqué par FAISS lui-même (`IDSelectorBatch`) : seuls
+les vecteurs des événements retenus sont comparés à la requête, et les 4
+places de contexte ne sont plus perdues pour des événements expirés.
+
+Un événement étant découpé en plusieurs chunks, `search_events` ramène plus
+de candidats (`fetch_k`), les regroupe par événement, fusionne les chunks de
+chaque groupe et renvoie les k meilleurs événements distincts dans un budget
+de tokens.
+
+Avec un index compressé (cf. vector_storage.py), les candidats sont
+ramenés en surnombre puis re-classés sur les vecteurs float32 exacts.
+
+`search_events_hybrid` combine cette recherche avec l'index BM25 (cf.
+lexical.py) : fusion des deux classements par rang réciproque, ou BM25 seul
+pour une requête de mots-clés (pas d'appel d'embedding).
+
+Un vecteur partagé par des chunks dédoublonnés (cf. dedup.py) est déplié en
+un résultat par événement membre, chacun avec ses dates et son lieu.
+
+`EventIndex` regroupe les fichiers d'un index sauvegardé (FAISS, BM25,
+dates, vecteurs exacts) et la recherche d'une question ; un index partitionné
+par mois en réunit plusieurs (cf. shards.py).
+"""
+
+import os
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from date_filter import DATE_INDEX_FILE, DateIndex, overlaps, parse_date_window
+from dedup import expand_members
+from embedding_engine import estimate_tokens
+from index_types import search_parameters
+from lexical import LEXICAL_DIR, LexicalIndex
+from vector_storage import RESCORE_FACTOR, load_full_vectors, load_vectorstore, rescore
+
+RRF_K = 60
+
+
+def _span(trace, name, **attrs):
+    """Span de la trace (cf. tracing.py), ou contexte vide sans trace."""
+    return nullcontext() if trace is None else trace.span(name, **attrs)
+
+
+def _documents(vectorstore, distances, positions):
+    results = []
+    for distance, position in zip(distances, positions):
+        if position == -1:
+            continue
+        doc_id = vectorstore.index_to_docstore_id[int(position)]
+        results.append((vectorstore.docstore.search(doc_id), float(distance)))
+    return results
+
+
+def search_by_vector(vectorstore, query_vector, k=4, ids=None, full_vectors=None,
+                     rescore_factor=RESCORE_FACTOR):
+    """
+    Recherche les k chunks les plus proches, éventuellement parmi `ids` seulement.
+
+    Args:
+        vectorstore (FAISS): vectorstore LangChain chargé
+        query_vector (List[float]): embedding de la requête
+        k (int): nombre de résultats
+        ids (np.ndarray[int64]): positions FAISS autorisées (None = toutes)
+        full_vectors (np.ndarray): vecteurs float32 exacts (None = pas de re-classement)
+        rescore_factor (int): surnombre de candidats re-classés
+
+    Returns:
+        List[Tuple[Document, float]]: chunks et distances L2, du plus proche au plus loin
+    """
+    distances, positions = _search_positions(vectorstore, query_vector, k, ids, full_vectors,
+                                             rescore_factor)
+    return _documents(vectorstore, distances, positions)
+
+
+def _search_positions(vectorstore, query_vector, k, ids=None, full_vectors=None,
+                      rescore_factor=RESCORE_FACTOR):
+    """Distances et positions FAISS des k plus proches (cf. search_by_vector)."""
+    query = np.asarray([query_vector], dtype=np.float32)
+    fetch = k if full_vectors is None else k * rescore_factor
+    if ids is None:
+        distances, positions = vectorstore.index.search(query, fetch)
+    else:
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        params = search_parameters(vectorstore.index, faiss.IDSelectorBatch(ids))
+        distances, positions = vectorstore.index.search(query, min(fetch, len(ids)), params=params)
+    if full_vectors is not None:
+        return rescore(full_vectors, query[0], positions[0], k)
+    return distances[0], positions[0]
+
+
+def window_ids(date_index, window):
+    """
+    Positions FAISS des événements de la fenêtre demandée.
+
+    Si la fenêtre ne contient aucun événement (« demain » sans programme),
+    la recherche se replie sur les événements à venir à partir du début de
+    la fenêtre, jamais sur tout l'index : le contexte ne doit pas se remplir
+    d'événements passés. Sans événement à venir, aucune position n'est renvoyée.
+
+    Returns:
+        Tuple[np.ndarray[int64] or None, Tuple[int, int] or None]: positions
+            autorisées (None = pas de filtre) et fenêtre retenue
+    """
+    if date_index is None or window is None:
+        return None, window
+    ids = date_index.select(*window)
+    if len(ids) == 0 and window[1] is not None:
+        window = (window[0], None)
+        ids = date_index.select(*window)
+    return ids, window
+
+
+def search_in_window(vectorstore, query_vector, k=4, date_index=None, window=None,
+                     full_vectors=None):
+    """
+    Recherche restreinte aux événements qui chevauchent une fenêtre de dates.
+
+    Sans index de dates, la recherche porte sur tout l'index ; une fenêtre
+    vide se replie sur les événements à venir (cf. `window_ids`).
+
+    Args:
+        vectorstore (FAISS): vectorstore LangChain chargé
+        query_vector (List[float]): embedding de la requête
+        k (int): nombre de résultats
+        date_index (DateIndex): index des dates (None = pas de filtre)
+        window (Tuple[int, int]): (début, fin) en timestamps epoch
+        full_vectors (np.ndarray): vecteurs exacts pour le re-classement (cf. search_by_vector)
+
+    Returns:
+        Tuple[List[Tuple[Document, float]], Tuple[int, int]]: chunks et
+            distances L2, fenêtre retenue
+    """
+    ids, window = window_ids(date_index, window)
+    return search_by_vector(vectorstore, query_vector, k, ids=ids, full_vectors=full_vectors), window
+
+
+def expand_results(results, window=None):
+    """
+    Déplie les chunks dédoublonnés : un résultat par événement membre, à la
+    distance du vecteur partagé.
+
+    Avec une fenêtre de dates, seuls les membres qui la chevauchent sont
+    gardés (tous si aucun ne la chevauche : recherche sans filtre).
+
+    Args:
+        results (List[Tuple[Document, float]]): chunks du plus proche au plus loin
+        window (Tuple[int, int]): fenêtre de dates (None = pas de filtre)
+
+    Returns:
+        List[Tuple[Document, float]]: résultats dépliés, dans le même ordre
+    """
+    expanded = []
+    for doc, score in results:
+        docs = expand_members(doc)
+        if window is not None and len(docs) > 1:
+            docs = [d for d in docs if overlaps(d.metadata, *window)] or docs
+        expanded.extend((d, score) for d in docs)
+    return expanded
+
+
+def event_key(metadata):
+    """Clé de regroupement d'un chunk : identifiant de l'événement, à défaut son contenu."""
+    return metadata.get("id") or metadata.get("content_hash") or metadata.get("title", "")
+
+
+def group_by_event(results, k=4, token_budget=700):
+    """
+    Regroupe des chunks classés par événement et fusionne leurs textes.
+
+    Chaque événement dispose d'une part égale du budget (`token_budget / k`) :
+    ses chunks les plus pertinents sont ajoutés tant qu'ils y tiennent (le
+    premier est toujours gardé), ce qui garantit k événements distincts sans
+    dépasser le budget total.
+
+    Args:
+        results (List[Tuple[Document, float]]): chunks du plus proche au plus loin
+        k (int): nombre max d'événements
+        token_budget (int): budget total de tokens (estimés) pour les textes
+
+    Returns:
+        List[Tuple[Document, float]]: un document fusionné par événement et
+            la distance de son meilleur chunk
+    """
+    groups = OrderedDict()
+    for doc, score in results:
+        group = groups.setdefault(event_key(doc.metadata), {"doc": doc, "score": score, "chunks": []})
+        text = doc.page_content.strip()
+        if text not in group["chunks"]:
+            group["chunks"].append(text)
+
+    share = token_budget // max(1, k)
+    remaining = token_budget
+    events = []
+    for group in list(groups.values())[:k]:
+        kept, used = [], 0
+        for text in group["chunks"]:
+            cost = estimate_tokens(text)
+            if kept and used + cost > share:
+                break
+            kept.append(text)
+            used += cost
+        if used > remaining:
+            break
+        remaining -= used
+        merged = Document(page_content=" […] ".join(kept), metadata=group["doc"].metadata)
+        events.append((merged, group["score"]))
+    return events
+
+
+def search_events(vectorstore, query_vector, k=4, fetch_k=20, token_budget=700,
+                  date_index=None, window=None, full_vectors=None, trace=None):
+    """
+    Recherche les k événements distincts les plus pertinents.
+
+    Args:
+        vectorstore (FAISS): vectorstore LangChain chargé
+        query_vector (List[float]): embedding de la requête
+        k (int): nombre d'événements renvoyés
+        fetch_k (int): nombre de chunks candidats ramenés avant regroupement
+        token_budget (int): budget de tokens pour l'ensemble des textes
+        date_index (DateIndex): index des dates (None = pas de filtre)
+        window (Tuple[int, int]): fenêtre de dates (cf. date_filter.parse_date_window)
+        full_vectors (np.ndarray): vecteurs exacts d'un index compressé (None = aucun)
+        trace (tracing.Trace): trace de la requête (None = pas de mesure)
+
+    Returns:
+        List[Tuple[Document, float]]: un document fusionné par événement
+    """
+    with _span(trace, "vector_search"):
+        results, window = search_in_window(vectorstore, query_vector, max(k, fetch_k), date_index,
+                                           window, full_vectors)
+    with _span(trace, "group_by_event"):
+        return group_by_event(expand_results(results, window), k, token_budget)
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """
+    Fusionne des classements de positions : score = Σ 1 / (rrf_k + rang).
+
+    Args:
+        rankings (List[Sequence[int]]): positions, de la meilleure à la moins bonne
+            (ou paires (n° de shard, position) d'un index partitionné, cf. shards.py)
+        rrf_k (int): constante de lissage (60 dans la littérature)
+
+    Returns:
+        List[Tuple[int, float]]: positions et scores fusionnés, du meilleur au moins bon
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            if not isinstance(position, tuple):
+                position = int(position)
+                if position < 0:
+                    continue
+            scores[position] = scores.get(position, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def search_events_hybrid(vectorstore, query, embed_query, lexical, k=4, fetch_k=20,
+                         token_budget=700, date_index=None, window=None, full_vectors=None,
+                         rrf_k=RRF_K, trace=None):
+    """
+    Recherche hybride lexicale (BM25, cf. lexical.py) + vectorielle.
+
+    Si BM25 est assez sûr de lui (requête de mots-clés, cf.
+    `LexicalIndex.confident`), ses résultats sont renvoyés directement, sans
+    embedding de la requête ; sinon les deux classements sont fusionnés par
+    rang réciproque (RRF).
+
+    Args:
+        vectorstore (FAISS): vectorstore LangChain chargé
+        query (str): question de l'utilisateur
+        embed_query (Callable[[str], List[float]]): embedding de la requête
+        lexical (LexicalIndex): index BM25 aligné sur les positions FAISS
+        k, fetch_k, token_budget, date_index, window, full_vectors: cf. search_events
+        rrf_k (int): constante de la fusion
+        trace (tracing.Trace): trace de la requête (None = pas de mesure)
+
+    Returns:
+        Tuple[List[Tuple[Document, float]], List[float] or None]: un document
+            fusionné par événement (score BM25 ou RRF, plus grand = meilleur)
+            et l'embedding de la requête (None si chemin rapide lexical)
+    """
+    fetch = max(k, fetch_k)
+    ids, window = window_ids(date_index, window)
+    with _span(trace, "lexical_search") as span:
+        hits = lexical.search(query, fetch, ids)
+        confident = lexical.confident(hits)
+        if span is not None:
+            span.set(hits=len(hits["positions"]), terms=hits["terms"], confident=bool(confident))
+    if confident:
+        with _span(trace, "group_by_event"):
+            results = _documents(vectorstore, hits["scores"], hits["positions"])
+            return group_by_event(expand_results(results, window), k, token_budget), None
+
+    with _span(trace, "embed_query"):
+        query_vector = embed_query(query)
+    with _span(trace, "vector_search"):
+        _, positions = _search_positions(vectorstore, query_vector, fetch, ids, full_vectors)
+    with _span(trace, "group_by_event"):
+        fused = reciprocal_rank_fusion([positions, hits["positions"]], rrf_k)[:fetch]
+        results = _documents(vectorstore, [score for _, score in fused], [p for p, _ in fused])
+        return group_by_event(expand_results(results, window), k, token_budget), query_vector
+
+
+class EventIndex:
+    """
+    Index sauvegardé par embedding.py, prêt pour la recherche (comme app.py).
+
+    Attributs :
+        vectorstore (FAISS) : index FAISS projeté en mémoire et métadonnées
+        lexical (LexicalIndex) : index BM25 (None pour un ancien index)
+        date_index (DateIndex) : dates des événements (None = pas de filtre)
+        full_vectors (np.ndarray) : vecteurs exacts d'un index compressé, sinon None
+    """
+
+    def __init__(self, vectorstore, lexical=None, date_index=None, full_vectors=None):
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.date_index = date_index
+        self.full_vectors = full_vectors
+
+    @classmethod
+    def load(cls, index_dir, embeddings):
+        """
+        Args:
+            index_dir (str): dossier de l'index
+            embeddings (Embeddings): embedding des requêtes
+        """
+        date_index_path = os.path.join(index_dir, DATE_INDEX_FILE)
+        lexical_path = os.path.join(index_dir, LEXICAL_DIR)
+        return cls(
+            load_vectorstore(index_dir, embeddings, mmap=True),
+            LexicalIndex(lexical_path) if os.path.isdir(lexical_path) else None,
+            DateIndex.load(date_index_path) if os.path.exists(date_index_path) else None,
+            load_full_vectors(index_dir),
+        )
+
+    @property
+    def embedding_function(self):
+        return self.vectorstore.embedding_function
+
+    @property
+    def ntotal(self):
+        return self.vectorstore.index.ntotal
+
+    def search(self, query, k=4, fetch_k=20, now=None, trace=None):
+        """
+        Événements pour une question, dans la période qu'elle demande.
+
+        Args:
+            query (str): question de l'utilisateur
+            k, fetch_k: cf. search_events
+            now (datetime): instant de référence des périodes (None = maintenant)
+            trace (tracing.Trace): trace de la requête (None = pas de mesure)
+
+        Returns:
+            Tuple[List[Tuple[Document, float]], List[float] or None, str]: résultats,
+                embedding de la requête (None si chemin rapide lexical) et mode
+                de recherche (`lexical`, `hybrid` ou `vector`)
+        """
+        window = parse_date_window(query, now)
+        embed_query = self.vectorstore.embedding_function.embed_query
+        if self.lexical is not None:
+            results, query_vector = search_events_hybrid(
+                self.vectorstore, query, embed_query, self.lexical, k=k, fetch_k=fetch_k,
+                date_index=self.date_index, window=window, full_vectors=self.full_vectors, trace=trace,
+            )
+            return results, query_vector, "lexical" if query_vector is None else "hybrid"
+        with _span(trace, "embed_query"):
+            query_vector = embed_query(query)
+        results = search_events(self.vectorstore, query_vector, k=k, fetch_k=fetch_k,
+                                date_index=self.date_index, window=window,
+                                full_vectors=self.full_vectors, trace=trace)
+        return results, query_vector, "vector"
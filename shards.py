@@ -0,0 +1,350 @@
+"""
+shards.py
+
+Index partitionné par mois : un index complet par mois de fin des
+événements (`lastdate_end`), plus un manifeste des shards.
+
+Format (dossier de l'index) :
+- `shards.json` : pour chaque shard, bornes de dates de ses événements
+  (début le plus tôt, fin la plus tardive, timestamps epoch) et nombre de
+  vecteurs
+- `2024-06/`, `2024-07/`... : un index par mois, au même format qu'un index
+  unique (FAISS, métadonnées, BM25, dates, cf. embedding.py) ; `sans-date/`
+  pour les événements sans date de fin
+
+Un événement est rangé dans le mois où il se termine : une fois ce mois
+écoulé, tous les événements du shard sont passés, et les supprimer revient à
+effacer son dossier (`expire_shards`), sans reconstruire le reste de l'index.
+
+La recherche (`ShardedEventIndex`) ne consulte que les shards dont les
+bornes chevauchent la période demandée, en parallèle dans un pool de
+threads (FAISS relâche le GIL). Les distances L2, comparables d'un shard à
+l'autre, sont fusionnées par un tas ; les scores BM25 ne le sont pas (idf et
+longueur moyenne propres à chaque shard) et sont fusionnés par rang (RRF).
+Les résultats sont ensuite regroupés par événement comme pour un index
+unique (cf. retrieval.py) : le coût d'une question suit la période active,
+pas tout l'historique.
+
+Usage :
+    python shards.py --index-dir faiss_langchain_index
+    python shards.py --index-dir faiss_langchain_index --expire
+"""
+
+import argparse
+import heapq
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from date_filter import DATE_INDEX_FILE, MAX_TS, MIN_TS, PARIS, parse_date_window, parse_timestamp
+from lexical import LEXICAL_DIR
+from metadata_store import STORE_DIR
+from retrieval import (
+    EventIndex, _span, _search_positions, expand_results, group_by_event, reciprocal_rank_fusion,
+)
+from vector_storage import FULL_VECTORS_FILE
+
+SHARD_MANIFEST = "shards.json"
+UNDATED_SHARD = "sans-date"
+
+# Fichiers d'un index unique (remplacés par les shards, et inversement)
+SINGLE_INDEX_FILES = ("index.faiss", "index.pkl", FULL_VECTORS_FILE, DATE_INDEX_FILE, STORE_DIR, LEXICAL_DIR)
+
+
+def shard_key(metadata):
+    """Shard d'un chunk : mois de fin de l'événement (`AAAA-MM`, heure de Paris)."""
+    end = parse_timestamp(metadata.get("lastdate_end"))
+    if end is None:
+        return UNDATED_SHARD
+    return datetime.fromtimestamp(end, PARIS).strftime("%Y-%m")
+
+
+def is_expired(name, now=None):
+    """Vrai si le mois du shard est écoulé : tous ses événements sont terminés."""
+    if name == UNDATED_SHARD:
+        return False
+    now = (now or datetime.now(PARIS)).astimezone(PARIS)
+    return name < now.strftime("%Y-%m")
+
+
+def read_manifest(index_dir):
+    """
+    Manifeste des shards, ou None pour un index unique.
+
+    Returns:
+        dict: nom du shard -> {"begin", "end", "vectors"}
+    """
+    path = os.path.join(index_dir, SHARD_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["shards"]
+
+
+def write_manifest(index_dir, shards):
+    """
+    Écrit le manifeste (écriture atomique), puis supprime les dossiers des
+    shards qui n'y figurent plus : un lecteur ne voit jamais un shard absent.
+
+    Args:
+        index_dir (str): dossier de l'index
+        shards (dict): nom du shard -> {"begin", "end", "vectors"}
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    previous = read_manifest(index_dir) or {}
+    path = os.path.join(index_dir, SHARD_MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"shard_by": "month", "shards": dict(sorted(shards.items()))}, f, indent=2)
+    os.replace(path + ".tmp", path)
+    for name in set(previous) - set(shards):
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def shard_entry(date_index, vectors):
+    """Entrée du manifeste d'un shard, à partir de son index des dates."""
+    return {
+        "begin": int(date_index.begin.min()) if len(date_index) else MIN_TS,
+        "end": int(date_index.end.max()) if len(date_index) else MAX_TS,
+        "vectors": int(vectors),
+    }
+
+
+def expire_shards(index_dir, now=None):
+    """
+    Supprime les shards des mois écoulés.
+
+    Returns:
+        List[str]: shards supprimés
+    """
+    shards = read_manifest(index_dir) or {}
+    expired = sorted(name for name in shards if is_expired(name, now))
+    if expired:
+        write_manifest(index_dir, {name: entry for name, entry in shards.items() if name not in expired})
+    return expired
+
+
+def remove_shards(index_dir):
+    """Supprime le manifeste et les dossiers des shards (passage à un index unique)."""
+    shards = read_manifest(index_dir)
+    if shards is None:
+        return
+    os.remove(os.path.join(index_dir, SHARD_MANIFEST))
+    for name in shards:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def remove_single_index(index_dir):
+    """Supprime les fichiers d'un index unique (passage aux shards)."""
+    for name in SINGLE_INDEX_FILES:
+        path = os.path.join(index_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def _ranked(shard, scores, positions):
+    for score, position in zip(scores, positions):
+        if position >= 0:
+            yield float(score), (shard, int(position))
+
+
+def merge_ranked(rankings, limit, descending=False):
+    """
+    Fusionne par un tas les classements triés de plusieurs shards.
+
+    Args:
+        rankings (List[Tuple[np.ndarray, np.ndarray]]): (scores, positions) de
+            chaque shard, du meilleur au moins bon
+        limit (int): nombre de résultats gardés
+        descending (bool): plus grand = meilleur (BM25) ; sinon distances L2
+
+    Returns:
+        List[Tuple[float, Tuple[int, int]]]: scores et (n° de shard, position)
+    """
+    streams = [_ranked(shard, scores, positions) for shard, (scores, positions) in enumerate(rankings)]
+    key = (lambda item: -item[0]) if descending else (lambda item: item[0])
+    return list(islice(heapq.merge(*streams, key=key), limit))
+
+
+def merge_lexical(selected, per_shard, limit):
+    """
+    Fusionne par rang (RRF) les résultats BM25 de plusieurs shards : leurs
+    scores ne sont pas comparables (idf et longueur moyenne propres à chaque
+    shard). À rang égal, les shards dont le classement est sûr (cf.
+    `LexicalIndex.confident`) passent en premier.
+
+    Args:
+        selected (List[Tuple[str, EventIndex, np.ndarray]]): shards consultés
+        per_shard (List[dict]): résultats BM25 de chaque shard (cf. `LexicalIndex.search`)
+        limit (int): nombre de résultats gardés
+
+    Returns:
+        List[Tuple[float, Tuple[int, int]]]: scores RRF et (n° de shard, position)
+    """
+    order = sorted(range(len(selected)), key=lambda i: not selected[i][1].lexical.confident(per_shard[i]))
+    rankings = [[key for _, key in _ranked(i, per_shard[i]["scores"], per_shard[i]["positions"])] for i in order]
+    return [(score, key) for key, score in reciprocal_rank_fusion(rankings)[:limit]]
+
+
+class ShardedEventIndex:
+    """
+    Index partitionné par mois, prêt pour la recherche (même interface qu'`EventIndex`).
+
+    Attributs :
+        shards (Dict[str, EventIndex]) : index de chaque shard
+        bounds (Dict[str, Tuple[int, int]]) : dates (début, fin) des événements de chaque shard
+        embedding_function (Embeddings) : embedding des requêtes, partagé par les shards
+    """
+
+    def __init__(self, shards, bounds, embedding_function, max_workers=None):
+        self.shards = shards
+        self.bounds = bounds
+        self.embedding_function = embedding_function
+        self._pool = ThreadPoolExecutor(max_workers or min(8, max(1, len(shards))),
+                                        thread_name_prefix="shard")
+
+    @classmethod
+    def load(cls, index_dir, embeddings, max_workers=None):
+        """
+        Args:
+            index_dir (str): dossier de l'index (avec `shards.json`)
+            embeddings (Embeddings): embedding des requêtes, partagé par les shards
+            max_workers (int): threads de recherche (un par shard, 8 au plus, par défaut)
+        """
+        manifest = read_manifest(index_dir)
+        shards = {name: EventIndex.load(os.path.join(index_dir, name), embeddings) for name in manifest}
+        bounds = {name: (entry["begin"], entry["end"]) for name, entry in manifest.items()}
+        return cls(shards, bounds, embeddings, max_workers)
+
+    @property
+    def ntotal(self):
+        return sum(shard.ntotal for shard in self.shards.values())
+
+    def select(self, window):
+        """
+        Shards qui chevauchent la fenêtre, avec les positions autorisées dans chacun.
+
+        Comme pour un index unique (cf. retrieval.window_ids), une fenêtre sans
+        aucun événement se replie sur les événements à venir.
+
+        Returns:
+            Tuple[List[Tuple[str, EventIndex, np.ndarray or None]], Tuple[int, int]]:
+                (nom, shard, positions) et fenêtre retenue
+        """
+        def overlapping(start, stop):
+            selected = []
+            for name, shard in self.shards.items():
+                begin, end = self.bounds[name]
+                if (start is not None and end < start) or (stop is not None and begin > stop):
+                    continue
+                ids = None if shard.date_index is None else shard.date_index.select(start, stop)
+                if ids is None or len(ids):
+                    selected.append((name, shard, ids))
+            return selected
+
+        selected = overlapping(*window)
+        if not selected and window[1] is not None:
+            window = (window[0], None)
+            selected = overlapping(*window)
+        return selected, window
+
+    def _map(self, fn, selected):
+        if len(selected) <= 1:
+            return [fn(*item) for item in selected]
+        return list(self._pool.map(lambda item: fn(*item), selected))
+
+    def _documents(self, selected, ranked):
+        results = []
+        for score, (shard, position) in ranked:
+            vectorstore = selected[shard][1].vectorstore
+            doc_id = vectorstore.index_to_docstore_id[position]
+            results.append((vectorstore.docstore.search(doc_id), score))
+        return results
+
+    def search(self, query, k=4, fetch_k=20, now=None, trace=None):
+        """
+        Événements pour une question, dans les shards de la période demandée.
+
+        Args et retour : cf. `EventIndex.search` ; mode `none` si aucun shard
+        ne couvre la période (aucune recherche, aucun embedding)
+        """
+        fetch = max(k, fetch_k)
+        with _span(trace, "shard_select") as span:
+            selected, window = self.select(parse_date_window(query, now))
+            if span is not None:
+                span.set(shards=[name for name, _, _ in selected], total=len(self.shards))
+        if not selected:
+            return [], None, "none"
+        hybrid = all(shard.lexical is not None for _, shard, _ in selected)
+
+        lexical = []
+        if hybrid:
+            with _span(trace, "lexical_search") as span:
+                per_shard = self._map(lambda name, shard, ids: shard.lexical.search(query, fetch, ids), selected)
+                lexical = merge_lexical(selected, per_shard, fetch)
+                # Sûr de lui si le meilleur résultat, tous shards confondus, l'est dans son shard
+                confident = bool(lexical) and selected[lexical[0][1][0]][1].lexical.confident(
+                    per_shard[lexical[0][1][0]])
+                if span is not None:
+                    span.set(hits=len(lexical), confident=confident)
+            if confident:
+                with _span(trace, "group_by_event"):
+                    results = self._documents(selected, lexical)
+                    return group_by_event(expand_results(results, window), k), None, "lexical"
+
+        with _span(trace, "embed_query"):
+            query_vector = self.embedding_function.embed_query(query)
+        with _span(trace, "vector_search"):
+            vector = merge_ranked(self._map(
+                lambda name, shard, ids: _search_positions(shard.vectorstore, query_vector, fetch, ids,
+                                                           shard.full_vectors),
+                selected,
+            ), fetch)
+        with _span(trace, "group_by_event"):
+            if hybrid:
+                ranked = [(score, key) for key, score in reciprocal_rank_fusion(
+                    [[key for _, key in vector], [key for _, key in lexical]])[:fetch]]
+            else:
+                ranked = vector
+            results = self._documents(selected, ranked)
+            mode = "hybrid" if hybrid else "vector"
+            return group_by_event(expand_results(results, window), k), query_vector, mode
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def open_index(index_dir, embeddings):
+    """Index sauvegardé par embedding.py, partitionné (`shards.json`) ou unique."""
+    if os.path.exists(os.path.join(index_dir, SHARD_MANIFEST)):
+        return ShardedEventIndex.load(index_dir, embeddings)
+    return EventIndex.load(index_dir, embeddings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shards mensuels de l'index : liste et expiration")
+    parser.add_argument("--index-dir", default="faiss_langchain_index", help="dossier de l'index")
+    parser.add_argument("--expire", action="store_true", help="supprime les shards des mois écoulés")
+    parser.add_argument("--now", help="date de référence (ISO, ex. 2024-06-01)")
+    args = parser.parse_args(argv)
+
+    now = None
+    if args.now:
+        now = datetime.fromisoformat(args.now)
+        now = now if now.tzinfo else now.replace(tzinfo=PARIS)
+    if args.expire:
+        expired = expire_shards(args.index_dir, now)
+        print(f"🗑️ {len(expired)} shard(s) expiré(s) supprimé(s) : {', '.join(expired) or 'aucun'}")
+    shards = read_manifest(args.index_dir)
+    if shards is None:
+        raise SystemExit(f"❌ '{args.index_dir}' n'est pas un index partitionné ({SHARD_MANIFEST} absent)")
+    for name, entry in shards.items():
+        print(f"📅 {name:<10} {entry['vectors']:>8} vecteurs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+streaming.py
+
+Consommation d'une réponse de chat Mistral en flux (token par token).
+
+`StreamingReply` enveloppe le générateur renvoyé par `client.chat_stream(...)` :
+il accumule le texte, mesure le temps jusqu'au premier token (TTFT) et la
+durée totale de génération, et ferme proprement la connexion HTTP si la
+génération est annulée (nouveau message de l'utilisateur, exception...).
+`AsyncStreamingReply` fait de même pour le client asynchrone (cf. api.py).
+"""
+
+import time
+
+
+class GenerationMetrics:
+    """
+    Mesures d'une génération.
+
+    Attributs :
+        started (float) : instant de l'envoi de la requête (perf_counter)
+        first_token (float) : instant de réception du premier token non vide
+        finished (float) : instant de fin (complète ou annulée)
+        chunks (int) : nombre de fragments reçus
+        cancelled (bool) : génération interrompue avant la fin
+        usage (dict) : comptage de tokens renvoyé par l'API, s'il existe
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.finished = None
+        self.chunks = 0
+        self.cancelled = False
+        self.usage = None
+
+    @property
+    def ttft(self):
+        """Temps jusqu'au premier token (s), ou None."""
+        return None if self.first_token is None else self.first_token - self.started
+
+    @property
+    def total(self):
+        """Durée totale de génération (s), ou None si en cours."""
+        return None if self.finished is None else self.finished - self.started
+
+    def as_dict(self):
+        return {
+            "ttft_s": None if self.ttft is None else round(self.ttft, 4),
+            "total_s": None if self.total is None else round(self.total, 4),
+            "chunks": self.chunks,
+            "cancelled": self.cancelled,
+            "usage": self.usage,
+        }
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage
+    return {key: getattr(usage, key, None)
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+class StreamingReply:
+    """
+    Itère sur le texte cumulé d'une réponse en flux.
+
+    Usage :
+        with StreamingReply(client.chat_stream(...), cancel_event) as reply:
+            for text in reply:
+                placeholder.markdown(text + "▌")
+        reply.text, reply.metrics
+
+    Args:
+        chunks (Iterator): flux `ChatCompletionStreamResponse` (ou dicts équivalents)
+        cancel_event (threading.Event): si positionné, la génération s'arrête
+    """
+
+    def __init__(self, chunks, cancel_event=None):
+        self._chunks = chunks
+        self.cancel_event = cancel_event
+        self.text = ""
+        self.metrics = GenerationMetrics()
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.metrics.cancelled = True
+                break
+            if self._add(chunk):
+                yield self.text
+        self.close()
+
+    def _add(self, chunk):
+        """Comptabilise un fragment ; True s'il apporte du texte."""
+        self.metrics.chunks += 1
+        usage = chunk.get("usage") if isinstance(chunk, dict) else getattr(chunk, "usage", None)
+        if usage is not None:
+            self.metrics.usage = _usage_dict(usage)
+        content = _delta_content(chunk)
+        if not content:
+            return False
+        if self.metrics.first_token is None:
+            self.metrics.first_token = time.perf_counter()
+        self.text += content
+        return True
+
+    def close(self):
+        """Ferme le flux HTTP (idempotent) et fige la durée totale."""
+        if self.metrics.finished is None:
+            self.metrics.finished = time.perf_counter()
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Sortie anticipée hors erreur (arrêt du script Streamlit par un
+        # nouveau message, KeyboardInterrupt...) : la génération est annulée
+        if self.metrics.finished is None and (exc_type is None or not issubclass(exc_type, Exception)):
+            self.metrics.cancelled = True
+        self.close()
+        return False
+
+
+class AsyncStreamingReply(StreamingReply):
+    """
+    Variante asynchrone, pour `MistralAsyncClient.chat_stream(...)` (cf. api.py).
+
+    Usage :
+        async with AsyncStreamingReply(client.chat_stream(...)) as reply:
+            async for text in reply:
+                ...
+
+    Une tâche annulée (client HTTP déconnecté) compte comme génération annulée.
+    """
+
+    async def __aiter__(self):
+        async for chunk in self._chunks:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.metrics.cancelled = True
+                break
+            if self._add(chunk):
+                yield self.text
+        await self.aclose()
+
+    async def aclose(self):
+        """Ferme le flux HTTP (idempotent) et fige la durée totale."""
+        if self.metrics.finished is None:
+            self.metrics.finished = time.perf_counter()
+            aclose = getattr(self._chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.metrics.finished is None and (exc_type is None or not issubclass(exc_type, Exception)):
+            self.metrics.cancelled = True
+        await self.aclose()
+        return False
+
+
+def _delta_content(chunk):
+    """Texte du fragment `choices[0].delta.content`, objet ou dict."""
+    choices = chunk.get("choices") if isinstance(chunk, dict) else getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") if isinstance(choices[0], dict) else choices[0].delta
+    if delta is None:
+        return ""
+    content = delta.get("content") if isinstance(delta, dict) else delta.content
+    return content or ""
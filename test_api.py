@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from api import create_app
+from date_filter import DATE_INDEX_FILE, DateIndex
+from embedding import build_vectorstore
+from fake_mistral import DEFAULT_REPLY, fake_embedding, serve_in_thread
+from prompt import NO_CONTEXT, SYSTEM_PROMPT, build_prompt
+from tracing import Tracer
+from vector_storage import save_vectorstore
+
+DIM = 16
+EVENTS = [
+    ("Concert de jazz au Sunset", "Sunset Jazz Club"),
+    ("Exposition de photographie contemporaine", "Maison européenne de la photographie"),
+    ("Atelier de poterie pour enfants", "Centre Paris Anim'"),
+    ("Projection en plein air", "Parc de la Villette"),
+    ("Visite guidée du Marais", "Place des Vosges"),
+]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    texts = [f"{title}. Un événement à {lieu}." for title, lieu in EVENTS]
+    metadatas = [{"id": str(i), "title": title, "location_name": lieu, "location_address": "Paris",
+                  "firstdate_begin": "2024-01-01t10:00:00", "lastdate_end": "2099-12-31t22:00:00"}
+                 for i, (title, lieu) in enumerate(EVENTS)]
+    # Mêmes vecteurs que ceux que renverra le faux serveur pour ces textes
+    vectors = np.asarray([fake_embedding(text, dim=DIM) for text in texts], dtype=np.float32)
+    store = build_vectorstore(texts, vectors, metadatas, [f"{i}:0" for i in range(len(texts))],
+                              DeterministicFakeEmbedding(size=DIM))
+    path = tmp_path / "index"
+    save_vectorstore(str(path), store)
+    DateIndex.from_vectorstore(store).save(str(path / DATE_INDEX_FILE))
+    return str(path)
+
+
+def run(index_dir, scenario, max_concurrent=8, max_queue=8, **server_options):
+    """Lance l'API contre le faux serveur et exécute `scenario(client, state)`."""
+    async def main(url, state):
+        app = create_app(index_dir, "test", url, max_concurrent=max_concurrent, max_queue=max_queue,
+                         max_retries=0, tracer=Tracer(path=None))
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client, state)
+
+    with serve_in_thread(dim=DIM, **server_options) as (url, state):
+        return asyncio.run(main(url, state))
+
+
+async def ndjson(response):
+    return [json.loads(line) for line in (await response.text()).splitlines()]
+
+
+def test_search_renvoie_les_evenements(index_dir):
+    async def scenario(client, state):
+        response = await client.post("/search", json={"query": "une sortie culturelle sympa", "k": 2})
+        assert response.status == 200
+        return await response.json()
+
+    payload = run(index_dir, scenario)
+    assert payload["retrieval"] == "hybrid"
+    assert len(payload["events"]) == 2
+    assert {"id", "title", "score", "context"} <= set(payload["events"][0])
+
+
+def test_recommend_en_flux(index_dir):
+    async def scenario(client, state):
+        response = await client.post("/recommend", json={"query": "un concert de jazz"})
+        assert response.status == 200
+        assert response.headers["Content-Type"] == "application/x-ndjson"
+        return await ndjson(response)
+
+    messages = run(index_dir, scenario)
+    assert messages[0]["events"][0]["title"] == "Concert de jazz au Sunset"
+    assert "".join(m["delta"] for m in messages if "delta" in m) == DEFAULT_REPLY
+    assert messages[-1]["done"] and messages[-1]["text"] == DEFAULT_REPLY
+
+
+def test_requetes_identiques_regroupees(index_dir):
+    async def scenario(client, state):
+        responses = await asyncio.gather(*[
+            client.post("/recommend", json={"query": query})
+            for query in ["Que faire ce soir ?", "que faire ce soir", "QUE FAIRE CE SOIR !"] * 3
+        ])
+        texts = [(await ndjson(response))[-1]["text"] for response in responses]
+        health = await (await client.get("/health")).json()
+        return texts, health, state.requests
+
+    texts, health, requests = run(index_dir, scenario, token_latency=0.01)
+    assert texts == [DEFAULT_REPLY] * 9
+    assert health["coalesced"] == 8
+    # Un embedding de la question et une génération pour les 9 clients
+    assert requests == 2
+
+
+def test_saturation_503(index_dir):
+    async def scenario(client, state):
+        slow = asyncio.ensure_future(client.post("/recommend", json={"query": "un concert de jazz"}))
+        while state.in_flight == 0:
+            await asyncio.sleep(0.01)
+        rejected = await client.post("/search", json={"query": "une exposition"})
+        first = await slow
+        return rejected.status, rejected.headers.get("Retry-After"), first.status, await ndjson(first)
+
+    status, retry_after, first_status, messages = run(index_dir, scenario, max_concurrent=1, max_queue=0,
+                                                      token_latency=0.01)
+    assert (status, retry_after) == (503, "1")
+    assert first_status == 200 and messages[-1]["text"] == DEFAULT_REPLY
+
+
+def test_requete_invalide(index_dir):
+    async def scenario(client, state):
+        return [(await client.post("/search", json=body)).status
+                for body in [{"query": ""}, {"query": "jazz", "k": 0}, {"k": 2}]]
+
+    assert run(index_dir, scenario) == [400, 400, 400]
+
+
+def test_client_mistral_garde_ses_connexions(index_dir):
+    async def scenario(client, state):
+        for i in range(10):
+            response = await client.post("/search", json={"query": f"une idée de sortie numéro {i}"})
+            assert response.status == 200
+        return state.requests, state.connections
+
+    requests, connections = run(index_dir, scenario)
+    assert requests == 10 and connections == 1
+
+
+def test_client_deconnecte_annule_la_generation(index_dir):
+    async def scenario(client, state):
+        response = await client.post("/recommend", json={"query": "un concert de jazz"})
+        await response.content.readline()
+        response.close()
+        for _ in range(300):
+            if state.cancelled_streams:
+                break
+            await asyncio.sleep(0.01)
+        health = await (await client.get("/health")).json()
+        return state.cancelled_streams, health["in_flight"]
+
+    cancelled, in_flight = run(index_dir, scenario, token_latency=0.02)
+    assert cancelled == 1
+    assert in_flight == {"search": 0, "recommend": 0}
+
+
+def test_prompt_sans_resultat_identique_a_l_interface():
+    # Même prompt qu'app.py quand la recherche ne trouve rien
+    prompt, contexts = build_prompt("un concert sur la lune ?", [])
+    assert prompt == SYSTEM_PROMPT.format(context_str=NO_CONTEXT, question="un concert sur la lune ?")
+    assert contexts == []
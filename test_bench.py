@@ -0,0 +1,29 @@
+from bench import run_corpus, synthetic_events
+from fake_mistral import serve_in_thread
+
+OPTIONS = {"sentence_mode": "sentencizer", "dedup_threshold": 0.9, "index_type": "flat",
+           "requests_per_second": 1000, "concurrency": [1, 4], "queries": 24}
+
+
+def test_corpus_synthetique_deterministe():
+    a, b = synthetic_events(50), synthetic_events(50)
+    assert a["Description longue"].tolist() == b["Description longue"].tolist()
+    assert a["Identifiant"].is_unique
+
+
+def test_rapport_complet_sans_erreur():
+    with serve_in_thread(dim=16) as (url, state):
+        report = run_corpus(300, url, OPTIONS)
+
+    assert report["events"] == 300
+    # Séries récurrentes : moins de vecteurs que de chunks (cf. dedup.py)
+    assert 0 < report["vectors"] < report["chunks"]
+    assert report["rows_per_sec"] and report["embeddings_per_sec"] and report["index_bytes"] > 0
+    assert [run["concurrency"] for run in report["queries"]] == [1, 4]
+    for run in report["queries"]:
+        assert run["errors"] == 0
+        assert sum(run["modes"].values()) == 24
+        assert run["latency"]["query"]["count"] == 24
+        assert {"query.lexical_search", "query.chat_completion"} <= set(run["latency"])
+    assert report["peak_rss_bytes"] > 0
+    assert state.requests > 0
@@ -0,0 +1,29 @@
+import pytest
+
+import cli
+from cli import QUERY_PATH, measure_import
+
+
+def test_chemin_des_requetes_sans_dependances_lourdes():
+    assert measure_import(QUERY_PATH, runs=1)["loaded"] == []
+
+
+def test_cli_n_importe_pas_les_sous_commandes():
+    assert measure_import(["cli"], runs=1)["loaded"] == []
+
+
+def test_sous_commande_deleguee_au_module(monkeypatch):
+    calls = []
+
+    class Module:
+        @staticmethod
+        def main(argv):
+            calls.append(argv)
+            return 0
+
+    monkeypatch.setattr(cli.importlib, "import_module", lambda name: calls.append(name) or Module)
+    assert cli.main(["index", "--index-type", "sq8"]) == 0
+    assert calls == ["embedding", ["--index-type", "sq8"]]
+
+    with pytest.raises(SystemExit):
+        cli.main(["inconnue"])
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from date_filter import PARIS, DateIndex, parse_date_window
+from embedding import build_vectorstore
+from retrieval import search_events, window_ids
+
+# Mercredi 12 juin 2024, 15 h
+NOW = datetime(2024, 6, 12, 15, 0, tzinfo=PARIS)
+
+
+def ts(value):
+    return int(datetime.fromisoformat(value).replace(tzinfo=PARIS).timestamp())
+
+
+def test_periodes_en_francais():
+    assert parse_date_window("que faire aujourd'hui ?", NOW) == (int(NOW.timestamp()), ts("2024-06-12T23:59:59"))
+    assert parse_date_window("un concert demain soir", NOW) == (ts("2024-06-13T00:00"), ts("2024-06-13T23:59:59"))
+    assert parse_date_window("ce week-end", NOW) == (ts("2024-06-15T00:00"), ts("2024-06-16T23:59:59"))
+    assert parse_date_window("la semaine prochaine", NOW) == (ts("2024-06-17T00:00"), ts("2024-06-23T23:59:59"))
+    assert parse_date_window("expos de ce mois-ci", NOW) == (int(NOW.timestamp()), ts("2024-06-30T23:59:59"))
+
+
+def test_week_end_commence_le_samedi_ou_le_dimanche():
+    samedi = datetime(2024, 6, 15, 10, 0, tzinfo=PARIS)
+    dimanche = datetime(2024, 6, 16, 10, 0, tzinfo=PARIS)
+    assert parse_date_window("ce weekend", samedi) == (int(samedi.timestamp()), ts("2024-06-16T23:59:59"))
+    assert parse_date_window("ce week-end", dimanche) == (int(dimanche.timestamp()), ts("2024-06-16T23:59:59"))
+
+
+def test_par_defaut_les_evenements_a_venir():
+    assert parse_date_window("un musée gratuit", NOW) == (int(NOW.timestamp()), None)
+
+
+def test_chevauchement_des_intervalles():
+    index = DateIndex.from_metadatas(enumerate([
+        {"firstdate_begin": "2024-05-01t10:00:00", "lastdate_end": "2024-05-01t12:00:00"},  # passé
+        {"firstdate_begin": "2024-05-01t10:00:00", "lastdate_end": "2024-09-01t12:00:00"},  # en cours
+        {"firstdate_begin": "2024-06-13t20:00:00", "lastdate_end": "2024-06-13t22:00:00"},  # demain
+        {"firstdate_begin": "2024-07-01t10:00:00", "lastdate_end": "2024-07-01t12:00:00"},  # juillet
+        {},                                                                                   # sans date
+    ]))
+    assert index.select(*parse_date_window("demain", NOW)).tolist() == [1, 2, 4]
+    assert index.select(*parse_date_window("à venir", NOW)).tolist() == [1, 2, 3, 4]
+    # Bornes incluses
+    assert index.select(ts("2024-06-13T22:00"), ts("2024-06-13T23:00")).tolist() == [1, 2, 4]
+    assert index.select(ts("2024-07-01T12:00:01"), None).tolist() == [1, 4]
+
+
+def vectorstore(dates):
+    texts = [f"événement {i}" for i in range(len(dates))]
+    metadatas = [{"id": str(i), "title": f"événement {i}", "firstdate_begin": begin, "lastdate_end": end}
+                 for i, (begin, end) in enumerate(dates)]
+    embeddings = DeterministicFakeEmbedding(size=8)
+    store = build_vectorstore(texts, embeddings.embed_documents(texts), metadatas,
+                              [f"{i}:0" for i in range(len(texts))], embeddings)
+    return store, DateIndex.from_vectorstore(store), embeddings
+
+
+def test_fenetre_vide_repli_sur_les_evenements_a_venir():
+    store, index, embeddings = vectorstore([
+        ("2024-05-01t10:00:00", "2024-05-01t12:00:00"),
+        ("2024-06-20t10:00:00", "2024-06-20t12:00:00"),
+    ])
+    window = parse_date_window("demain", NOW)
+    ids, retained = window_ids(index, window)
+    assert ids.tolist() == [1] and retained == (window[0], None)
+
+    results = search_events(store, embeddings.embed_query("demain"), date_index=index, window=window)
+    assert [doc.metadata["id"] for doc, _ in results] == ["1"]
+
+
+def test_aucun_evenement_a_venir_aucun_resultat():
+    store, index, embeddings = vectorstore([("2024-05-01t10:00:00", "2024-05-01t12:00:00")])
+    results = search_events(store, embeddings.embed_query("demain"), date_index=index,
+                            window=parse_date_window("demain", NOW))
+    assert results == []
@@ -0,0 +1,98 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from date_filter import DateIndex, parse_timestamp
+from dedup import dedup_documents
+from embedding import build_vectorstore, update_index
+from index_journal import IndexJournal
+from retrieval import expand_results
+
+VISITE = ("visite guidée du palais garnier : histoire du bâtiment, grand escalier, "
+          "foyer de la danse et salle de spectacle, avec un conférencier de l'opéra")
+
+
+def chunk(event_id, text, begin="2024-06-01t10:00:00+00:00", end="2024-06-01t12:00:00+00:00"):
+    return Document(page_content=text, metadata={
+        "id": event_id, "content_hash": f"h-{event_id}-{text[:10]}",
+        "firstdate_begin": begin, "lastdate_end": end,
+    })
+
+
+def test_regroupe_doublons_exacts_et_quasi_doublons():
+    documents = [
+        chunk("1", VISITE),
+        chunk("2", "  " + VISITE.replace(" ", "  ")),
+        chunk("3", VISITE + " gratuite"),
+        chunk("4", "atelier de poterie pour enfants"),
+    ]
+    reps, rep_ids, stats = dedup_documents(documents, ["1:0", "2:0", "3:0", "4:0"])
+
+    assert rep_ids == ["1:0", "4:0"]
+    assert stats == {"chunks": 4, "vectors": 2, "exact": 1, "near": 1}
+    members = reps[0].metadata["members"]
+    assert [m["chunk_id"] for m in members] == ["2:0", "3:0"]
+    assert [m["id"] for m in members] == ["2", "3"]
+    assert "members" not in documents[0].metadata
+
+
+def test_membres_deplies_avec_leurs_propres_dates():
+    documents = [
+        chunk("juin", VISITE),
+        chunk("juillet", VISITE, "2024-07-01t10:00:00+00:00", "2024-07-01t12:00:00+00:00"),
+    ]
+    reps, _, _ = dedup_documents(documents, ["juin:0", "juillet:0"])
+    start = parse_timestamp("2024-07-01t00:00:00+00:00")
+    stop = parse_timestamp("2024-07-02t00:00:00+00:00")
+
+    expanded = expand_results([(reps[0], 0.5)])
+    assert [doc.metadata["id"] for doc, _ in expanded] == ["juin", "juillet"]
+    assert [score for _, score in expanded] == [0.5, 0.5]
+
+    in_july = expand_results([(reps[0], 0.5)], window=(start, stop))
+    assert [doc.metadata["id"] for doc, _ in in_july] == ["juillet"]
+
+
+def test_index_des_dates_contient_chaque_membre():
+    documents = [
+        chunk("juin", VISITE),
+        chunk("juillet", VISITE, "2024-07-01t10:00:00+00:00", "2024-07-01t12:00:00+00:00"),
+    ]
+    reps, rep_ids, _ = dedup_documents(documents, ["juin:0", "juillet:0"])
+    embeddings = DeterministicFakeEmbedding(size=8)
+    texts = [doc.page_content for doc in reps]
+    vectorstore = build_vectorstore(texts, embeddings.embed_documents(texts),
+                                    [doc.metadata for doc in reps], rep_ids, embeddings)
+
+    date_index = DateIndex.from_vectorstore(vectorstore)
+    assert len(date_index.ids) == 2
+    assert set(date_index.ids.tolist()) == {0}
+
+
+def test_mise_a_jour_incrementale_replace_les_membres(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    journal = IndexJournal(str(tmp_path / "journal"))
+    documents = [chunk("a", VISITE), chunk("b", VISITE), chunk("c", "atelier de poterie pour enfants")]
+    ids = ["a:0", "b:0", "c:0"]
+    reps, rep_ids, _ = dedup_documents(documents, ids)
+    texts = [doc.page_content for doc in reps]
+    vectorstore = build_vectorstore(texts, embeddings.embed_documents(texts),
+                                    [doc.metadata for doc in reps], rep_ids, embeddings)
+    assert vectorstore.index.ntotal == 2
+
+    # "a" (représentant) modifié, "d" nouveau doublon de "c" : "b" devient représentant
+    documents = [chunk("a", "concert de jazz au parc floral"), chunk("b", VISITE),
+                 chunk("c", "atelier de poterie pour enfants"),
+                 chunk("d", "atelier de poterie pour enfants")]
+    stats = update_index(vectorstore, documents, ["a:0", "b:0", "c:0", "d:0"], embeddings, journal)
+
+    assert (stats["added"], stats["updated"], stats["deleted"]) == (1, 1, 0)
+    assert stats["joined"] == 1
+    assert vectorstore.index.ntotal == 3
+    stored = set(vectorstore.index_to_docstore_id.values())
+    assert stored == {"a:0", "b:0", "c:0"}
+    members = vectorstore.docstore.search("c:0").metadata["members"]
+    assert [m["chunk_id"] for m in members] == ["d:0"]
+
+    # Aucun changement : rien n'est ré-encodé
+    stats = update_index(vectorstore, documents, ["a:0", "b:0", "c:0", "d:0"], embeddings, journal)
+    assert stats == {"added": 0, "updated": 0, "deleted": 0, "vectors": 0, "joined": 0}
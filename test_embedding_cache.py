@@ -0,0 +1,82 @@
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding import build_vectorstore, update_index
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from index_journal import IndexJournal
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def counting():
+    return CountingEmbeddings(size=8, calls=[])
+
+
+def test_succes_et_echecs_comptes_doublons_envoyes_une_fois(tmp_path):
+    inner = counting()
+    embeddings = CachedEmbeddings(inner, EmbeddingCache(str(tmp_path / "cache.sqlite")))
+
+    first = embeddings.embed_documents(["jazz", "expo", "jazz"])
+    assert inner.calls == [["jazz", "expo"]]
+    assert (embeddings.hits, embeddings.misses) == (0, 3)
+    assert first[0] == first[2]
+
+    again = embeddings.embed_documents(["expo", "poterie"])
+    assert inner.calls[-1] == ["poterie"]
+    assert (embeddings.hits, embeddings.misses) == (1, 4)
+    np.testing.assert_allclose(again[0], first[1], rtol=1e-6)
+
+
+def test_cache_persistant_entre_deux_runs(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path)
+    CachedEmbeddings(counting(), cache).embed_documents(["jazz", "expo"])
+    cache.close()
+
+    inner = counting()
+    embeddings = CachedEmbeddings(inner, EmbeddingCache(path))
+    embeddings.embed_documents(["expo", "jazz"])
+    assert inner.calls == [] and embeddings.hits == 2
+
+
+def test_cle_propre_au_modele(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    mistral = EmbeddingCache(path, model="mistral-embed")
+    other = EmbeddingCache(path, model="autre-modele")
+    assert mistral.key("jazz") != other.key("jazz")
+
+    CachedEmbeddings(counting(), mistral).embed_documents(["jazz"])
+    inner = counting()
+    CachedEmbeddings(inner, other).embed_documents(["jazz"])
+    assert inner.calls == [["jazz"]]
+    assert len(other) == 2
+
+
+def test_mise_a_jour_incrementale_n_encode_que_les_changements(tmp_path):
+    def event(i, text):
+        return Document(page_content=text, metadata={"id": str(i), "content_hash": f"h-{text}"})
+
+    inner = counting()
+    embeddings = CachedEmbeddings(inner, EmbeddingCache(str(tmp_path / "cache.sqlite")))
+    documents = [event(i, f"événement {i}") for i in range(5)]
+    ids = [f"{i}:0" for i in range(5)]
+    texts = [doc.page_content for doc in documents]
+    vectorstore = build_vectorstore(texts, embeddings.embed_documents(texts),
+                                    [doc.metadata for doc in documents], ids, embeddings)
+
+    documents[2] = event(2, "événement 2 modifié")
+    documents.append(event(5, "événement 5"))
+    ids.append("5:0")
+    inner.calls.clear()
+    stats = update_index(vectorstore, documents, ids, embeddings,
+                         IndexJournal(str(tmp_path / "journal")), dedup_threshold=None)
+
+    assert (stats["added"], stats["updated"], stats["deleted"]) == (1, 1, 0)
+    assert inner.calls == [["événement 2 modifié", "événement 5"]]
@@ -0,0 +1,71 @@
+import json
+import urllib.request
+
+import pytest
+
+from embedding_engine import EmbeddingEngine, EmbeddingError, estimate_tokens, make_batches
+from fake_mistral import FAIL_MARKER, fake_embedding, serve_in_thread
+
+DIM = 16
+
+
+def http_embed_fn(base_url):
+    def embed(texts):
+        request = urllib.request.Request(
+            f"{base_url}/v1/embeddings",
+            data=json.dumps({"model": "mistral-embed", "input": texts}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            payload = json.loads(response.read())
+        return [item["embedding"] for item in payload["data"]]
+    return embed
+
+
+def test_lots_bornes_en_tokens_et_contigus():
+    texts = ["x" * 300] * 10 + ["y" * 30] * 50
+    batches = make_batches(texts, max_tokens=400, max_items=20)
+
+    assert batches[0][0] == 0 and batches[-1][1] == len(texts)
+    assert all(a[1] == b[0] for a, b in zip(batches, batches[1:]))
+    for start, end in batches:
+        assert end - start <= 20
+        assert sum(estimate_tokens(t) for t in texts[start:end]) <= 400
+
+
+def test_resultats_ordonnes_et_concurrence_bornee():
+    texts = [f"événement numéro {i}" for i in range(120)]
+    with serve_in_thread(dim=DIM, latency=0.02) as (url, state):
+        engine = EmbeddingEngine(http_embed_fn(url), max_in_flight=3, max_items_per_batch=10,
+                                 requests_per_second=200)
+        vectors = engine.embed(texts)
+
+    assert vectors == [pytest.approx(fake_embedding(t, DIM)) for t in texts]
+    assert 1 < state.max_in_flight <= 3
+
+
+def test_429_ralentit_puis_reussit():
+    texts = [f"concert {i}" for i in range(60)]
+    with serve_in_thread(dim=DIM, rate_limit=5) as (url, state):
+        engine = EmbeddingEngine(http_embed_fn(url), max_in_flight=4, max_items_per_batch=5,
+                                 requests_per_second=50, max_retries=10, backoff=0.05)
+        vectors = engine.embed(texts)
+
+    assert len(vectors) == len(texts)
+    assert state.rate_limited > 0
+    assert engine.rate_limited > 0
+    assert engine.limiter.rate < engine.limiter.max_rate
+
+
+def test_lot_en_echec_signale_et_non_ignore():
+    texts = [f"expo {i}" for i in range(30)]
+    texts[12] = f"expo {FAIL_MARKER}"
+    done = []
+    with serve_in_thread(dim=DIM) as (url, _):
+        engine = EmbeddingEngine(http_embed_fn(url), max_items_per_batch=10,
+                                 requests_per_second=200, max_retries=2, backoff=0.01)
+        with pytest.raises(EmbeddingError) as excinfo:
+            engine.embed(texts, on_batch_done=lambda start, vectors: done.append(start))
+
+    assert [(f.start, f.end) for f in excinfo.value.failures] == [(10, 20)]
+    assert done == [0, 20]
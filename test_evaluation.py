@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from mistralai.client import MistralClient
+
+from embedding import build_vectorstore
+from evaluation import JudgeCache, build_report, generate_answers, judge_rows, load_questions, recall_at_k
+from mistral_embeddings import CustomMistralEmbeddings
+from fake_mistral import DEFAULT_REPLY, FAIL_MARKER, fake_embedding, serve_in_thread
+from retrieval import EventIndex
+from tracing import Tracer
+from vector_storage import save_vectorstore
+
+DIM = 16
+EVENTS = ["Concert de jazz au Sunset", "Exposition de photographie contemporaine",
+          "Atelier de poterie pour enfants", "Projection en plein air", "Visite guidée du Marais"]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    metadatas = [{"id": str(i), "title": title, "firstdate_begin": "2024-01-01t10:00:00",
+                  "lastdate_end": "2099-12-31t22:00:00"} for i, title in enumerate(EVENTS)]
+    vectors = np.asarray([fake_embedding(text, dim=DIM) for text in EVENTS], dtype=np.float32)
+    store = build_vectorstore(EVENTS, vectors, metadatas, [f"{i}:0" for i in range(len(EVENTS))],
+                              DeterministicFakeEmbedding(size=DIM))
+    save_vectorstore(str(tmp_path / "index"), store)
+    return str(tmp_path / "index")
+
+
+class CountingJudge:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, metric, rows):
+        self.calls.append((metric, len(rows)))
+        return [0.5 if metric == "faithfulness" else float("nan")] * len(rows)
+
+
+def test_jeu_de_test_json_ou_jsonl(tmp_path):
+    items = [{"question": "Un concert ?", "ground_truth": "Le concert de jazz", "relevant_ids": [0]},
+             {"question": "Une expo ?", "ground_truth": "L'exposition photo"}]
+    (tmp_path / "q.json").write_text(json.dumps(items), encoding="utf-8")
+    (tmp_path / "q.jsonl").write_text("\n".join(json.dumps(i) for i in items) + "\n", encoding="utf-8")
+    assert load_questions(tmp_path / "q.json") == load_questions(tmp_path / "q.jsonl")
+    assert load_questions(tmp_path / "q.json")[0]["relevant_ids"] == ["0"]
+
+    (tmp_path / "bad.jsonl").write_text(json.dumps({"question": "sans vérité"}), encoding="utf-8")
+    with pytest.raises(ValueError, match="entrée 1"):
+        load_questions(tmp_path / "bad.jsonl")
+
+
+def test_recall_at_k():
+    assert recall_at_k(["1", "2", "3"], ["2", "9"], k=2) == 0.5
+    assert recall_at_k(["1", "2", "3"], ["3"], k=2) == 0.0
+    assert recall_at_k(["1"], None, k=4) is None
+
+
+def test_pipeline_reel_et_cache_du_juge(index_dir, tmp_path):
+    questions = [
+        {"question": "Concert de jazz au Sunset", "ground_truth": "jazz", "relevant_ids": ["0"]},
+        {"question": "une idée de sortie pour les enfants", "ground_truth": "poterie", "relevant_ids": None},
+        {"question": f"{FAIL_MARKER} question", "ground_truth": "erreur", "relevant_ids": None},
+    ] * 3
+    with serve_in_thread(dim=DIM) as (url, state):
+        client = MistralClient(api_key="test", endpoint=url, max_retries=0)
+        index = EventIndex.load(index_dir, CustomMistralEmbeddings(client, requests_per_second=1000,
+                                                                           max_retries=1))
+        tracer = Tracer(path=None)
+        rows = generate_answers(index, client, questions, k=2, concurrency=4, tracer=tracer)
+
+    assert [row["answer"] for row in rows[:2]] == [DEFAULT_REPLY] * 2
+    assert rows[0]["retrieved_ids"][0] == "0" and rows[0]["recall"] == 1.0
+    assert len(rows[1]["contexts"]) == 2 and rows[1]["retrieval"] == "hybrid"
+    assert rows[2]["error"] and rows[2]["answer"] == ""
+
+    cache = JudgeCache(str(tmp_path / "judge.sqlite"))
+    judge = CountingJudge()
+    scores = judge_rows(rows, judge, cache, metrics=("faithfulness", "context_recall"))
+    # 6 lignes jugeables, mais seulement 2 distinctes
+    assert judge.calls == [("faithfulness", 2), ("context_recall", 2)]
+    assert scores[0]["faithfulness"] == 0.5 and scores[2] == {}
+
+    # Relance : aucun appel au juge, scores identiques (NaN compris)
+    rejudge = CountingJudge()
+    cache = JudgeCache(str(tmp_path / "judge.sqlite"))
+    again = judge_rows(rows, rejudge, cache, metrics=("faithfulness", "context_recall"))
+    assert rejudge.calls == [] and (cache.hits, cache.misses) == (12, 0)
+    assert again[0]["faithfulness"] == 0.5 and np.isnan(again[0]["context_recall"])
+
+    # Une réponse modifiée est rejugée, seule
+    rows[0] = dict(rows[0], answer="autre réponse")
+    judge_rows(rows, rejudge, cache, metrics=("faithfulness",))
+    assert rejudge.calls == [("faithfulness", 1)]
+
+    report = build_report(rows, again, tracer, k=2, cache=cache)
+    assert report["errors"] == 3 and report["recall@2"] == 1.0 and report["recall_questions"] == 3
+    assert report["scores"]["faithfulness"] == 0.5
+    assert report["retrieval_latency"]["count"] == 9
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from index_journal import IndexJournal, embed_with_journal
+
+
+class Interrupted(RuntimeError):
+    pass
+
+
+class CountingEmbeddings:
+    """Embeddings déterministes qui comptent les textes encodés et s'arrêtent après `fail_after` lots."""
+
+    def __init__(self, fail_after=None):
+        self.inner = DeterministicFakeEmbedding(size=8)
+        self.fail_after = fail_after
+        self.batches = 0
+        self.texts = []
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and self.batches >= self.fail_after:
+            raise Interrupted("arrêt du run")
+        self.batches += 1
+        self.texts.extend(texts)
+        return self.inner.embed_documents(texts)
+
+
+def corpus(n=50):
+    return [f"{i}:0" for i in range(n)], [f"chunk numéro {i}" for i in range(n)]
+
+
+def test_reprise_ne_re_encode_que_les_chunks_en_attente(tmp_path):
+    ids, texts = corpus()
+    with pytest.raises(Interrupted):
+        embed_with_journal(IndexJournal(str(tmp_path)), ids, texts, CountingEmbeddings(fail_after=3),
+                           checkpoint_size=10)
+
+    embeddings = CountingEmbeddings()
+    vectors = embed_with_journal(IndexJournal(str(tmp_path)), ids, texts, embeddings, checkpoint_size=10)
+
+    assert embeddings.texts == texts[30:]
+    np.testing.assert_allclose(vectors, DeterministicFakeEmbedding(size=8).embed_documents(texts), rtol=1e-6)
+
+
+def test_texte_modifie_re_encode(tmp_path):
+    ids, texts = corpus(10)
+    embed_with_journal(IndexJournal(str(tmp_path)), ids, texts, CountingEmbeddings())
+    texts[4] = "chunk modifié"
+    embeddings = CountingEmbeddings()
+    embed_with_journal(IndexJournal(str(tmp_path)), ids, texts, embeddings)
+    assert embeddings.texts == ["chunk modifié"]
+
+
+def test_ligne_tronquee_et_shard_orphelin(tmp_path):
+    ids, texts = corpus(30)
+    with pytest.raises(Interrupted):
+        embed_with_journal(IndexJournal(str(tmp_path)), ids, texts, CountingEmbeddings(fail_after=2),
+                           checkpoint_size=10)
+    # Arrêt brutal pendant le 3e lot : shard .tmp à moitié écrit, manifeste tronqué
+    (tmp_path / "shard_00002.npy.tmp").write_bytes(b"\x93NUMPY")
+    manifest = tmp_path / IndexJournal.MANIFEST
+    lines = manifest.read_text(encoding="utf-8").splitlines(keepends=True)
+    manifest.write_text(lines[0] + lines[1][:25], encoding="utf-8")
+
+    journal = IndexJournal(str(tmp_path))
+    assert len(journal) == 10
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+    embeddings = CountingEmbeddings()
+    vectors = embed_with_journal(journal, ids, texts, embeddings, checkpoint_size=10)
+    assert embeddings.texts == texts[10:]
+    assert vectors.shape == (30, 8)
+
+    # Les lots ajoutés après la ligne tronquée sont bien relus
+    assert len(IndexJournal(str(tmp_path))) == 30
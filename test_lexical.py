@@ -0,0 +1,83 @@
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding import build_vectorstore
+from lexical import LEXICAL_DIR, LexicalIndex, tokenize
+from retrieval import reciprocal_rank_fusion, search_events_hybrid
+from vector_storage import load_vectorstore, save_vectorstore
+
+EVENTS = [
+    ("zadkine", "Sculptures en bois et en bronze dans l'atelier du sculpteur.", "Musée Zadkine",
+     "100 bis rue d'Assas"),
+    ("musique", "Concerts gratuits dans toute la ville pour la Fête de la musique.", "Parvis de l'Hôtel de Ville",
+     "place de l'Hôtel de Ville"),
+    ("jazz", "Concert de jazz en plein air, entrée libre.", "Parc Floral", "route de la Pyramide"),
+    ("poterie", "Atelier de poterie pour les enfants de 6 à 10 ans.", "Maison des ateliers", "12 rue de Rivoli"),
+] + [
+    (f"autre-{i}", f"Visite commentée numéro {i} du quartier.", f"Lieu {i}", f"{i} avenue de France")
+    for i in range(20)
+]
+
+
+def index(tmp_path):
+    ids, texts, metadatas = [], [], []
+    for event_id, text, lieu, adresse in EVENTS:
+        ids.append(f"{event_id}:0")
+        texts.append(text)
+        metadatas.append({"id": event_id, "title": event_id, "location_name": lieu,
+                          "location_address": adresse})
+    embeddings = DeterministicFakeEmbedding(size=16)
+    vectorstore = build_vectorstore(texts, embeddings.embed_documents(texts), metadatas, ids, embeddings)
+    save_vectorstore(str(tmp_path), vectorstore)
+    return (load_vectorstore(str(tmp_path), embeddings), LexicalIndex(str(tmp_path / LEXICAL_DIR)),
+            embeddings)
+
+
+def test_termes_sans_accents_ni_mots_vides():
+    assert tokenize("La Fête de la Musique, ce week-end au 12 rue d'Assas") == [
+        "fete", "musique", "12", "rue", "assas"]
+
+
+def test_bm25_trouve_le_lieu_et_l_adresse(tmp_path):
+    _, lexical, _ = index(tmp_path)
+
+    hits = lexical.search("musée zadkine")
+    assert hits["positions"][0] == 0
+    assert lexical.confident(hits)
+
+    hits = lexical.search("rue de Rivoli")
+    assert hits["positions"][0] == 3
+    assert lexical.confident(hits)
+
+    assert lexical.search("zadkine", ids=np.array([1, 2]))["positions"].tolist() == []
+
+
+def test_question_ouverte_non_servie_par_bm25_seul(tmp_path):
+    _, lexical, _ = index(tmp_path)
+
+    assert not lexical.confident(lexical.search("que faire avec des enfants un dimanche pluvieux"))
+    assert not lexical.confident(lexical.search("musée inconnu"))
+
+
+def test_chemin_rapide_sans_embedding(tmp_path):
+    vectorstore, lexical, embeddings = index(tmp_path)
+    calls = []
+
+    def embed_query(text):
+        calls.append(text)
+        return embeddings.embed_query(text)
+
+    results, query_vector = search_events_hybrid(vectorstore, "Musée Zadkine", embed_query, lexical)
+    assert query_vector is None and calls == []
+    assert results[0][0].metadata["id"] == "zadkine"
+
+    question = "des concerts gratuits ou du jazz pour toute la famille"
+    results, query_vector = search_events_hybrid(vectorstore, question, embed_query, lexical, k=4)
+    assert query_vector is not None and len(calls) == 1
+    assert {"jazz", "musique"} <= {doc.metadata["id"] for doc, _ in results}
+
+
+def test_fusion_par_rang_reciproque():
+    fused = reciprocal_rank_fusion([[3, 1, 2], [1, 4]], rrf_k=60)
+    assert [position for position, _ in fused] == [1, 3, 4, 2]
+    assert fused[0][1] == 1 / 62 + 1 / 61
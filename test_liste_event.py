@@ -0,0 +1,172 @@
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from dataset import read_events
+from liste_event import fetch_and_clean, stream_and_clean, sync_events
+from validation import Validator
+
+N_EVENTS = 6000
+
+
+def synthetic_export(n=N_EVENTS):
+    """Export OpenAgenda synthétique : HTML, URL, doublons, colonne et lignes vides."""
+    lines = ["Identifiant;Titre;Description;Lien;Ville;Colonne vide"]
+    for i in range(n):
+        lines.append(f"{i};<b>Concert N°{i}</b>;\"Musique &amp; <i>Danse</i> au parc {i % 37}\";"
+                     f"https://example.org/Event/{i};Paris;")
+        if i % 50 == 0:
+            lines.append(lines[-1])  # doublon exact, parfois dans le paquet suivant
+        if i % 700 == 0:
+            lines.append(";;;;;")
+    lines.append(lines[1])  # doublon très éloigné de l'original
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+@contextmanager
+def serve_export(body):
+    """Sert `body` (bytes, ou fonction du chemin demandé -> bytes)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            payload = body(self.path) if callable(body) else body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            for start in range(0, len(payload), 8192):
+                self.wfile.write(payload[start:start + 8192])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/export.csv"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_flux_par_paquets_identique_au_mode_en_memoire(tmp_path):
+    with serve_export(synthetic_export()) as url:
+        fetch_and_clean(url, {}, str(tmp_path / "memoire.csv"))
+        stats = stream_and_clean(url, {}, str(tmp_path / "flux.csv"), chunksize=500)
+
+    expected = pd.read_csv(tmp_path / "memoire.csv", sep=";", dtype=str)
+    streamed = pd.read_csv(tmp_path / "flux.csv", sep=";", dtype=str)
+
+    assert stats["chunks"] > 10
+    assert "Colonne vide" not in streamed.columns
+    assert len(streamed) == N_EVENTS == stats["rows_written"]
+    pd.testing.assert_frame_equal(streamed, expected)
+    assert streamed.loc[0, "Identifiant"] == "0"
+    assert streamed.loc[0, "Titre"] == "concert n°0"
+    assert streamed.loc[0, "Description"] == "musique & danse au parc 0"
+    assert streamed.loc[0, "Lien"] == "https://example.org/Event/0"
+    assert not (tmp_path / "flux.csv.part").exists()
+
+
+def test_erreur_api_sans_fichier_produit(tmp_path):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(503)
+            self.end_headers()
+            self.wfile.write(b"indisponible")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        assert stream_and_clean(url, {}, str(tmp_path / "flux.csv")) is None
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not (tmp_path / "flux.csv").exists()
+
+
+def export(rows):
+    header = "Identifiant;Titre;Première date - Début;Ville"
+    return ("\n".join([header] + [";".join(row) for row in rows]) + "\n").encode("utf-8")
+
+
+def test_synchronisation_incrementale(tmp_path):
+    now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    exports = {
+        "complet": export([
+            ("1", "Concert", "2025-05-01T20:00:00+00:00", "Paris"),
+            ("2", "Expo", "2024-06-20T10:00:00+00:00", "Paris"),
+            ("3", "Théâtre", "2025-04-01T20:00:00+00:00", "Paris"),
+        ]),
+        "delta": export([
+            ("1", "Concert", "2025-05-01T20:00:00+00:00", "Paris"),     # inchangé
+            ("3", "<b>Théâtre</b> complet", "2025-04-01T20:00:00+00:00", "Paris"),
+            ("4", "Atelier", "2025-06-10T14:00:00+00:00", "Paris"),
+        ]),
+    }
+    requested = []
+
+    def body(path):
+        requested.append(path)
+        return exports["delta" if "updatedat" in path else "complet"]
+
+    paths = dict(output=str(tmp_path / "evenements.parquet"), state_path=str(tmp_path / "etat.json"),
+                 changes_path=str(tmp_path / "changes.json"))
+    with serve_export(body) as url:
+        first = sync_events(url, now=now, **paths)
+        second = sync_events(url, now=now + timedelta(days=30), **paths)
+
+    assert first["full"] and first["added"] == ["1", "2", "3"]
+    assert "updatedat" not in requested[0] and "updatedat" in requested[1]
+
+    # L'expo (début le 20/06/2024) a plus d'un an à la seconde synchronisation
+    assert not second["full"]
+    assert second == {**second, "added": ["4"], "updated": ["3"], "removed": ["2"]}
+    with open(paths["changes_path"], encoding="utf-8") as f:
+        assert json.load(f) == second
+
+    df = read_events(paths["output"]).set_index("Identifiant")
+    assert sorted(df.index) == ["1", "3", "4"]
+    assert df.loc["3", "Titre"] == "théâtre complet"
+    assert df.loc["4", "Première date - Début"] == pd.Timestamp("2025-06-10T14:00:00Z")
+    with open(paths["state_path"], encoding="utf-8") as f:
+        assert sorted(json.load(f)["hashes"]) == ["1", "3", "4"]
+
+
+def test_flux_vers_parquet_type(tmp_path):
+    with serve_export(synthetic_export(n=1200)) as url:
+        stream_and_clean(url, {}, str(tmp_path / "flux.parquet"), chunksize=500)
+        fetch_and_clean(url, {}, str(tmp_path / "memoire.parquet"))
+
+    streamed = read_events(str(tmp_path / "flux.parquet"))
+    assert len(streamed) == 1200
+    assert pd.api.types.is_string_dtype(streamed["Identifiant"])
+    assert "Colonne vide" not in streamed.columns
+    pd.testing.assert_frame_equal(streamed, read_events(str(tmp_path / "memoire.parquet")))
+
+
+def test_validation_au_fil_du_flux(tmp_path):
+    now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    body = export([
+        ("1", "Concert", "2025-05-01T20:00:00+00:00", "Paris"),
+        ("2", "Expo", "2025-05-02T10:00:00+00:00", "Paris"),
+        ("1", "Concert reporté", "2025-05-08T20:00:00+00:00", "Paris"),  # même identifiant
+        ("3", "Théâtre", "pas une date", "Lyon"),
+    ])
+    validator = Validator(now=now)
+    with serve_export(body) as url:
+        stream_and_clean(url, {}, str(tmp_path / "flux.csv"), chunksize=2, validator=validator)
+
+    assert validator.rows == 4 and validator.chunks == 2
+    assert {rule: count for rule, count in validator.violations.items() if count} == {
+        "requis:Description": 4, "doublon:Identifiant": 1, "type:Première date - Début": 1, "ville_paris": 1,
+    }
+    assert validator.examples["doublon:Identifiant"] == ["1"]
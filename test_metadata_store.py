@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from date_filter import DateIndex
+from dedup import dedup_documents
+from embedding import build_vectorstore
+from metadata_store import STORE_DIR, MetadataStore
+from vector_storage import load_vectorstore, save_vectorstore
+
+VISITE = "visite guidée du palais garnier, grand escalier et foyer de la danse"
+
+
+def event(event_id, text, lieu="palais garnier", debut="2024-06-01t10:00:00+00:00"):
+    return Document(page_content=text, metadata={
+        "id": event_id, "title": f"événement {event_id}", "firstdate_begin": debut,
+        "lastdate_end": "2024-06-30t18:00:00+00:00", "location_name": lieu,
+        "location_address": "place de l'opéra", "content_hash": f"h{event_id}",
+    })
+
+
+def index(tmp_path):
+    documents = [
+        event("1", VISITE),
+        event("2", VISITE, debut="2024-06-08t10:00:00+00:00"),
+        event("3", "atelier de poterie", lieu="maison des ateliers"),
+        event("4", "concert de jazz, entrée libre"),
+    ]
+    documents, ids, _ = dedup_documents(documents, ["1:0", "2:0", "3:0", "4:0"])
+    embeddings = DeterministicFakeEmbedding(size=8)
+    texts = [doc.page_content for doc in documents]
+    vectorstore = build_vectorstore(texts, embeddings.embed_documents(texts),
+                                    [doc.metadata for doc in documents], ids, embeddings)
+    save_vectorstore(str(tmp_path), vectorstore)
+    return vectorstore, embeddings
+
+
+def test_documents_relus_a_l_identique(tmp_path):
+    vectorstore, embeddings = index(tmp_path)
+    loaded = load_vectorstore(str(tmp_path), embeddings)
+
+    assert isinstance(loaded.docstore, MetadataStore)
+    assert not os.path.exists(tmp_path / "index.pkl")
+    for position, doc_id in vectorstore.index_to_docstore_id.items():
+        expected = vectorstore.docstore.search(doc_id)
+        found = loaded.docstore.search(loaded.index_to_docstore_id[position])
+        assert found.page_content == expected.page_content
+        assert found.metadata == expected.metadata
+    assert [m["chunk_id"] for m in loaded.docstore.search(0).metadata["members"]] == ["2:0"]
+
+
+def test_valeurs_repetees_stockees_une_fois(tmp_path):
+    index(tmp_path)
+    store = MetadataStore(str(tmp_path / STORE_DIR))
+
+    assert len(store.values["location_address"]) == 1
+    assert len(store.values["location_name"]) == 2
+    assert isinstance(store.codes["location_name"], np.memmap)
+    assert list(store.codes["location_name"]) == [0, 0, 1, 0]
+
+
+def test_docstore_modifiable_et_index_des_dates(tmp_path):
+    vectorstore, embeddings = index(tmp_path)
+    writable = load_vectorstore(str(tmp_path), embeddings, mmap=False, writable=True)
+
+    assert writable.index_to_docstore_id == vectorstore.index_to_docstore_id
+    writable.delete(["3:0"])
+    assert list(writable.index_to_docstore_id.values()) == ["1:0", "4:0"]
+
+    lazy = load_vectorstore(str(tmp_path), embeddings)
+    expected = DateIndex.from_vectorstore(vectorstore)
+    found = DateIndex.from_vectorstore(lazy)
+    assert found.begin.tolist() == expected.begin.tolist()
+    assert found.ids.tolist() == expected.ids.tolist()
@@ -0,0 +1,51 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from normalisation import normalize_dataframe, normalize_text, normalize_text_reference
+
+FRAGMENTS = [
+    "<b>", "</b>", "<p>", "</p>", "<br>", "<br/>", "</br>", "<img src='a>b'>", "</hr>", "<P>", "</ p>",
+    "<a href='https://x.fr'>", "</a>", "<i", "< b>", "<3", "a < b", "x>y", "<!-- note -->", "<script>x</script>",
+    "&amp;", "&amp", "&nbsp;", "&eacute;", "&#39;", "&#x41;", "&#65", "&#65x;", "&#xZZ;", "&foo;", "& ", "&#128;",
+    "&notit;", "Concert", " ÉTÉ ", "Musée", "  ", "\n", "\r\n", "\t", "\xa0", "Ça", "İ", "https://x.fr", "\"",
+]
+
+
+def reference_sample(n=5000, seed=0):
+    rng = random.Random(seed)
+    sample = ["", "   ", "https://opendata.paris.fr/Event", " http://A.fr <b>x</b>", "Jardin du Palais-Royal",
+              "<p>Entrée <strong>libre</strong> &amp; gratuite</p>", "Concert<br>sous<br/>casque</br>!"]
+    for _ in range(n):
+        sample.append("".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 10))))
+    return sample
+
+
+def test_identique_a_la_reference_beautifulsoup():
+    for text in reference_sample():
+        assert normalize_text(text) == normalize_text_reference(text), repr(text)
+    for value in (None, np.nan, 12, 3.5):
+        expected = normalize_text_reference(value)
+        assert normalize_text(value) is expected or normalize_text(value) == expected
+
+
+def test_dataframe_identique_octet_pour_octet(tmp_path):
+    sample = reference_sample(n=1500, seed=1)
+    rng = random.Random(2)
+    df = pd.DataFrame({
+        "Titre": sample,
+        "Nom du lieu": [rng.choice(["<b>Musée</b> Zadkine", "Mairie du 9e", None]) for _ in sample],
+        "Nombre": range(len(sample)),
+    })
+    expected = df.copy()
+    for col in expected.select_dtypes(include=["object", "string"]):
+        expected[col] = expected[col].map(normalize_text_reference)
+
+    with ProcessPoolExecutor(2) as executor:
+        normalized = normalize_dataframe(df.copy(), executor=executor, min_parallel=100)
+
+    expected.to_csv(tmp_path / "reference.csv", sep=";", index=False)
+    normalized.to_csv(tmp_path / "rapide.csv", sep=";", index=False)
+    assert (tmp_path / "rapide.csv").read_bytes() == (tmp_path / "reference.csv").read_bytes()
@@ -0,0 +1,77 @@
+import query_cache
+from query_cache import CachingQueryEmbeddings, LRUCache, SemanticAnswerCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalisation_des_requetes():
+    assert normalize_query("  Expo   PHOTO !") == normalize_query("expo photo") == "expo photo"
+    assert normalize_query("L’atelier d'Assas ?") == "l’atelier d'assas"
+    assert normalize_query("ｅｘｐｏ") == "expo"  # NFKC
+
+
+def test_lru_evince_la_plus_ancienne_utilisation():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" redevient la plus récente
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {"hits": 3, "misses": 1, "hit_rate": 0.75, "size": 2}
+
+
+def test_expiration_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.put("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1 and cache.values() == [1]
+    clock.now += 2
+    assert cache.values() == []
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_embedding_de_requete_partage_entre_formes_equivalentes():
+    inner = CountingEmbeddings()
+    embeddings = CachingQueryEmbeddings(inner)
+    assert embeddings.embed_query("Expo photo") == embeddings.embed_query("expo   photo !")
+    assert inner.calls == ["Expo photo"]
+    assert embeddings.stats()["hits"] == 1
+
+
+def test_reponse_reutilisee_si_proche_et_memes_evenements():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("concert de jazz", [1.0, 0.0], ["e1", "e2"], "réponse jazz")
+
+    assert cache.lookup([0.99, 0.05], ["e1", "e2"]) == "réponse jazz"
+    # Mêmes événements dans un autre ordre, ou autres événements : pas de réutilisation
+    assert cache.lookup([0.99, 0.05], ["e2", "e1"]) is None
+    assert cache.lookup([1.0, 0.0], ["e1"]) is None
+    # Question trop éloignée (cosinus ~0.71 < 0.95)
+    assert cache.lookup([1.0, 1.0], ["e1", "e2"]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+
+def test_meilleure_reponse_au_dessus_du_seuil():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("a", [1.0, 0.3], ["e1"], "moins proche")
+    cache.store("b", [1.0, 0.05], ["e1"], "plus proche")
+    assert cache.lookup([1.0, 0.0], ["e1"]) == "plus proche"
@@ -0,0 +1,32 @@
+from langchain_core.documents import Document
+
+from embedding_engine import estimate_tokens
+from retrieval import group_by_event
+
+
+def chunk(event_id, text):
+    return Document(page_content=text, metadata={"id": event_id, "title": f"événement {event_id}"})
+
+
+def test_regroupe_les_chunks_par_evenement():
+    results = [
+        (chunk("palais-royal", "concerts gratuits."), 0.1),
+        (chunk("palais-royal", "concert sous casque."), 0.2),
+        (chunk("notre-dame", "chants traditionnels."), 0.3),
+        (chunk("palais-royal", "concerts gratuits."), 0.35),
+        (chunk("open-air", "garden party."), 0.4),
+    ]
+    events = group_by_event(results, k=4, token_budget=700)
+
+    assert [doc.metadata["id"] for doc, _ in events] == ["palais-royal", "notre-dame", "open-air"]
+    assert events[0][0].page_content == "concerts gratuits. […] concert sous casque."
+    assert [score for _, score in events] == [0.1, 0.3, 0.4]
+
+
+def test_budget_de_tokens_respecte_avec_k_evenements_distincts():
+    long_text = "phrase assez longue pour occuper le budget. " * 11
+    results = [(chunk(str(i // 3), long_text + str(i)), i / 10) for i in range(15)]
+    events = group_by_event(results, k=4, token_budget=700)
+
+    assert len({doc.metadata["id"] for doc, _ in events}) == 4
+    assert sum(estimate_tokens(doc.page_content) for doc, _ in events) <= 700
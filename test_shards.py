@@ -0,0 +1,144 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from date_filter import PARIS, parse_date_window
+from embedding import load_indexes, write_shards
+from index_journal import IndexJournal
+from index_types import index_kind
+from shards import (
+    SHARD_MANIFEST, UNDATED_SHARD, expire_shards, merge_lexical, merge_ranked, open_index, read_manifest,
+    shard_key, write_manifest,
+)
+
+NOW = datetime(2024, 6, 10, 12, tzinfo=PARIS)
+
+
+def event(i, text, end, begin="2024-06-01t10:00:00"):
+    return Document(page_content=text, metadata={
+        "id": str(i), "title": text, "firstdate_begin": begin, "lastdate_end": end,
+        "content_hash": f"h{i}-{end}",
+    })
+
+
+EVENTS = [
+    event(1, "concert de jazz au sunset", "2024-06-15t22:00:00"),
+    event(2, "exposition de photographie", "2024-06-30t18:00:00"),
+    event(3, "festival de jazz en plein air", "2024-07-20t23:00:00", begin="2024-07-18t18:00:00"),
+    event(4, "visite guidée du marais", "2024-08-03t12:00:00", begin="2024-08-03t10:00:00"),
+    event(5, "atelier de poterie", ""),
+    event(6, "brocante de printemps", "2024-05-12t18:00:00", begin="2024-05-12t08:00:00"),
+]
+
+
+def build(index_dir, documents, embeddings, journal, existing=None, scope=None, **options):
+    ids = [f"{doc.metadata['id']}:0" for doc in documents]
+    entries = write_shards(str(index_dir), documents, ids, existing or {}, embeddings, journal, scope,
+                           now=NOW, **options)
+    write_manifest(str(index_dir), entries)
+    return entries
+
+
+def test_un_shard_par_mois_de_fin():
+    assert shard_key(EVENTS[0].metadata) == "2024-06"
+    assert shard_key(EVENTS[2].metadata) == "2024-07"
+    assert shard_key(EVENTS[4].metadata) == UNDATED_SHARD
+
+
+def test_fusion_par_tas_des_classements():
+    rankings = [(np.array([0.1, 0.5, 0.9]), np.array([3, 1, -1])), (np.array([0.2, 0.3]), np.array([7, 2]))]
+    assert merge_ranked(rankings, 4) == [(0.1, (0, 3)), (0.2, (1, 7)), (0.3, (1, 2)), (0.5, (0, 1))]
+    bm25 = [(np.array([5.0, 1.0]), np.array([0, 4])), (np.array([3.0]), np.array([2]))]
+    assert [key for _, key in merge_ranked(bm25, 10, descending=True)] == [(0, 0), (1, 2), (0, 4)]
+
+
+def test_fusion_bm25_par_rang():
+    class Shard:
+        def __init__(self, confident):
+            self.lexical = self
+            self.is_confident = confident
+
+        def confident(self, hits):
+            return self.is_confident
+
+    # Scores BM25 d'un petit shard (idf élevé) : non comparables à ceux du grand
+    per_shard = [
+        {"scores": np.array([1.2, 1.1, 1.0]), "positions": np.array([4, 2, 7])},
+        {"scores": np.array([9.0, 8.0]), "positions": np.array([0, 1])},
+    ]
+    selected = [("2024-06", Shard(True), None), ("2024-07", Shard(True), None)]
+    assert [key for _, key in merge_lexical(selected, per_shard, 4)] == [(0, 4), (1, 0), (0, 2), (1, 1)]
+    # À rang égal, un shard sûr de son classement passe devant
+    selected[0][1].is_confident = False
+    assert [key for _, key in merge_lexical(selected, per_shard, 2)] == [(1, 0), (0, 4)]
+
+
+def test_recherche_limitee_aux_shards_de_la_periode(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    entries = build(tmp_path, EVENTS, embeddings, IndexJournal(str(tmp_path / "journal")))
+
+    # Mai est écoulé : pas de shard
+    assert sorted(entries) == ["2024-06", "2024-07", "2024-08", UNDATED_SHARD]
+    assert read_manifest(str(tmp_path)) == entries
+    assert not os.path.exists(tmp_path / "2024-05")
+
+    index = open_index(str(tmp_path), embeddings)
+    assert index.ntotal == 5
+    selected, _ = index.select(parse_date_window("que faire ce mois-ci ?", NOW))
+    assert [name for name, _, _ in selected] == ["2024-06", UNDATED_SHARD]
+
+    results, _, mode = index.search("un concert de jazz ce mois-ci", k=4, now=NOW)
+    assert {doc.metadata["id"] for doc, _ in results} <= {"1", "2", "5"}
+    assert mode in ("lexical", "hybrid")
+
+    # Sans période : tous les shards à venir, le festival de juillet compris
+    results, query_vector, mode = index.search("jazz plein air festival", k=4, now=NOW)
+    assert "3" in [doc.metadata["id"] for doc, _ in results]
+
+
+def test_expiration_supprime_un_shard(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    build(tmp_path, EVENTS, embeddings, IndexJournal(str(tmp_path / "journal")))
+
+    assert expire_shards(str(tmp_path), now=datetime(2024, 7, 2, tzinfo=PARIS)) == ["2024-06"]
+    assert not os.path.exists(tmp_path / "2024-06")
+    assert sorted(read_manifest(str(tmp_path))) == ["2024-07", "2024-08", UNDATED_SHARD]
+    index = open_index(str(tmp_path), embeddings)
+    assert index.ntotal == 3
+
+
+def test_mise_a_jour_deplace_un_evenement_de_mois(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    journal = IndexJournal(str(tmp_path / "journal"))
+    build(tmp_path, EVENTS, embeddings, journal)
+    untouched = os.stat(tmp_path / "2024-08" / "index.faiss").st_mtime_ns
+
+    # Le concert est prolongé jusqu'en juillet : seuls les shards concernés sont réécrits
+    moved = event(1, "concert de jazz au sunset", "2024-07-05t22:00:00")
+    existing = load_indexes(str(tmp_path), embeddings)
+    entries = build(tmp_path, [moved], embeddings, journal, existing=existing, scope={"1"})
+
+    assert (entries["2024-06"]["vectors"], entries["2024-07"]["vectors"]) == (1, 2)
+    assert os.stat(tmp_path / "2024-08" / "index.faiss").st_mtime_ns == untouched
+    assert os.path.exists(tmp_path / SHARD_MANIFEST)
+    index = open_index(str(tmp_path), embeddings)
+    july = index.shards["2024-07"].vectorstore
+    assert sorted(july.docstore.search(doc_id).metadata["id"] for doc_id in july.index_to_docstore_id.values()) \
+        == ["1", "3"]
+
+
+@pytest.mark.parametrize("options, kind", [({"index_type": "ivfpq"}, "sq8"), ({"index_type": "ivf", "nlist": 16}, "ivf")])
+def test_petits_shards_compresses(tmp_path, options, kind):
+    # Deux chunks au plus par shard : pas assez pour 256 centroïdes PQ ni 16 listes IVF
+    embeddings = DeterministicFakeEmbedding(size=16)
+    entries = build(tmp_path, EVENTS, embeddings, IndexJournal(str(tmp_path / "journal")), **options)
+
+    assert sum(entry["vectors"] for entry in entries.values()) == 5
+    existing = load_indexes(str(tmp_path), embeddings)
+    assert {index_kind(vectorstore.index) for vectorstore in existing.values()} == {kind}
+    results, _, _ = open_index(str(tmp_path), embeddings).search("festival de jazz en plein air", k=2, now=NOW)
+    assert results
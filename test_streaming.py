@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from fake_mistral import DEFAULT_REPLY, serve_in_thread
+from streaming import StreamingReply
+
+mistralai = pytest.importorskip("mistralai")
+from mistralai.client import MistralClient
+from mistralai.models.chat_completion import ChatMessage
+
+
+def stream_from(url, prompt="Je cherche une expo photo"):
+    client = MistralClient(api_key="test", endpoint=url, max_retries=0)
+    return client.chat_stream(model="mistral-medium", messages=[ChatMessage(role="user", content=prompt)])
+
+
+def test_reponse_complete_et_mesures():
+    with serve_in_thread(token_latency=0.01) as (url, _):
+        with StreamingReply(stream_from(url)) as reply:
+            partials = list(reply)
+
+    assert reply.text == DEFAULT_REPLY
+    assert partials[-1] == DEFAULT_REPLY and len(partials) > 1
+    assert not reply.metrics.cancelled
+    assert 0 < reply.metrics.ttft <= reply.metrics.total
+    assert reply.metrics.usage["completion_tokens"] == len(DEFAULT_REPLY.split())
+
+
+def test_annulation_arrete_la_generation():
+    cancel = threading.Event()
+    with serve_in_thread(token_latency=0.05) as (url, _):
+        with StreamingReply(stream_from(url), cancel) as reply:
+            for n, _ in enumerate(reply):
+                if n == 2:
+                    cancel.set()
+
+    assert reply.metrics.cancelled
+    assert 0 < len(reply.text) < len(DEFAULT_REPLY)
+    assert reply.metrics.total < 0.05 * len(DEFAULT_REPLY.split())
+
+
+def test_sortie_anticipee_ferme_le_flux():
+    class Interruption(BaseException):
+        pass
+
+    with serve_in_thread(token_latency=0.05) as (url, _):
+        with pytest.raises(Interruption):
+            with StreamingReply(stream_from(url)) as reply:
+                for _ in reply:
+                    raise Interruption
+
+    assert reply.metrics.cancelled
+    assert reply.metrics.total is not None
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from tracing import Tracer
+
+
+def test_spans_journalises_en_jsonl(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path))
+    with tracer.trace("chat", query_chars=12) as trace:
+        with trace.span("embed_query"):
+            pass
+        with trace.span("prompt") as span:
+            span.set(prompt_bytes=2048)
+        trace.set(retrieval="hybrid")
+
+    record = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    assert record["attrs"] == {"query_chars": 12, "retrieval": "hybrid"}
+    assert [s["name"] for s in record["spans"]] == ["embed_query", "prompt"]
+    assert record["spans"][1]["attrs"] == {"prompt_bytes": 2048}
+    assert record["duration_ms"] >= record["spans"][1]["duration_ms"]
+
+
+def test_exception_enregistree_puis_propagee():
+    tracer = Tracer(None)
+    with pytest.raises(ValueError):
+        with tracer.trace("chat") as trace:
+            with trace.span("vector_search"):
+                raise ValueError("index absent")
+
+    record = tracer.recent()[0]
+    assert record["error"] == "ValueError: index absent"
+    assert record["spans"][0]["error"] == "ValueError: index absent"
+    assert "Traceback" in record["traceback"]
+    assert tracer.stats()["chat.vector_search"]["errors"] == 1
+
+
+def test_percentiles_par_etape():
+    tracer = Tracer(None, window=100)
+    for _ in range(150):
+        with tracer.trace("chat") as trace:
+            with trace.span("chat_completion"):
+                pass
+
+    stats = tracer.stats()
+    assert stats["chat"]["count"] == 150
+    assert set(stats["chat.chat_completion"]) == {"count", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms"}
+    assert stats["chat.chat_completion"]["p50_ms"] <= stats["chat.chat_completion"]["p99_ms"]
+
+
+def test_rotation_du_journal(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), max_bytes=2000, backup_count=2)
+    for i in range(50):
+        with tracer.trace("chat", padding="x" * 100):
+            pass
+
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert not (tmp_path / "traces.jsonl.3").exists()
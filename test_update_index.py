@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding import build_vectorstore, update_index
+from index_journal import IndexJournal
+from index_types import INDEX_TYPES, index_kind, set_search_params
+
+N = 1000
+
+
+def event(i, version=0):
+    return Document(page_content=f"événement numéro {i}, version {version}",
+                    metadata={"id": str(i), "content_hash": f"h-{i}-{version}"})
+
+
+def aligned(vectorstore, embeddings):
+    """Part des chunks retrouvés en tête par leur propre vecteur."""
+    positions = sorted(vectorstore.index_to_docstore_id)
+    ids = [vectorstore.index_to_docstore_id[p] for p in positions]
+    texts = [vectorstore.docstore.search(doc_id).page_content for doc_id in ids]
+    queries = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    _, found = vectorstore.index.search(queries, 1)
+    return np.mean([vectorstore.index_to_docstore_id.get(int(p)) == doc_id
+                    for p, doc_id in zip(found[:, 0], ids)])
+
+
+@pytest.mark.parametrize("kind", INDEX_TYPES)
+def test_mise_a_jour_incrementale_garde_l_index_aligne(tmp_path, kind):
+    embeddings = DeterministicFakeEmbedding(size=32)
+    documents = [event(i) for i in range(N)]
+    ids = [f"{i}:0" for i in range(N)]
+    texts = [doc.page_content for doc in documents]
+    vectorstore = build_vectorstore(texts, embeddings.embed_documents(texts),
+                                    [doc.metadata for doc in documents], ids, embeddings,
+                                    index_type=kind, pq_m=8)
+
+    # Un événement modifié, un supprimé
+    documents[500] = event(500, version=1)
+    del documents[10], ids[10]
+    stats = update_index(vectorstore, documents, ids, embeddings,
+                         IndexJournal(str(tmp_path / "journal")), dedup_threshold=None)
+
+    assert (stats["updated"], stats["deleted"]) == (1, 1)
+    assert index_kind(vectorstore.index) == kind
+    assert vectorstore.index.ntotal == len(vectorstore.index_to_docstore_id) == N - 1
+    set_search_params(vectorstore.index, nprobe=10_000, ef_search=256)
+    # IVF-PQ : vecteurs approchés, le voisin le plus proche n'est pas toujours exact
+    assert aligned(vectorstore, embeddings) >= (0.9 if kind == "ivfpq" else 1.0)
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from dataset import to_typed, write_events
+from validation import RULES, SeenHashes, Validator, validate_file
+
+NOW = datetime(2024, 6, 10, tzinfo=timezone.utc)
+
+
+def events(n=20):
+    return pd.DataFrame({
+        "Identifiant": [str(i) for i in range(n)],
+        "Description": [f"concert {i}" for i in range(n)],
+        "Ville": ["paris"] * n,
+        "Première date - Début": ["2024-06-01t10:00:00+00:00"] * n,
+        "Dernière date - Fin": ["2024-06-02t10:00:00+00:00"] * n,
+    })
+
+
+def broken():
+    df = events()
+    df.loc[1, "Identifiant"] = None
+    df.loc[2, "Description"] = "  "
+    df.loc[3, "Première date - Début"] = "demain soir"
+    df.loc[4, "Dernière date - Fin"] = "2024-05-01t10:00:00+00:00"
+    df.loc[5, "Identifiant"] = "0"
+    df.loc[6, "Ville"] = "lyon"
+    df.loc[7, ["Première date - Début", "Dernière date - Fin"]] = "2022-01-01t10:00:00+00:00"
+    return df
+
+
+def violations(validator):
+    return {rule: count for rule, count in validator.violations.items() if count}
+
+
+def test_chaque_regle_detectee():
+    validator = Validator(now=NOW)
+    ok = validator.feed(broken())
+
+    assert violations(validator) == {
+        "requis:Identifiant": 1, "requis:Description": 1, "type:Première date - Début": 1,
+        "ordre_des_dates": 1, "doublon:Identifiant": 1, "ville_paris": 1, "debut_recent": 1,
+    }
+    assert validator.examples["requis:Identifiant"] == ["ligne 2"]
+    assert validator.examples["doublon:Identifiant"] == ["0"]
+    assert list(np.flatnonzero(~ok)) == [1, 2, 3, 4, 5, 6, 7]
+    assert not validator.valid
+
+
+def test_valide_sans_violation():
+    validator = Validator(now=NOW)
+    assert validator.feed(events()).all()
+    assert validator.valid
+
+
+def test_colonne_requise_absente():
+    validator = Validator(now=NOW)
+    validator.feed(events(3).drop(columns="Description"))
+    assert violations(validator) == {"requis:Description": 3}
+
+
+def test_par_paquets_identique_a_une_seule_passe():
+    df = pd.concat([broken()] * 3, ignore_index=True)
+    whole, chunked = Validator(now=NOW), Validator(now=NOW)
+    whole.feed(df)
+    for start in range(0, len(df), 7):
+        chunked.feed(df.iloc[start:start + 7])
+
+    assert chunked.violations == whole.violations
+    # Les 20 identifiants reviennent deux fois : doublons d'un paquet à l'autre
+    assert whole.violations["doublon:Identifiant"] == 1 + 2 * 19
+    assert chunked.chunks == 9 and chunked.rows == whole.rows == 60
+
+
+def test_colonnes_typees_et_texte_equivalentes(tmp_path):
+    df = broken().drop(index=3)  # une date invalide ne peut pas être typée
+    text, typed = Validator(now=NOW), Validator(now=NOW)
+    text.feed(df)
+    typed.feed(to_typed(df.copy()))
+    assert typed.violations == text.violations
+
+    write_events(df, str(tmp_path / "evenements.parquet"))
+    assert validate_file(str(tmp_path / "evenements.parquet"), chunksize=4, now=NOW).violations \
+        == text.violations
+
+
+def test_empreintes_vues():
+    seen = SeenHashes()
+    for start in range(0, 1000, 100):
+        seen.add(np.arange(start, start + 100, dtype=np.uint64))
+    assert len(seen) == 1000 and len(seen.runs) <= 4
+    assert seen.contains(np.array([0, 999, 1000], dtype=np.uint64)).tolist() == [True, True, False]
+
+
+def test_paquet_vide_entre_deux_paquets():
+    validator = Validator(now=NOW)
+    df = events(3)
+    validator.feed(df.iloc[:2])
+    validator.feed(df.iloc[:0])
+    validator.feed(df.assign(Identifiant=" ").iloc[:1])
+    validator.feed(df.iloc[1:])
+
+    assert validator.violations["doublon:Identifiant"] == 1
+    assert validator.examples["doublon:Identifiant"] == ["1"]
+    assert all(len(run) for run in validator._seen.runs)
+
+
+def test_rapport_compact(tmp_path, capsys):
+    validator = Validator(now=NOW, max_examples=2)
+    validator.feed(pd.concat([broken()] * 3, ignore_index=True))
+    validator.write_report(str(tmp_path / "rapport.json"))
+    report = pd.read_json(tmp_path / "rapport.json", typ="series")
+
+    assert report["rows"] == 60 and not report["valid"]
+    assert set(report["rules"]) == set(RULES)
+    assert report["rules"]["doublon:Identifiant"]["examples"] == ["0", "0"]
+
+    validator.print_report()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("🔎 Validation : 60 ligne(s)")
+    assert len(lines) == 1 + 7
@@ -0,0 +1,39 @@
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding import build_vectorstore
+from index_types import index_kind
+from retrieval import search_by_vector
+from vector_storage import load_full_vectors, load_vectorstore, save_full_vectors, save_vectorstore
+
+
+def corpus(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors, [f"{i}:0" for i in range(n)]
+
+
+def test_index_sq8_re_classe_comme_l_index_exact(tmp_path):
+    vectors, ids = corpus()
+    embeddings = DeterministicFakeEmbedding(size=32)
+    texts = [f"chunk {i}" for i in range(len(ids))]
+    metadatas = [{"id": doc_id.split(":")[0]} for doc_id in ids]
+    exact = build_vectorstore(texts, vectors, metadatas, ids, embeddings, index_type="flat")
+    compact = build_vectorstore(texts, vectors, metadatas, ids, embeddings, index_type="sq8")
+    save_vectorstore(str(tmp_path), compact)
+    save_full_vectors(str(tmp_path), vectors)
+
+    loaded = load_vectorstore(str(tmp_path), embeddings, mmap=True)
+    full_vectors = load_full_vectors(str(tmp_path))
+    assert index_kind(loaded.index) == "sq8"
+    assert isinstance(full_vectors, np.memmap)
+
+    for query in vectors[:20] + 0.1:
+        expected = search_by_vector(exact, query, k=5)
+        found = search_by_vector(loaded, query, k=5, full_vectors=full_vectors)
+        assert [doc.metadata["id"] for doc, _ in found] == [doc.metadata["id"] for doc, _ in expected]
+        np.testing.assert_allclose([d for _, d in found], [d for _, d in expected], rtol=1e-4)
+
+
+def test_pas_de_vecteurs_exacts_pour_un_index_non_compresse(tmp_path):
+    assert load_full_vectors(str(tmp_path)) is None
@@ -0,0 +1,219 @@
+"""
+tracing.py
+
+Traces des requêtes de l'assistant, par étape.
+
+Une trace (une question de l'utilisateur) regroupe des spans : embedding de
+la requête, recherche BM25 / FAISS, assemblage du prompt, génération... Chaque
+span mesure sa durée et porte des attributs (tailles en octets, tokens,
+mode de recherche) ; une exception est enregistrée (type, message, pile)
+puis propagée.
+
+À la fin de la trace :
+- une ligne JSON est écrite dans un journal tournant (`traces.jsonl`, 10 Mo,
+  5 fichiers conservés)
+- la durée de chaque étape alimente un histogramme en mémoire (fenêtre
+  glissante des dernières mesures), dont `stats()` donne p50 / p95 / p99
+
+Usage :
+    with tracer.trace("chat", query_chars=len(question)) as trace:
+        with trace.span("embed_query"):
+            vector = embed(question)
+        with trace.span("chat", prompt_bytes=len(prompt)) as span:
+            ...
+            span.set(completion_tokens=n)
+"""
+
+import json
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+import numpy as np
+
+TRACE_LOG = "traces.jsonl"
+
+
+class Span:
+    """
+    Étape d'une trace.
+
+    Attributs :
+        name (str) : nom de l'étape
+        attrs (dict) : attributs (tailles, tokens...)
+        duration_ms (float) : durée, une fois l'étape terminée
+        error (str) : « Type: message » si l'étape a levé une exception
+    """
+
+    def __init__(self, name, offset_ms, attrs):
+        self.name = name
+        self.offset_ms = offset_ms
+        self.attrs = dict(attrs)
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def as_dict(self):
+        record = {"name": self.name, "offset_ms": round(self.offset_ms, 3),
+                  "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 3)}
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class Trace:
+    """
+    Trace d'une requête : spans successifs ou imbriqués.
+
+    Attributs :
+        trace_id (str) : identifiant de la trace
+        name (str) : type de requête
+        spans (List[Span]) : étapes, dans l'ordre de début
+    """
+
+    def __init__(self, name, attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = dict(attrs)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+        self.duration_ms = None
+        self.error = None
+        self.traceback = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, (time.perf_counter() - self._start) * 1000, attrs)
+        self.spans.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as exc:
+            # Exception (ou arrêt du script Streamlit) : enregistrée puis propagée
+            span.error = f"{type(exc).__name__}: {exc}"
+            if isinstance(exc, Exception) and self.traceback is None:
+                self.traceback = traceback.format_exc()
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+
+    def fail(self, exc):
+        """Enregistre une exception rattrapée par l'appelant (message générique affiché)."""
+        self.error = f"{type(exc).__name__}: {exc}"
+        self.traceback = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+    def as_dict(self):
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "spans": [span.as_dict() for span in self.spans],
+        }
+        if self.error:
+            record["error"] = self.error
+        if self.traceback:
+            record["traceback"] = self.traceback
+        return record
+
+
+class Tracer:
+    """
+    Crée les traces, les écrit dans un JSONL tournant et tient les histogrammes.
+
+    Attributs :
+        path (str) : journal JSONL (None = pas d'écriture)
+        window (int) : nombre de mesures conservées par étape pour les percentiles
+    """
+
+    def __init__(self, path=TRACE_LOG, max_bytes=10_000_000, backup_count=5, window=2000,
+                 recent=50):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._counts = {}
+        self._errors = {}
+        self._recent = deque(maxlen=recent)
+        self._logger = None
+        if path:
+            # Logger propre au fichier : pas de propagation vers la sortie standard
+            self._logger = logging.getLogger(f"tracing.{path}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            if not self._logger.handlers:
+                handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                              encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger.addHandler(handler)
+
+    @contextmanager
+    def trace(self, name, **attrs):
+        trace = Trace(name, attrs)
+        try:
+            yield trace
+        except BaseException as exc:
+            if trace.error is None:
+                trace.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            trace.duration_ms = (time.perf_counter() - trace._start) * 1000
+            self.record(trace)
+
+    def record(self, trace):
+        """Journalise une trace terminée et ajoute ses durées aux histogrammes."""
+        record = trace.as_dict()
+        with self._lock:
+            self._observe(trace.name, trace.duration_ms, trace.error)
+            for span in trace.spans:
+                if span.duration_ms is not None:
+                    self._observe(f"{trace.name}.{span.name}", span.duration_ms, span.error)
+            self._recent.append(record)
+        if self._logger is not None:
+            self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def _observe(self, name, duration_ms, error):
+        if name not in self._durations:
+            self._durations[name] = deque(maxlen=self.window)
+            self._counts[name] = 0
+            self._errors[name] = 0
+        self._durations[name].append(duration_ms)
+        self._counts[name] += 1
+        self._errors[name] += error is not None
+
+    def stats(self):
+        """
+        Percentiles par étape (fenêtre glissante).
+
+        Returns:
+            Dict[str, dict]: count, errors, p50_ms, p95_ms, p99_ms, max_ms
+        """
+        with self._lock:
+            snapshot = {name: (list(values), self._counts[name], self._errors[name])
+                        for name, values in self._durations.items()}
+        stats = {}
+        for name, (values, count, errors) in snapshot.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stats[name] = {"count": count, "errors": errors, "p50_ms": round(float(p50), 2),
+                           "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+                           "max_ms": round(float(max(values)), 2)}
+        return stats
+
+    def recent(self):
+        """Dernières traces (la plus récente en premier)."""
+        with self._lock:
+            return list(reversed(self._recent))
@@ -0,0 +1,299 @@
+"""
+validation.py
+
+Validation des événements au fil de l'ingestion, d'après un schéma déclaré.
+
+Les paquets de lignes (flux CSV de liste_event.py, lots d'un fichier
+Parquet) passent un par un dans un `Validator` : une seule passe, des
+contrôles vectorisés par colonne, et un état borné (compteurs, quelques
+exemples par règle, empreintes des identifiants déjà vus).
+
+Règles :
+- `requis:<colonne>` : colonne présente et valeur renseignée (identifiant,
+  description)
+- `type:<colonne>` : dates au format ISO 8601, textes en chaînes
+- `ordre_des_dates` : Première date - Début ≤ Dernière date - Fin
+- `doublon:Identifiant` : identifiant déjà vu, dans ce paquet ou un précédent
+- `ville_paris` : Ville = Paris
+- `debut_recent` : Première date - Début ≥ il y a un an
+
+Les doublons sont détectés sur une empreinte 64 bits de l'identifiant,
+rangée dans quelques tableaux triés fusionnés par taille (coût amorti
+O(log n) par ligne) : 8 octets par identifiant distinct, quelle que soit la
+taille des lignes.
+
+Le rapport donne, par règle, le nombre de violations et les premiers
+identifiants concernés.
+
+Usage :
+    python validation.py evenements_paris.parquet --json validation_report.json
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from dataset import DATASET_PATH, DATE_COLUMNS, ID_COLUMN, is_parquet
+
+DESCRIPTION_COLUMN = "Description"
+CITY_COLUMN = "Ville"
+BEGIN_COLUMN = "Première date - Début"
+END_COLUMN = "Dernière date - Fin"
+RETENTION = timedelta(days=365)
+MAX_EXAMPLES = 5
+
+# Colonne -> (type attendu, requise)
+SCHEMA = {
+    ID_COLUMN: ("string", True),
+    DESCRIPTION_COLUMN: ("string", True),
+    CITY_COLUMN: ("string", False),
+    **{column: ("datetime", False) for column in DATE_COLUMNS},
+}
+
+RULES = {
+    **{f"requis:{column}": f"{column} renseigné" for column, (_, required) in SCHEMA.items() if required},
+    **{f"type:{column}": f"{column} de type {kind}" for column, (kind, _) in SCHEMA.items()},
+    "ordre_des_dates": f"{BEGIN_COLUMN} ≤ {END_COLUMN}",
+    f"doublon:{ID_COLUMN}": f"{ID_COLUMN} unique",
+    "ville_paris": f"{CITY_COLUMN} = Paris",
+    "debut_recent": f"{BEGIN_COLUMN} ≥ il y a un an",
+}
+
+
+class SeenHashes:
+    """
+    Ensemble d'empreintes 64 bits : tableaux triés, fusionnés deux à deux
+    quand ils atteignent la même taille (au plus log2(n) tableaux).
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, hashes):
+        """Masque des empreintes déjà présentes."""
+        # Requêtes triées : recherches dichotomiques voisines en mémoire
+        order = np.argsort(hashes)
+        queries = hashes[order]
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, queries), len(run) - 1)
+            found[order] |= run[positions] == queries
+        return found
+
+    def add(self, hashes):
+        if not len(hashes):
+            return
+        run = _sorted_unique(hashes)
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = _sorted_unique(np.concatenate([self.runs.pop(), run]))
+        self.runs.append(run)
+
+
+def _sorted_unique(values):
+    """Valeurs distinctes triées (np.unique passe par une table de hachage, bien plus lente sur uint64)."""
+    values = np.sort(values)
+    keep = np.empty(len(values), dtype=bool)
+    keep[:1] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def _blank(values):
+    """Masque des valeurs absentes ou vides."""
+    return values.isna().to_numpy() | (values.astype("string").str.strip() == "").fillna(True).to_numpy()
+
+
+def _dates(values):
+    """Dates typées (timestamps UTC) et masque des valeurs renseignées mais invalides."""
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values, np.zeros(len(values), dtype=bool)
+    # Textes passés en minuscules à l'ingestion : « t » remis en majuscule (cf. dataset.to_typed)
+    parsed = pd.to_datetime(values.astype("string").str.upper(), utc=True, errors="coerce", format="ISO8601")
+    return parsed, ~_blank(values) & parsed.isna().to_numpy()
+
+
+class Validator:
+    """
+    Validation incrémentale, paquet par paquet.
+
+    Attributs :
+        rows (int) : lignes validées
+        chunks (int) : paquets validés
+        violations (Dict[str, int]) : violations par règle
+        examples (Dict[str, List[str]]) : premiers identifiants en violation, par règle
+    """
+
+    def __init__(self, now=None, retention=RETENTION, max_examples=MAX_EXAMPLES):
+        self.min_begin = pd.Timestamp((now or datetime.now(timezone.utc)) - retention)
+        self.max_examples = max_examples
+        self.rows = 0
+        self.chunks = 0
+        self.violations = dict.fromkeys(RULES, 0)
+        self.examples = {rule: [] for rule in RULES}
+        self._seen = SeenHashes()
+
+    def _record(self, rule, mask, labels):
+        count = int(mask.sum())
+        if not count:
+            return
+        self.violations[rule] += count
+        missing = self.max_examples - len(self.examples[rule])
+        if missing > 0:
+            self.examples[rule].extend(labels[np.flatnonzero(mask)[:missing]].tolist())
+
+    def feed(self, chunk):
+        """
+        Valide un paquet de lignes (textes bruts ou colonnes typées).
+
+        Args:
+            chunk (pd.DataFrame): lignes à valider
+
+        Returns:
+            np.ndarray[bool]: lignes sans aucune violation
+        """
+        n = len(chunk)
+        ok = np.ones(n, dtype=bool)
+        if ID_COLUMN in chunk.columns:
+            ids = chunk[ID_COLUMN]
+            labels = ids.astype("string").fillna("").to_numpy(dtype=object)
+        else:
+            ids = None
+            labels = np.full(n, "", dtype=object)
+        # Ligne sans identifiant : repérée par son numéro dans le fichier
+        unnamed = labels == ""
+        labels[unnamed] = [f"ligne {self.rows + i + 1}" for i in np.flatnonzero(unnamed)]
+
+        def record(rule, mask):
+            nonlocal ok
+            ok &= ~mask
+            self._record(rule, mask, labels)
+
+        dates = {}
+        for column, (kind, required) in SCHEMA.items():
+            if column not in chunk.columns:
+                if required:
+                    record(f"requis:{column}", np.ones(n, dtype=bool))
+                continue
+            values = chunk[column]
+            if required:
+                record(f"requis:{column}", _blank(values))
+            if kind == "datetime":
+                dates[column], invalid = _dates(values)
+                record(f"type:{column}", invalid)
+            elif not (pd.api.types.is_string_dtype(values.dtype) or values.dtype == object):
+                record(f"type:{column}", values.notna().to_numpy())
+
+        if BEGIN_COLUMN in dates and END_COLUMN in dates:
+            record("ordre_des_dates", (dates[BEGIN_COLUMN] > dates[END_COLUMN]).fillna(False).to_numpy(bool))
+        if BEGIN_COLUMN in dates:
+            record("debut_recent", (dates[BEGIN_COLUMN] < self.min_begin).fillna(False).to_numpy(bool))
+        if CITY_COLUMN in chunk.columns:
+            city = chunk[CITY_COLUMN].astype("string").str.strip().str.lower()
+            record("ville_paris", (city.notna() & (city != "paris")).fillna(False).to_numpy(bool))
+
+        if ids is not None:
+            present = ~_blank(ids)
+            hashes = pd.util.hash_array(ids[present].astype(str).to_numpy(dtype=object))
+            duplicate = np.zeros(n, dtype=bool)
+            duplicate[present] = self._seen.contains(hashes) | pd.Series(hashes).duplicated().to_numpy()
+            self._seen.add(hashes)
+            record(f"doublon:{ID_COLUMN}", duplicate)
+
+        self.rows += n
+        self.chunks += 1
+        return ok
+
+    @property
+    def valid(self):
+        return not any(self.violations.values())
+
+    def report(self):
+        """
+        Rapport compact : par règle, description, violations et exemples.
+
+        Returns:
+            dict: `rows`, `chunks`, `valid` et `rules`
+        """
+        return {
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "valid": self.valid,
+            "rules": {
+                rule: {"description": description, "violations": self.violations[rule],
+                       "examples": self.examples[rule]}
+                for rule, description in RULES.items()
+            },
+        }
+
+    def print_report(self):
+        broken = {rule: count for rule, count in self.violations.items() if count}
+        print(f"🔎 Validation : {self.rows} ligne(s), {len(RULES) - len(broken)}/{len(RULES)} règle(s) respectée(s)")
+        for rule, count in broken.items():
+            more = "..." if count > len(self.examples[rule]) else ""
+            print(f"   ⚠️ {rule} : {count} ({', '.join(self.examples[rule])}{more})")
+
+    def write_report(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+
+def iter_chunks(path, chunksize=100_000):
+    """
+    Paquets d'un fichier d'événements, limités aux colonnes du schéma
+    (lots Parquet, ou CSV lu en texte).
+
+    Yields:
+        pd.DataFrame: paquet de lignes
+    """
+    if is_parquet(path):
+        parquet = pq.ParquetFile(path)
+        columns = [column for column in SCHEMA if column in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    header = pd.read_csv(path, sep=";", nrows=0).columns
+    columns = [column for column in SCHEMA if column in header]
+    yield from pd.read_csv(path, sep=";", dtype=str, usecols=columns, chunksize=chunksize)
+
+
+def validate_file(path, chunksize=100_000, now=None):
+    """
+    Valide un fichier d'événements en une passe, par paquets.
+
+    Returns:
+        Validator: compteurs et exemples par règle
+    """
+    validator = Validator(now=now)
+    for chunk in iter_chunks(path, chunksize):
+        validator.feed(chunk)
+    return validator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validation du fichier des événements")
+    parser.add_argument("path", nargs="?", default=DATASET_PATH, help="fichier .parquet ou .csv")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="lignes par paquet")
+    parser.add_argument("--json", help="fichier du rapport JSON")
+    args = parser.parse_args(argv)
+
+    validator = validate_file(args.path, args.chunksize)
+    validator.print_report()
+    if args.json:
+        validator.write_report(args.json)
+        print(f"💾 Rapport écrit dans {os.path.abspath(args.json)}")
+    if not validator.valid:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
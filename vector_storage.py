@@ -0,0 +1,161 @@
+"""
+vector_storage.py
+
+Stockage compact de l'index vectoriel.
+
+Avec un index compressé (float16, int8 par dimension, IVF-PQ : cf.
+index_types.py), les distances calculées par FAISS sont approchées. Les
+vecteurs float32 d'origine sont donc conservés à côté de l'index, dans
+`vectors.npy` (même ordre que les positions FAISS), et projetés en mémoire
+(mmap) : seules les lignes des candidats d'une requête sont lues sur disque.
+La recherche ramène `rescore_factor` fois plus de candidats puis les
+re-classe par la distance L2 exacte.
+
+L'index FAISS lui-même est chargé par mmap (`IO_FLAG_MMAP_IFC`) au lieu
+d'être désérialisé en mémoire : le démarrage ne lit que ce qui sert, et les
+pages sont partagées entre les processus (plusieurs workers Streamlit).
+Textes et métadonnées sont lus de la même façon (cf. metadata_store.py) ;
+le docstore picklé de `FAISS.save_local` n'est plus relu que pour un index
+écrit par une version précédente. L'index BM25 (cf. lexical.py) est écrit
+avec eux.
+
+En lecture seule (recherche), l'index est rendu dans un `ReadOnlyVectorStore`
+qui expose les mêmes attributs que le `FAISS` de LangChain : le chemin des
+requêtes n'importe pas `langchain_community.vectorstores` (lent à charger).
+Le `FAISS` LangChain ne sert plus qu'à la mise à jour de l'index.
+"""
+
+import os
+import pickle
+
+import faiss
+import numpy as np
+
+from lexical import LEXICAL_DIR, LexicalIndex
+from metadata_store import STORE_DIR, MetadataStore
+
+FULL_VECTORS_FILE = "vectors.npy"
+RESCORE_FACTOR = 4
+
+
+class ReadOnlyVectorStore:
+    """
+    Index en lecture seule, avec les attributs du `FAISS` LangChain utilisés
+    par la recherche (cf. retrieval.py).
+
+    Attributs :
+        embedding_function (Embeddings) : embeddings des requêtes
+        index (faiss.Index) : index FAISS (projeté en mémoire)
+        docstore (MetadataStore) : documents lus à la demande
+        index_to_docstore_id (Mapping[int, str]) : position FAISS -> identifiant
+    """
+
+    def __init__(self, embedding_function, index, docstore, index_to_docstore_id):
+        self.embedding_function = embedding_function
+        self.index = index
+        self.docstore = docstore
+        self.index_to_docstore_id = index_to_docstore_id
+
+
+def save_full_vectors(index_dir, vectors):
+    """Écrit les vecteurs float32, dans l'ordre des positions FAISS (écriture atomique)."""
+    path = os.path.join(index_dir, FULL_VECTORS_FILE)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(path + ".tmp", path)
+
+
+def remove_full_vectors(index_dir):
+    """Supprime les vecteurs d'un ancien index compressé (ils ne seraient plus alignés)."""
+    path = os.path.join(index_dir, FULL_VECTORS_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def load_full_vectors(index_dir):
+    """
+    Vecteurs float32 projetés en mémoire, ou None si l'index n'en a pas.
+
+    Returns:
+        np.memmap: matrice (ntotal, d) en lecture seule
+    """
+    path = os.path.join(index_dir, FULL_VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def save_vectorstore(index_dir, vectorstore, index_name="index"):
+    """
+    Écrit l'index FAISS, son store de métadonnées (remplace un ancien
+    docstore picklé) et l'index BM25 aligné sur les mêmes positions.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, f"{index_name}.faiss")
+    faiss.write_index(vectorstore.index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    MetadataStore.write(os.path.join(index_dir, STORE_DIR), vectorstore)
+    LexicalIndex.write_vectorstore(os.path.join(index_dir, LEXICAL_DIR), vectorstore)
+    pickled = os.path.join(index_dir, f"{index_name}.pkl")
+    if os.path.exists(pickled):
+        os.remove(pickled)
+
+
+def load_vectorstore(index_dir, embeddings, mmap=True, writable=False, index_name="index"):
+    """
+    Charge un vectorstore sauvegardé par `save_vectorstore` (ou `FAISS.save_local`).
+
+    Args:
+        index_dir (str): dossier de l'index
+        embeddings (Embeddings): fonction d'embedding des requêtes
+        mmap (bool): projette l'index en mémoire au lieu de le lire en entier
+            (index en lecture seule : pour la recherche, pas pour la mise à jour)
+        writable (bool): docstore en mémoire, modifiable (mise à jour de l'index) ;
+            sinon les documents sont lus à la demande dans le store
+        index_name (str): nom du fichier `index.faiss`
+
+    Returns:
+        FAISS | ReadOnlyVectorStore: vectorstore LangChain (modifiable ou ancien
+        index), sinon vue en lecture seule
+    """
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(index_dir, f"{index_name}.faiss"), flags)
+    store_dir = os.path.join(index_dir, STORE_DIR)
+    if os.path.isdir(store_dir):
+        store = MetadataStore(store_dir)
+        if not writable:
+            return ReadOnlyVectorStore(embeddings, index, store, store.index_to_docstore_id)
+        docstore, index_to_docstore_id = store.to_docstore()
+    else:
+        # Index écrit par une version précédente : docstore picklé par embedding.py
+        # lui-même (même hypothèse que allow_dangerous_deserialization=True)
+        with open(os.path.join(index_dir, f"{index_name}.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    # Import tardif : la recherche seule n'en a pas besoin (cf. ReadOnlyVectorStore)
+    from langchain_community.vectorstores import FAISS
+
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def rescore(full_vectors, query, positions, k):
+    """
+    Re-classe des candidats par leur distance L2 exacte.
+
+    Args:
+        full_vectors (np.ndarray): vecteurs float32 (mmap) indexés par position FAISS
+        query (np.ndarray): vecteur de requête float32 (d,)
+        positions (np.ndarray): positions candidates (-1 = vide)
+        k (int): nombre de résultats gardés
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: distances et positions, de la plus proche à la plus lointaine
+    """
+    positions = positions[positions >= 0]
+    if len(positions) == 0:
+        return np.empty(0, dtype=np.float32), positions
+    # Lecture triée : accès disque séquentiel dans le fichier projeté
+    order = np.argsort(positions)
+    candidates = np.asarray(full_vectors[positions[order]], dtype=np.float32)
+    distances = ((candidates - query) ** 2).sum(axis=1)
+    best = np.argsort(distances, kind="stable")[:k]
+    return distances[best], positions[order][best]